@@ -3,8 +3,12 @@
 Десктопное приложение для анализа жирнокислотного состава молока (PyQt6)
 """
 
+import hashlib
 import os
 import sys
+import threading
+import time
+from datetime import datetime
 
 # Принудительно устанавливаем платформу Qt (по ОС)
 if sys.platform.startswith('linux'):
@@ -18,34 +22,34 @@ from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 import numpy as np
-import matplotlib
 
-matplotlib.use('QtAgg')
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
+from collections import OrderedDict
 
-from database import DatabaseManager
+# При запуске импортируется только нужное первому экрану. matplotlib, pandas,
+# camelot, xgboost/sklearn, docx и reportlab загружаются при первом использовании
+# (см. benchmarks/startup.py)
+from database import DatabaseManager, BackgroundWriter
+from database.db import HISTORY_COLUMNS
 from utils import validate_diet_ratios, check_fatty_acid_ranges
-from utils.constants import FATTY_ACID_NAMES, ingredient_names, nutrient_names
-from preprocessing import (
-    parse_pdf_diet,
-    get_nutrients_data,
-    INGREDIENT_FEATURES,
-    NUTRIENT_FEATURES,
-)
-from preprocessing.parser import numeric_from_str
+from utils.downsample import lttb
+from utils.constants import FATTY_ACIDS, FATTY_ACID_NAMES, ingredient_names, nutrient_names
+from preprocessing.errors import ParsingCancelled
+from preprocessing.filtration import INGREDIENT_FEATURES, NUTRIENT_FEATURES
+from reports.render import get_renderer, report_rows, gost_level_text, confidence_text
 
-from ingredient_model import predict_from_ingredients
-from nutrient_model import load_model, run_predictions
 
+def create_mpl_canvas(width=8, height=6, dpi=100):
+    """Холст matplotlib для встраивания графиков (matplotlib импортируется при первом вызове)"""
+    import matplotlib
 
-class MplCanvas(FigureCanvasQTAgg):
-    """Холст matplotlib для встраивания графиков"""
+    matplotlib.use('QtAgg')
+    from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+    from matplotlib.figure import Figure
 
-    def __init__(self, parent=None, width=8, height=6, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super().__init__(fig)
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    canvas = FigureCanvasQTAgg(fig)
+    canvas.axes = fig.add_subplot(111)
+    return canvas
 
 
 class ClickableLabel(QLabel):
@@ -64,25 +68,254 @@ class ClickableLabel(QLabel):
         super().mousePressEvent(event)
 
 
+# Дисковый кэш миниатюр галереи (ключ: путь, mtime, размер файла и размер миниатюры)
+THUMB_CACHE_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)),
+                               '.cache', 'thumbnails')
+THUMB_SIZE = (320, 220)
+
+# Тренды: ряды длиннее TREND_MAX_POINTS прореживаются LTTB перед отрисовкой
+TREND_MAX_POINTS = 2000
+TREND_SOURCES = (('predictions', 'Предсказания'), ('analysis', 'Лабораторные анализы'))
+TREND_STYLES = {
+    'predictions': {'color': 'steelblue', 'linewidth': 1.0},
+    'analysis': {'color': 'darkorange', 'linewidth': 0, 'marker': 'o', 'markersize': 3},
+}
+
+
+def thumbnail_cache_path(image_path: str, size=THUMB_SIZE) -> str:
+    st = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{size[0]}x{size[1]}"
+    return os.path.join(THUMB_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+
+class ThumbnailSignals(QObject):
+    ready = pyqtSignal(str, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    """Миниатюра в фоновом потоке: из кэша, либо декодирование JPEG сразу в уменьшенном размере.
+
+    Используется QImage (в отличие от QPixmap его можно создавать вне GUI-потока).
+    """
+
+    def __init__(self, image_path: str, signals: ThumbnailSignals, size=THUMB_SIZE):
+        super().__init__()
+        self.image_path = image_path
+        self.signals = signals
+        self.size = size
+
+    def run(self):
+        image = QImage()
+        try:
+            cache_path = thumbnail_cache_path(self.image_path, self.size)
+            if os.path.exists(cache_path):
+                image = QImage(cache_path)
+            if image.isNull():
+                reader = QImageReader(self.image_path)
+                reader.setAutoTransform(True)
+                source = reader.size()
+                if source.isValid():
+                    target = source.scaled(self.size[0], self.size[1], Qt.AspectRatioMode.KeepAspectRatio)
+                    reader.setScaledSize(target)
+                image = reader.read()
+                if not image.isNull():
+                    os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+                    image.save(cache_path, 'PNG')
+        except OSError:
+            pass
+        self.signals.ready.emit(self.image_path, image)
+
+
+class WorkerSignals(QObject):
+    """Сигналы фоновой задачи; доставляются в GUI-поток через очередь событий Qt."""
+
+    progress = pyqtSignal(str, object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class PipelineWorker(QRunnable):
+    """Задача для QThreadPool: fn(report, is_cancelled) выполняется вне GUI-потока.
+
+    report(stage, info) отправляет прогресс в GUI, is_cancelled() проверяется
+    задачей между этапами (см. ParsingCancelled).
+    """
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _report(self, stage: str, info: dict = None):
+        if self.is_cancelled():
+            raise ParsingCancelled(stage)
+        self.signals.progress.emit(stage, info or {})
+
+    def run(self):
+        try:
+            result = self.fn(self._report, self.is_cancelled)
+        except ParsingCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        if self.is_cancelled():
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(result)
+
+
+# Этапы фоновых задач: процент выполнения и подпись в диалоге прогресса
+JOB_STAGES = {
+    'page': (30, "Чтение таблиц: страница {page} из {pages}…"),
+    'tables': (50, "Таблицы найдены: {count}. Классификация…"),
+    'classification': (65, "Рецептов: {recipe}, таблиц нутриентов: {nutrient}. Разбор ингредиентов…"),
+    'ingredients': (80, "Ингредиентов: {count}. Извлечение нутриентов…"),
+    'nutrients': (95, "Нутриенты извлечены"),
+    'models': (50, "Расчёт моделей по ингредиентам и нутриентам…"),
+}
+
+# Живой пересчёт: правки полей в пределах LIVE_DEBOUNCE_MS объединяются в один расчёт
+LIVE_DEBOUNCE_MS = 30
+
+
+def set_table_row(table: QTableWidget, row: int, texts) -> None:
+    """Обновить тексты строки таблицы на месте (ячейки создаются только при первом заполнении)."""
+    for col, text in enumerate(texts):
+        item = table.item(row, col)
+        if item is None:
+            table.setItem(row, col, QTableWidgetItem(text))
+        elif item.text() != text:
+            item.setText(text)
+
+
+class PredictionHistoryModel(QAbstractTableModel):
+    """Модель истории предсказаний: строки читаются из SQLite страницами по мере прокрутки.
+
+    rowCount берётся из COUNT(*), а в памяти держится лишь несколько последних
+    страниц (LRU), поэтому потребление памяти не зависит от размера истории.
+    Сортировка и фильтр по названию рациона выполняются в SQL.
+    """
+
+    PAGE_SIZE = 200
+    MAX_PAGES = 10
+
+    def __init__(self, db: DatabaseManager, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.headers = ['ID', 'Рацион', 'Дата'] + [name for _, name in FATTY_ACIDS]
+        self.order_by = 'prediction_date'
+        self.descending = True
+        self.name_filter = None
+        self._pages = OrderedDict()
+        self._row_count = self.db.count_predictions()
+
+    def refresh(self):
+        """Перечитать число строк и сбросить кэш страниц."""
+        self.beginResetModel()
+        self._pages.clear()
+        self._row_count = self.db.count_predictions(self.name_filter)
+        self.endResetModel()
+
+    def set_name_filter(self, text: str):
+        self.name_filter = text.strip() or None
+        self.refresh()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def _page(self, page_no: int):
+        page = self._pages.get(page_no)
+        if page is None:
+            page = self.db.get_predictions_page(
+                page_no * self.PAGE_SIZE, self.PAGE_SIZE,
+                self.order_by, self.descending, self.name_filter,
+            )
+            self._pages[page_no] = page
+            if len(self._pages) > self.MAX_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_no)
+        return page
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.TextAlignmentRole):
+            return None
+        column = index.column()
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter if column != 1 else None
+        page = self._page(index.row() // self.PAGE_SIZE)
+        offset = index.row() % self.PAGE_SIZE
+        if offset >= len(page):
+            return None
+        value = page[offset][column]
+        if value is None:
+            return ''
+        return f"{value:.2f}" if column >= 3 else str(value)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.order_by = HISTORY_COLUMNS[column]
+        self.descending = order == Qt.SortOrder.DescendingOrder
+        self.refresh()
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.db = DatabaseManager()
+        # Запись в БД идёт в фоновом потоке, GUI не ждёт commit
+        self.db_writer = BackgroundWriter(self.db)
+        # Процесс разбора PDF с лимитами времени и памяти: сбой camelot не роняет окно
+        self._pdf_parser = None
         self.distribution_points = None
         self.current_diet_data = {}
         self.current_analysis_data = {}
         self.now_open_file = ""
         self.ing_df_glob = 0
+        self.nut_df_glob = None
+        # Value_i из загруженного PDF, которых нет среди полей формы (модель нутриентов их использует)
+        self._loaded_nutrients = {}
+        # Разбор PDF и предсказания выполняются в пуле потоков, GUI остаётся отзывчивым
+        self.thread_pool = QThreadPool.globalInstance()
+        self._active_worker = None
         self.setWindowTitle("Анализ жирнокислотного состава молока")
         self.setGeometry(100, 100, 1400, 900)
 
         # Хранилище для предсказаний и ID рациона
         self.current_predictions = {}
+        self.current_uncertainty = {}
         self.current_diet_id = None
 
         # Путь к папке с заготовленными графиками
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
         self.visuals_dir = os.path.join(base_dir, 'visuals')
+        # Галерея: сигнатура содержимого папки, метки миниатюр, наблюдатель за папкой
+        self._gallery_signature = None
+        self._thumb_labels = {}
+        self.thumb_pool = QThreadPool(self)
+        self.thumb_signals = ThumbnailSignals()
+        self.thumb_signals.ready.connect(self.on_thumbnail_ready)
+        self.visuals_watcher = QFileSystemWatcher(self)
+        if os.path.isdir(self.visuals_dir):
+            self.visuals_watcher.addPath(self.visuals_dir)
+        self.visuals_watcher.directoryChanged.connect(lambda _: self.load_prepared_images())
 
         self.init_ui()
 
@@ -91,7 +324,21 @@ class MainWindow(QMainWindow):
         # Главный виджет
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
-        self.nutrients_model = load_model()
+        # Модель нутриентов загружается при первой генерации предсказаний
+        self.nutrients_model = None
+        self._model_lock = threading.Lock()
+        # Живой пересчёт предсказаний: таймер устранения дребезга, отдельный пул из одного
+        # потока (расчёты не выстраиваются в очередь) и номер поколения для отбрасывания
+        # устаревших результатов
+        self._live_timer = QTimer(self)
+        self._live_timer.setSingleShot(True)
+        self._live_timer.setInterval(LIVE_DEBOUNCE_MS)
+        self._live_timer.timeout.connect(self._run_live_prediction)
+        self._live_pool = QThreadPool(self)
+        self._live_pool.setMaxThreadCount(1)
+        self._live_worker = None
+        self._live_pending = False
+        self._live_generation = 0
 
         # Главный layout
         main_layout = QVBoxLayout(main_widget)
@@ -175,6 +422,7 @@ class MainWindow(QMainWindow):
             spin.setSuffix(" %")
             spin.setMinimumWidth(120)
             spin.setMaximumWidth(150)
+            spin.valueChanged.connect(self.schedule_live_prediction)
             self.ingredient_inputs[key] = spin
             ingr_layout.addWidget(spin, row, col + 1)
 
@@ -200,6 +448,7 @@ class MainWindow(QMainWindow):
             spin = QDoubleSpinBox()
             spin.setRange(0, 10000)
             spin.setValue(default)
+            spin.valueChanged.connect(self.schedule_live_prediction)
             self.nutrient_inputs[key] = spin
             nutr_layout.addWidget(spin, i, 1)
 
@@ -250,6 +499,11 @@ class MainWindow(QMainWindow):
         pred_btn.clicked.connect(self.generate_predictions)
         layout.addWidget(pred_btn)
 
+        self.live_check = QCheckBox("Пересчитывать при изменении ингредиентов и нутриентов")
+        self.live_check.setChecked(True)
+        self.live_check.toggled.connect(self.schedule_live_prediction)
+        layout.addWidget(self.live_check)
+
         # Таблица предсказаний
         pred_group = QGroupBox("Результаты предсказаний")
         pred_layout = QVBoxLayout()
@@ -306,6 +560,29 @@ class MainWindow(QMainWindow):
         results_group.setLayout(results_layout)
         layout.addWidget(results_group)
 
+        # История предсказаний из БД (постраничная загрузка)
+        history_group = QGroupBox("История предсказаний")
+        history_layout = QVBoxLayout()
+
+        self.history_filter = QLineEdit()
+        self.history_filter.setPlaceholderText("Фильтр по названию рациона")
+        self.history_filter.textChanged.connect(self.on_history_filter_changed)
+        history_layout.addWidget(self.history_filter)
+
+        self.history_model = PredictionHistoryModel(self.db, self)
+        self.history_view = QTableView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setSortingEnabled(True)
+        self.history_view.sortByColumn(2, Qt.SortOrder.DescendingOrder)
+        self.history_view.verticalHeader().setVisible(False)
+        # Фиксированная высота строк: Qt не опрашивает каждую строку для расчёта размеров
+        self.history_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.history_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        history_layout.addWidget(self.history_view)
+
+        history_group.setLayout(history_layout)
+        layout.addWidget(history_group)
+
         # Готовые графики
         graph_group = QGroupBox("")
         graph_layout = QVBoxLayout()
@@ -320,10 +597,39 @@ class MainWindow(QMainWindow):
         trend_btn.clicked.connect(self.show_trends)
         graph_btn_layout.addWidget(trend_btn)
 
+        # Параметры трендов: кислота и окно дат (включительно)
+        self.trend_acid_combo = QComboBox()
+        self.trend_acid_combo.addItems([name for _, name in FATTY_ACIDS])
+        self.trend_acid_combo.setCurrentText('Пальмитиновая')
+        graph_btn_layout.addWidget(self.trend_acid_combo)
+
+        today = QDate.currentDate()
+        self.trend_from_edit = QDateEdit(today.addYears(-1))
+        self.trend_to_edit = QDateEdit(today)
+        for label, edit in (("с", self.trend_from_edit), ("по", self.trend_to_edit)):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat('dd.MM.yyyy')
+            edit.dateChanged.connect(self.on_trend_params_changed)
+            graph_btn_layout.addWidget(QLabel(label))
+            graph_btn_layout.addWidget(edit)
+        self.trend_acid_combo.currentIndexChanged.connect(self.on_trend_params_changed)
+
+        input_stats_btn = QPushButton("Входные данные")
+        input_stats_btn.setToolTip("Статистики признаков загруженных рационов за выбранный период")
+        input_stats_btn.clicked.connect(self.show_input_stats)
+        graph_btn_layout.addWidget(input_stats_btn)
+
         graph_layout.addLayout(graph_btn_layout)
 
-        self.canvas = MplCanvas(self, width=10, height=6)
-        graph_layout.addWidget(self.canvas)
+        # Холст создаётся при первом построении графика (см. свойство canvas);
+        # _chart хранит вид текущего графика и его артистов для обновления на месте
+        self._canvas = None
+        self._chart = {}
+        self._graph_layout = graph_layout
+        self._canvas_placeholder = QLabel("Нажмите кнопку, чтобы построить график")
+        self._canvas_placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self._canvas_placeholder.setMinimumHeight(600)
+        graph_layout.addWidget(self._canvas_placeholder)
 
         graph_group.setLayout(graph_layout)
         layout.addWidget(graph_group)
@@ -334,7 +640,7 @@ class MainWindow(QMainWindow):
 
         prepared_btns = QHBoxLayout()
         refresh_btn = QPushButton("Обновить список")
-        refresh_btn.clicked.connect(self.load_prepared_images)
+        refresh_btn.clicked.connect(lambda: self.load_prepared_images(force=True))
         prepared_btns.addWidget(refresh_btn)
         prepared_btns.addStretch()
         prepared_layout.addLayout(prepared_btns)
@@ -384,26 +690,117 @@ class MainWindow(QMainWindow):
         """)
         layout.addWidget(info_text)
 
+    @property
+    def canvas(self):
+        """Холст графиков; при первом обращении импортирует matplotlib и заменяет заглушку."""
+        if self._canvas is None:
+            self._canvas = create_mpl_canvas(width=10, height=6)
+            self._graph_layout.replaceWidget(self._canvas_placeholder, self._canvas)
+            self._canvas_placeholder.deleteLater()
+        return self._canvas
+
+    def get_nutrients_model(self):
+        """Модель нутриентов (joblib/sklearn); загружается один раз, можно вызывать из фоновой задачи."""
+        with self._model_lock:
+            if self.nutrients_model is None:
+                from nutrient_model import load_model
+                self.nutrients_model = load_model()
+        return self.nutrients_model
+
     # Обработчики событий
     def load_pdf(self):
         """Загрузка PDF файла"""
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Выберите PDF файл", "", "PDF files (*.pdf)"
         )
-        self.now_open_file = file_path
         if file_path:
-            ing_df, nut_df = parse_pdf_diet(file_path)
-            self.ing_df_glob = ing_df.copy()
-            # Также в форму ингредиентов по кодам
-            # Отображаем результаты парсинга
-            # Подставляем распознанные значения в поля ввода
-            try:
-                self._populate_inputs_from_loaded(ing_df, nut_df)
-            except Exception:
-                pass
-            self.display_loading_results(ing_df, nut_df, "PDF")
+            if self._pdf_parser is None:
+                from preprocessing import IsolatedParser
+                self._pdf_parser = IsolatedParser()
+            parser = self._pdf_parser
+            self._start_job(
+                lambda report, is_cancelled: parser.parse(file_path, report, is_cancelled),
+                "Поиск таблиц в PDF…",
+                lambda result: self._on_pdf_parsed(file_path, result),
+            )
+
+    def _on_pdf_parsed(self, file_path, result):
+        """Результат фонового разбора PDF (выполняется в GUI-потоке)."""
+        ing_df, nut_df = result
+        self.now_open_file = file_path
+        self.ing_df_glob = ing_df.copy()
+        self.nut_df_glob = nut_df.copy()
+        try:
+            from nutrient_model import prepare_nutrients
+
+            self._loaded_nutrients = prepare_nutrients(nut_df).iloc[0].to_dict() if not nut_df.empty else {}
+        except Exception:
+            self._loaded_nutrients = {}
+        # Подставляем распознанные значения в поля ввода
+        try:
+            self._populate_inputs_from_loaded(ing_df, nut_df)
+        except Exception:
+            pass
+        self.display_loading_results(ing_df, nut_df, "PDF")
+        self._record_input_stats(ing_df, nut_df)
+        self.statusBar().showMessage(f"Файл разобран: {os.path.basename(file_path)}")
+
+    def _record_input_stats(self, ing_df, nut_df):
+        """Статистики входных признаков разобранного рациона (scoring.drift) — через фонового писателя."""
+        try:
+            from scoring import drift
+
+            if drift.enabled():
+                self.db_writer.merge_input_stats(drift.batch_rows([ing_df], [nut_df]))
+        except Exception:
+            pass  # мониторинг входных данных не должен мешать загрузке файла
+
+    def _start_job(self, fn, title, on_done):
+        """Запуск fn(report, is_cancelled) в пуле потоков с диалогом прогресса и отменой."""
+        if self._active_worker is not None:
+            QMessageBox.information(self, "Подождите", "Предыдущая операция ещё выполняется.")
+            return
+        worker = PipelineWorker(fn)
+        dialog = QProgressDialog(title, "Отмена", 0, 100, self)
+        dialog.setWindowTitle("Выполнение")
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.setValue(5)
+        dialog.canceled.connect(worker.cancel)
+
+        def on_progress(stage, info):
+            percent, text = JOB_STAGES.get(stage, (dialog.value(), stage))
+            dialog.setValue(percent)
+            dialog.setLabelText(text.format(**info))
+
+        def finish():
+            self._active_worker = None
+            dialog.canceled.disconnect(worker.cancel)
+            dialog.setValue(dialog.maximum())
+            dialog.deleteLater()
+
+        def on_finished(result):
+            finish()
+            on_done(result)
+
+        def on_failed(message):
+            finish()
+            QMessageBox.critical(self, "Ошибка", message)
+
+        def on_cancelled():
+            finish()
+            self.statusBar().showMessage("Операция отменена")
+
+        worker.signals.progress.connect(on_progress)
+        worker.signals.finished.connect(on_finished)
+        worker.signals.failed.connect(on_failed)
+        worker.signals.cancelled.connect(on_cancelled)
+        self._active_worker = worker
+        self.thread_pool.start(worker)
 
     def display_loading_results(self, df_ingr, df_nutr, file_type):
+        from preprocessing.parser import numeric_from_str
+
         all_items = []
 
         def to_float(x):
@@ -466,6 +863,8 @@ class MainWindow(QMainWindow):
         df_ingr: DataFrame, где колонки — читаемые названия из feed_types (INGREDIENT_FEATURES)
         df_nutr: DataFrame, где колонки — Value_i
         """
+        from preprocessing.parser import numeric_from_str
+
         # Ингредиенты: маппим label -> code и подставляем проценты СВ
         try:
             if df_ingr is not None and not df_ingr.empty:
@@ -522,74 +921,123 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка валидации", message)
                 return
             entered_codes = {code: val for code, val in self.current_diet_data.items() if val > 0}
-            diet_id = self.db.add_diet(
+            # Сохраняем Future с diet_id: предсказания можно ставить в очередь, не дожидаясь записи
+            self.current_diet_id = self.db_writer.add_diet(
                 name=self.diet_name.text(),
             )
-            # Сохраняем diet_id для использования в предсказаниях
-            self.current_diet_id = diet_id
             QMessageBox.information(self, "Успех",
                                     "Данные сохранены в БД! Теперь можете перейти в вкладку Предсказания.")
-            self.statusBar().showMessage(f"Данные сохранены (ID рациона: {diet_id})")
+            self.statusBar().showMessage("Данные сохранены")
             # Переключаемся на вкладку предсказаний
             self.tabs.setCurrentIndex(1)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения: {str(e)}")
 
+    def _collect_inputs(self):
+        """Значения полей формы: {код ингредиента: % СВ} и {Value_i: значение}.
+
+        Value_i, которых нет в форме, берутся из загруженного PDF.
+        """
+        ingredients = {code: spin.value() for code, spin in self.ingredient_inputs.items()}
+        nutrients = dict(self._loaded_nutrients)
+        nutrients.update({key: spin.value() for key, spin in self.nutrient_inputs.items()})
+        return ingredients, nutrients
+
+    def _score_inputs(self, ingredients, nutrients, with_features: bool = True) -> dict:
+        """Предсказание по значениям формы (выполняется в фоновом потоке)."""
+        from scoring import ingredients_frame, nutrients_frame, score_diets
+
+        return score_diets([ingredients_frame(ingredients)], [nutrients_frame(nutrients)],
+                           self.get_nutrients_model(), with_features=with_features)[0]
+
     def generate_predictions(self):
-        if not self.now_open_file:
+        ingredients, nutrients = self._collect_inputs()
+        if not any(value > 0 for value in ingredients.values()):
             QMessageBox.warning(
                 self, "Нет данных",
-                "Сначала загрузите файл с рационом во вкладке «Загрузка»."
+                "Сначала загрузите файл с рационом или введите ингредиенты во вкладке «Загрузка»."
             )
             return
-        try:
-            # 2) По нутриентам: соберём Value_i
-            nutrients_data_no_vibecode = get_nutrients_data(self.now_open_file)
-            print(nutrients_data_no_vibecode, len(nutrients_data_no_vibecode))
-            nutrients_by_feat = {k: v.value() for k, v in self.nutrient_inputs.items() if v.value() > 0}
-            # Предсказания двух моделей
-            pred_ingr = predict_from_ingredients(self.ing_df_glob).tolist()[0]
-            pred_nutr = run_predictions(nutrients_data_no_vibecode, self.nutrients_model).tolist()[0]
-            print(pred_ingr, pred_nutr)
-            # Усреднение
-            acids = ['Масляная', 'Капроновая', 'Каприловая', 'Каприновая', 'Деценовая', 'Лауриновая',
-                     'Миристиновая', 'Миристолеиновая', 'Пальмитиновая', 'Пальмитолеиновая',
-                     'Стеариновая', 'Олеиновая', 'Линолевая', 'Линоленовая', 'Арахиновая', 'Бегеновая']
-            predictions = {}
-            for i, a in enumerate(acids):
-                predictions[a] = (pred_ingr[i] + pred_nutr[i]) / 2.0
-            self.current_predictions = predictions
-            # Заполняем таблицу предсказаний
-            self.pred_table.setRowCount(len(predictions))
-            # Рассчитываем уровень по ГОСТу для каждого значения
-            gost_levels = check_fatty_acid_ranges([predictions[a] for a in acids])
-            for row, (acid, value) in enumerate(predictions.items()):
-                self.pred_table.setItem(row, 0, QTableWidgetItem(FATTY_ACID_NAMES.get(acid, acid)))
-                self.pred_table.setItem(row, 1, QTableWidgetItem(f"{value:.2f}"))
-                self.pred_table.setItem(row, 2, QTableWidgetItem(gost_levels[row]))
-                self.pred_table.setItem(row, 3, QTableWidgetItem(
-                    "Высокая" if value > 0.1 else "Средняя"
-                ))
-            print(predictions)
-            self.distribution_points = predictions
-        except Exception as e:
-            raise e
+        # Незавершённый живой пересчёт по тем же полям больше не нужен
+        self._live_generation += 1
 
-        """# Сохраняем предсказания в БД, если есть diet_id
-        if self.current_diet_id:
-            prediction_id = self.db.add_prediction(self.current_diet_id, predictions)
-            self.statusBar().showMessage(f"Предсказания сгенерированы и сохранены (ID: {prediction_id})")
-        else:
+        def job(report, is_cancelled):
+            report('models')
+            return self._score_inputs(ingredients, nutrients)
+
+        self._start_job(job, "Генерация предсказаний…", self._on_predictions_ready)
+
+    def schedule_live_prediction(self, *_):
+        """Правка поля: перезапуск таймера, серия быстрых правок даст один пересчёт."""
+        if self.live_check.isChecked():
+            self._live_timer.start()
+
+    def _run_live_prediction(self):
+        if self._live_worker is not None:
+            # Расчёт уже идёт: по его окончании сразу посчитаем по свежим значениям
+            self._live_pending = True
+            return
+        self._live_generation += 1
+        ingredients, nutrients = self._collect_inputs()
+        if not any(value > 0 for value in ingredients.values()):
+            return
+        generation, started = self._live_generation, time.perf_counter()
+        worker = PipelineWorker(
+            lambda report, is_cancelled: self._score_inputs(ingredients, nutrients, with_features=False))
+        worker.signals.finished.connect(
+            lambda result: self._on_live_prediction_done(generation, started, result))
+        worker.signals.failed.connect(lambda message: self._on_live_prediction_done(generation, started, None, message))
+        self._live_worker = worker
+        self._live_pool.start(worker)
+
+    def _on_live_prediction_done(self, generation, started, result, error=None):
+        self._live_worker = None
+        if self._live_pending:
+            self._live_pending = False
+            self._run_live_prediction()
+        if generation != self._live_generation:
+            return  # поля успели измениться — результат устарел
+        if error is not None:
+            self.statusBar().showMessage(f"Пересчёт не выполнен: {error}")
+            return
+        self._show_predictions(result)
+        self.statusBar().showMessage(
+            f"Предсказания пересчитаны за {(time.perf_counter() - started) * 1000:.0f} мс (не сохранены)")
+
+    def _show_predictions(self, result) -> dict:
+        """Вывод предсказаний (результат score_diets) в таблицы и гистограмму без пересоздания ячеек."""
+        predictions = {name: result['predictions'][key] for key, name in FATTY_ACIDS}
+        self.current_predictions = predictions
+        self.current_uncertainty = {name: result['uncertainty'][key] for key, name in FATTY_ACIDS}
+        self.pred_table.setRowCount(len(predictions))
+        for row, (key, name) in enumerate(FATTY_ACIDS):
+            value = predictions[name]
+            set_table_row(self.pred_table, row, (
+                name, f"{value:.2f}", result['gost'][key], self._confidence_text(value, self.current_uncertainty[name])))
+        self.distribution_points = predictions
+        self.update_results_table()
+        # Открытая гистограмма обновляется на месте (см. _draw_bars)
+        if self._chart.get('kind') == 'hist':
+            self.show_hist()
+        return predictions
+
+    def _on_predictions_ready(self, result):
+        """Заполнение таблицы и сохранение результатов фоновой задачи предсказания."""
+        predictions = self._show_predictions(result)
+
+        # Сохраняем предсказания в БД вместе с выходами обоих потоков и признаками
+        if not self.current_diet_id:
             # Если нет diet_id, создаем новый рацион
-            diet_id = self.db.add_diet(
+            self.current_diet_id = self.db_writer.add_diet(
                 name=f"Рацион из предсказаний {datetime.now().strftime('%Y-%m-%d %H:%M')}",
             )
-            self.current_diet_id = diet_id
-            prediction_id = self.db.add_prediction(diet_id, predictions)
-            self.statusBar().showMessage(
-                f"Предсказания сгенерированы и сохранены (Diet ID: {diet_id}, Prediction ID: {prediction_id})")
-        # Также обновляем таблицу результатов
-        self.update_results_table()"""
+        self.db_writer.add_prediction(
+            self.current_diet_id, predictions,
+            ingredient_output=result['ingredient_output'], nutrient_output=result['nutrient_output'],
+            ingredient_features=result['ingredient_features'], nutrient_features=result['nutrient_features'],
+            uncertainty=result['uncertainty'], ood_score=result['ood_score'],
+        )
+        self.statusBar().showMessage("Предсказания сгенерированы и поставлены на сохранение")
 
     def update_results_table(self):
         """Обновление таблицы результатов"""
@@ -597,43 +1045,28 @@ class MainWindow(QMainWindow):
             if not self.current_predictions:
                 return
             self.results_pred_table.setRowCount(len(self.current_predictions))
-            acids_order = ['Масляная', 'Капроновая', 'Каприловая', 'Каприновая', 'Деценовая', 'Лауриновая',
-                           'Миристиновая', 'Миристолеиновая', 'Пальмитиновая', 'Пальмитолеиновая',
-                           'Стеариновая', 'Олеиновая', 'Линолевая', 'Линоленовая', 'Арахиновая', 'Бегеновая']
-            values_in_order = [self.current_predictions.get(a, 0.0) for a in acids_order]
+            values_in_order = [self.current_predictions.get(name, 0.0) for _, name in FATTY_ACIDS]
             gost_levels = check_fatty_acid_ranges(values_in_order)
-            for row, acid in enumerate(acids_order):
-                value = self.current_predictions.get(acid, 0.0)
-                self.results_pred_table.setItem(row, 0, QTableWidgetItem(FATTY_ACID_NAMES.get(acid, acid)))
-                self.results_pred_table.setItem(row, 1, QTableWidgetItem(f"{value:.2f}"))
+            for row, ((_, name), value) in enumerate(zip(FATTY_ACIDS, values_in_order)):
                 # Форматируем «уровень по ГОСТу» и «уверенность»
-                self.results_pred_table.setItem(row, 2, QTableWidgetItem(self._gost_level_text(gost_levels[row])))
-                self.results_pred_table.setItem(row, 3, QTableWidgetItem(self._confidence_text(value)))
+                set_table_row(self.results_pred_table, row, (
+                    name, f"{value:.2f}", self._gost_level_text(gost_levels[row]),
+                    self._confidence_text(value, self.current_uncertainty.get(name))))
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка обновления: {str(e)}")
 
-
     def _gost_level_text(self, text: str) -> str:
         """Единый формат отображения уровня по ГОСТу в экспорте и печати."""
-        try:
-            if isinstance(text, str):
-                if text.startswith('Ниже на '):
-                    num = text.replace('Ниже на ', '')
-                    return f"Ниже нормы на {num} %"
-                if text.startswith('Выше на '):
-                    num = text.replace('Выше на ', '')
-                    return f"Выше нормы на {num} %"
-            return text
-        except Exception:
-            return text
+        return gost_level_text(text)
 
-    def _confidence_text(self, value: float) -> str:
+    def _confidence_text(self, value: float, uncertainty=None) -> str:
         """Единый формат отображения уверенности предсказания."""
-        try:
-            return "Высокая" if float(value) > 0.1 else "Средняя"
-        except Exception:
-            return "Средняя"
+        return confidence_text(value, uncertainty)
 
+    def _current_report_rows(self):
+        """Строки отчёта по current_predictions и current_uncertainty (ключи — русские названия кислот)."""
+        return report_rows([self.current_predictions.get(name, 0.0) for _, name in FATTY_ACIDS],
+                           [self.current_uncertainty.get(name) for _, name in FATTY_ACIDS])
 
     def export_to_docx(self):
         """Экспорт результатов в DOCX"""
@@ -641,36 +1074,12 @@ class MainWindow(QMainWindow):
             if not self.current_predictions:
                 QMessageBox.warning(self, "Предупреждение", "Сначала сгенерируйте предсказания!")
                 return
-            from docx import Document
+            renderer = get_renderer('docx')
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Сохранить как", "результаты.docx", "Word files (*.docx)"
             )
             if file_path:
-                doc = Document()
-                doc.add_heading('Результаты предсказания жирнокислотного состава', 0)
-                # 4 колонки: Кислота, Значение, Уровень по ГОСТу, Уверенность
-                table = doc.add_table(rows=1, cols=4)
-                table.style = 'Light Grid Accent 1'
-                hdr_cells = table.rows[0].cells
-                hdr_cells[0].text = 'Жирная кислота'
-                hdr_cells[1].text = 'Значение (%)'
-                hdr_cells[2].text = 'Уровень по ГОСТу'
-                hdr_cells[3].text = 'Уверенность'
-
-                acids_order = ['Масляная', 'Капроновая', 'Каприловая', 'Каприновая', 'Деценовая', 'Лауриновая',
-                               'Миристиновая', 'Миристолеиновая', 'Пальмитиновая', 'Пальмитолеиновая',
-                               'Стеариновая', 'Олеиновая', 'Линолевая', 'Линоленовая', 'Арахиновая', 'Бегеновая']
-                values_in_order = [self.current_predictions.get(a, 0.0) for a in acids_order]
-                gost_levels = check_fatty_acid_ranges(values_in_order)
-
-                for idx, acid in enumerate(acids_order):
-                    value = values_in_order[idx]
-                    row_cells = table.add_row().cells
-                    row_cells[0].text = FATTY_ACID_NAMES.get(acid, acid)
-                    row_cells[1].text = f"{value:.2f}"
-                    row_cells[2].text = self._gost_level_text(gost_levels[idx])
-                    row_cells[3].text = self._confidence_text(value)
-                doc.save(file_path)
+                renderer.render(file_path, self._current_report_rows())
                 QMessageBox.information(self, "Успех", f"Экспорт в DOCX завершен: {file_path}")
         except ImportError:
             QMessageBox.critical(self, "Ошибка", "Установите python-docx: pip install python-docx")
@@ -683,76 +1092,13 @@ class MainWindow(QMainWindow):
             if not self.current_predictions:
                 QMessageBox.warning(self, "Предупреждение", "Сначала сгенерируйте предсказания!")
                 return
-
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib import colors
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.pdfbase import pdfmetrics
-            from reportlab.pdfbase.ttfonts import TTFont
-
-            # Регистрируем шрифт с поддержкой кириллицы
-            pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-
+            # Шрифт и стили регистрируются один раз за сеанс (см. reports.render)
+            renderer = get_renderer('pdf')
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Сохранить как", "результаты.pdf", "PDF files (*.pdf)"
             )
             if file_path:
-                doc = SimpleDocTemplate(file_path, pagesize=letter)
-                elements = []
-
-                # Настраиваем стиль для русского текста
-                styles = getSampleStyleSheet()
-                title_style = ParagraphStyle(
-                    'CustomTitle',
-                    parent=styles['Title'],
-                    fontName='Arial',
-                    fontSize=16,
-                    leading=20
-                )
-                normal_style = ParagraphStyle(
-                    'CustomNormal',
-                    parent=styles['Normal'],
-                    fontName='Arial',
-                    fontSize=12,
-                    leading=14
-                )
-
-                elements.append(Paragraph("Результаты предсказания жирнокислотного состава", title_style))
-
-                data = [['Жирная кислота', 'Значение (%)', 'Уровень по ГОСТу', 'Уверенность']]
-
-                acids_order = ['Масляная', 'Капроновая', 'Каприловая', 'Каприновая', 'Деценовая', 'Лауриновая',
-                               'Миристиновая', 'Миристолеиновая', 'Пальмитиновая', 'Пальмитолеиновая',
-                               'Стеариновая', 'Олеиновая', 'Линолевая', 'Линоленовая', 'Арахиновая', 'Бегеновая']
-                values_in_order = [self.current_predictions.get(a, 0.0) for a in acids_order]
-                gost_levels = check_fatty_acid_ranges(values_in_order)
-
-                for idx, acid in enumerate(acids_order):
-                    value = values_in_order[idx]
-                    data.append([
-                        FATTY_ACID_NAMES.get(acid, acid),
-                        f"{value:.2f}",
-                        self._gost_level_text(gost_levels[idx]),
-                        self._confidence_text(value)
-                    ])
-
-                table = Table(data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Arial'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 14),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Arial'),  # Применяем шрифт ко всей таблице
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ]))
-
-                elements.append(table)
-                doc.build(elements)
+                renderer.render(file_path, self._current_report_rows())
                 QMessageBox.information(self, "Успех", f"Экспорт в PDF завершен: {file_path}")
 
         except ImportError:
@@ -781,90 +1127,147 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка печати: {str(e)}")
 
+    def closeEvent(self, event):
+        """Дописать очередь записи в БД перед закрытием окна."""
+        try:
+            # Миниатюры из очереди не нужны; уже запущенные дожидаемся, чтобы они
+            # не отправили сигнал удалённому окну при выходе
+            self.thumb_pool.clear()
+            self.thumb_pool.waitForDone()
+            if self._pdf_parser is not None:
+                self._pdf_parser.close()
+            self.db_writer.shutdown()
+            self.db.close()
+        finally:
+            super().closeEvent(event)
+
+    # -------------------- Графики --------------------
+    # Оси очищаются только при смене вида графика (или подписей столбцов); иначе
+    # существующим артистам задаются новые данные и холст перерисовывается draw_idle.
+    def _show_no_data(self, kind: str = 'empty', message: str = 'Нет данных'):
+        ax = self.canvas.axes
+        ax.clear()
+        ax.text(0.5, 0.5, message, ha='center', va='center', transform=ax.transAxes)
+        self._chart = {'kind': kind}
+        self.canvas.draw_idle()
+
+    def _draw_bars(self, kind: str, labels: list, values: list, ylabel: str,
+                   annotate: bool = True, color=None):
+        """Столбчатая диаграмма; при тех же подписях меняются только высоты и тексты."""
+        ax = self.canvas.axes
+        chart = self._chart
+        if chart.get('kind') == kind and chart.get('labels') == labels:
+            for bar, value in zip(chart['bars'], values):
+                bar.set_height(value)
+            for text, value in zip(chart['texts'], values):
+                text.set_y(value)
+                text.set_text(f'{value:.2f}')
+            ax.relim()
+            ax.autoscale_view()
+        else:
+            ax.clear()
+            bars = ax.bar(labels, values, alpha=0.7, color=color)
+            # Подписываем значения сверху столбцов
+            texts = [
+                ax.text(bar.get_x() + bar.get_width() / 2., value, f'{value:.2f}', ha='center', va='bottom')
+                for bar, value in zip(bars, values)
+            ] if annotate else []
+            ax.set_xlabel('Жирные кислоты')
+            ax.set_ylabel(ylabel)
+            ax.set_title('Распределение жирных кислот')
+            ax.tick_params(axis='x', rotation=45)
+            self.canvas.figure.tight_layout()
+            self._chart = {'kind': kind, 'labels': list(labels), 'bars': list(bars), 'texts': texts}
+        self.canvas.draw_idle()
+
     def show_hist(self):
         """Показать распределение"""
         try:
-            if not hasattr(self, 'distribution_points') or not self.distribution_points:
-                self.canvas.axes.clear()
-                self.canvas.axes.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-                self.canvas.draw()
+            if not getattr(self, 'distribution_points', None):
+                # Вид 'hist' сохраняется: живой пересчёт заменит заглушку гистограммой
+                self._show_no_data('hist')
                 return
-
             # Получаем ключи и значения из словаря
             labels = list(self.distribution_points.keys())
-            values = list(self.distribution_points.values())
-
-            # Проверяем, что списки не пусты
-            if len(labels) == 0 or len(values) == 0:
-                self.canvas.axes.clear()
-                self.canvas.axes.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-                self.canvas.draw()
-                return
-
-            self.canvas.axes.clear()
-            bars = self.canvas.axes.bar(labels, values, alpha=0.7)
-
-            # Подписываем значения сверху столбцов
-            for bar, value in zip(bars, values):
-                height = bar.get_height()
-                self.canvas.axes.text(
-                    bar.get_x() + bar.get_width() / 2., height,
-                    f'{value:.2f}',
-                    ha='center', va='bottom'
-                )
-
-            self.canvas.axes.set_xlabel('Жирные кислоты')
-            self.canvas.axes.set_ylabel('Значение (%)')
-            self.canvas.axes.set_title('Распределение жирных кислот')
-            self.canvas.axes.tick_params(axis='x', rotation=45)
-            self.canvas.figure.tight_layout()
-            self.canvas.draw()
-
+            values = [float(v) for v in self.distribution_points.values()]
+            self._draw_bars('hist', labels, values, 'Значение (%)')
         except Exception as e:
-            from PyQt6.QtWidgets import QMessageBox
             QMessageBox.critical(self, "Ошибка", f"Ошибка графика: {str(e)}")
 
     def show_distribution(self):
         """Показать распределение"""
         try:
-            diets = self.db.get_all_diets()
-            all_analyses = []
-            for diet in diets:
-                analyses = self.db.get_analysis_for_diet(diet['id'])
-                all_analyses.extend(analyses)
-            if not all_analyses:
-                self.canvas.axes.clear()
-                self.canvas.axes.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-                self.canvas.draw()
+            # Средние по всем анализам берём из сводной таблицы БД (без обхода рационов)
+            summary = self.db.get_acid_summary('analysis')
+            labels = [FATTY_ACID_NAMES[key] for key, s in summary.items() if s['count']]
+            data_means = [s['mean'] for s in summary.values() if s['count']]
+            if not data_means:
+                self._show_no_data()
                 return
-            acids = ['lauric_acid', 'palmitic_acid', 'stearic_acid',
-                     'oleic_acid', 'linoleic_acid', 'linolenic_acid']
-            names = ['Лауриновая', 'Пальмитиновая', 'Стеариновая',
-                     'Олеиновая', 'Линолевая', 'Линоленовая']
-            data_means = []
-            labels = []
-            for acid, name in zip(acids, names):
-                values = [a[acid] for a in all_analyses if a[acid]]
-                if values:
-                    data_means.append(np.mean(values))
-                    labels.append(name)
-            self.canvas.axes.clear()
-            self.canvas.axes.bar(labels, data_means, alpha=0.7, color='steelblue')
-            self.canvas.axes.set_xlabel('Жирные кислоты')
-            self.canvas.axes.set_ylabel('Среднее значение (%)')
-            self.canvas.axes.set_title('Распределение жирных кислот')
-            self.canvas.axes.tick_params(axis='x', rotation=45)
-            self.canvas.figure.tight_layout()
-            self.canvas.draw()
+            self._draw_bars('distribution', labels, data_means, 'Среднее значение (%)',
+                            annotate=False, color='steelblue')
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка графика: {str(e)}")
 
+    def _trend_series(self, source: str, acid: str, date_from: str, date_to: str):
+        """Ряд кислоты из БД в датах matplotlib (дни от 1970-01-01), прореженный LTTB."""
+        rows = self.db.get_acid_series(source, acid, date_from, date_to)
+        if not rows:
+            return np.empty(0), np.empty(0), 0
+        data = np.asarray(rows, dtype=float)
+        x, y = lttb(data[:, 0] / 86400.0, data[:, 1], TREND_MAX_POINTS)
+        return x, y, len(rows)
+
     def show_trends(self):
-        """Показать тренды"""
-        self.canvas.axes.clear()
-        self.canvas.axes.text(0.5, 0.5, 'Функция трендов в разработке',
-                              ha='center', va='center', fontsize=14)
-        self.canvas.draw()
+        """Показать тренды: предсказания и лабораторные анализы выбранной кислоты за окно дат"""
+        try:
+            acid = self.trend_acid_combo.currentText()
+            date_from = self.trend_from_edit.date().toString('yyyy-MM-dd')
+            date_to = self.trend_to_edit.date().toString('yyyy-MM-dd') + ' 23:59:59'
+            series = {source: self._trend_series(source, acid, date_from, date_to)
+                      for source, _ in TREND_SOURCES}
+
+            ax = self.canvas.axes
+            if self._chart.get('kind') != 'trend':
+                import matplotlib.dates as mdates
+
+                ax.clear()
+                lines = {source: ax.plot([], [], label=label, **TREND_STYLES[source])[0]
+                         for source, label in TREND_SOURCES}
+                no_data = ax.text(0.5, 0.5, 'Нет данных за выбранный период', ha='center', va='center',
+                                  transform=ax.transAxes, visible=False)
+                locator = mdates.AutoDateLocator()
+                ax.xaxis.set_major_locator(locator)
+                ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+                ax.tick_params(axis='x', rotation=0)
+                ax.set_ylabel('Значение (%)')
+                ax.set_title('Тренд')
+                ax.grid(True, alpha=0.3)
+                ax.legend(loc='upper left')
+                self.canvas.figure.tight_layout()
+                self._chart = {'kind': 'trend', 'lines': lines, 'no_data': no_data}
+
+            chart = self._chart
+            shown = total = 0
+            for source, (x, y, count) in series.items():
+                chart['lines'][source].set_data(x, y)
+                shown, total = shown + len(x), total + count
+            chart['no_data'].set_visible(total == 0)
+            title = f'Тренд: {acid}'
+            if shown < total:
+                title += f' (показано {shown} из {total} точек)'
+            ax.set_title(title)
+            if total:
+                ax.relim()
+                ax.autoscale_view()
+            self.canvas.draw_idle()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка графика: {str(e)}")
+
+    def on_trend_params_changed(self, *_):
+        """Смена кислоты или окна дат перерисовывает уже открытый график трендов."""
+        if self._chart.get('kind') == 'trend':
+            self.show_trends()
 
     # -------------------- Галерея заготовленных графиков --------------------
     def on_tab_changed(self, index: int):
@@ -872,9 +1275,18 @@ class MainWindow(QMainWindow):
         try:
             if hasattr(self, 'results_tab_index') and index == self.results_tab_index:
                 self.load_prepared_images()
+                # Подхватываем записи, сохранённые фоновым писателем
+                self.history_model.refresh()
         except Exception:
             pass
 
+    def on_history_filter_changed(self, text: str):
+        """Фильтрация истории предсказаний по названию рациона."""
+        try:
+            self.history_model.set_name_filter(text)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка фильтра: {str(e)}")
+
     def clear_prepared_grid(self):
         """Очистка сетки миниатюр."""
         try:
@@ -887,25 +1299,41 @@ class MainWindow(QMainWindow):
         except Exception:
             pass
 
-    def load_prepared_images(self):
-        """Загрузка изображений из папки visuals и отображение миниатюр."""
+    def _gallery_entries(self):
+        """Список изображений папки visuals и сигнатура (имя, mtime, размер) для отслеживания изменений."""
+        image_exts = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif'}
+        entries = []
+        with os.scandir(self.visuals_dir) as it:
+            for entry in it:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in image_exts:
+                    st = entry.stat()
+                    entries.append((entry.name, st.st_mtime_ns, st.st_size))
+        entries.sort()
+        return [os.path.join(self.visuals_dir, name) for name, _, _ in entries], tuple(entries)
+
+    def load_prepared_images(self, force: bool = False):
+        """Отображение миниатюр из папки visuals.
+
+        Сетка перестраивается только при изменении содержимого папки (или force=True);
+        миниатюры берутся из дискового кэша или строятся в фоновом пуле потоков.
+        """
         try:
             # Если секция ещё не инициализирована (например, вкладка не создана)
             if not hasattr(self, 'prepared_grid'):
                 return
-            self.clear_prepared_grid()
             if not os.path.isdir(self.visuals_dir):
+                self._gallery_signature = None
+                self.clear_prepared_grid()
                 placeholder = QLabel("Папка с графиками не найдена: " + self.visuals_dir)
                 placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
                 self.prepared_grid.addWidget(placeholder, 0, 0)
                 return
-            entries = sorted(os.listdir(self.visuals_dir))
-            image_exts = {'.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif'}
-            image_paths = [
-                os.path.join(self.visuals_dir, name)
-                for name in entries
-                if os.path.splitext(name)[1].lower() in image_exts
-            ]
+            image_paths, signature = self._gallery_entries()
+            if signature == self._gallery_signature and not force:
+                return
+            self._gallery_signature = signature
+            self.clear_prepared_grid()
+            self._thumb_labels = {}
             if not image_paths:
                 placeholder = QLabel("Нет изображений в папке visuals")
                 placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -914,34 +1342,26 @@ class MainWindow(QMainWindow):
             columns = 3
             row = 0
             col = 0
-            thumb_max_w, thumb_max_h = 320, 220
+            thumb_max_w, thumb_max_h = THUMB_SIZE
             for path in image_paths:
                 # Контейнер одного элемента
                 item_widget = QWidget()
                 vbox = QVBoxLayout(item_widget)
                 vbox.setContentsMargins(6, 6, 6, 6)
                 vbox.setSpacing(6)
-                pixmap = QPixmap(path)
-                if not pixmap.isNull():
-                    scaled = pixmap.scaled(
-                        thumb_max_w, thumb_max_h,
-                        Qt.AspectRatioMode.KeepAspectRatio,
-                        Qt.TransformationMode.SmoothTransformation
-                    )
-                    img_label = ClickableLabel(path)
-                    img_label.setPixmap(scaled)
-                    img_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    img_label.clicked.connect(self.open_image_viewer)
-                    vbox.addWidget(img_label)
-                else:
-                    broken = QLabel("Не удалось загрузить изображение")
-                    broken.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    vbox.addWidget(broken)
+                img_label = ClickableLabel(path)
+                img_label.setText("Загрузка…")
+                img_label.setMinimumSize(thumb_max_w, thumb_max_h)
+                img_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                img_label.clicked.connect(self.open_image_viewer)
+                vbox.addWidget(img_label)
+                self._thumb_labels[path] = img_label
                 name_label = QLabel(os.path.basename(path))
                 name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
                 name_label.setWordWrap(True)
                 vbox.addWidget(name_label)
                 self.prepared_grid.addWidget(item_widget, row, col)
+                self.thumb_pool.start(ThumbnailTask(path, self.thumb_signals))
                 col += 1
                 if col >= columns:
                     col = 0
@@ -949,6 +1369,66 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки изображений: {str(e)}")
 
+    def show_input_stats(self):
+        """Диалог со статистиками входных признаков за окно дат трендов и отметками дрейфа."""
+        try:
+            from scoring.drift import UNMAPPED, drift_report
+            from scoring.uncertainty import get_feature_stats
+
+            self.db_writer.flush(timeout=5)
+            date_from = self.trend_from_edit.date().toString('yyyy-MM-dd')
+            date_to = self.trend_to_edit.date().toString('yyyy-MM-dd')
+            current = self.db.get_input_stats(date_from, date_to)
+            if not current:
+                QMessageBox.information(self, "Входные данные", "За выбранный период рационы не загружались.")
+                return
+            report = drift_report(current, feature_stats=get_feature_stats())
+            labels = dict(INGREDIENT_FEATURES)
+
+            dialog = QDialog(self)
+            dialog.setWindowTitle(f"Входные данные: {date_from} — {date_to}")
+            dialog.resize(900, 600)
+            layout = QVBoxLayout(dialog)
+            unmapped = current.get('ingredient', {}).get(UNMAPPED)
+            if unmapped:
+                layout.addWidget(QLabel(f"Рационов: {unmapped['count']}, "
+                                        f"с нераспознанными кормами: {unmapped['mean']:.1%}"))
+            headers = ["Поток", "Признак", "n", "Среднее", "Ст. откл.", "Мин", "Макс", "Нулей", "Отметки"]
+            table = QTableWidget(len(report), len(headers))
+            table.setHorizontalHeaderLabels(headers)
+            table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+            for i, r in enumerate(report):
+                name = f"{r['feature']} {labels.get(r['feature'], '')}".strip()
+                cells = [r['stream'], name, str(r['count']), f"{r['mean']:.3f}", f"{r['std']:.3f}",
+                         f"{r['min']:.3f}", f"{r['max']:.3f}", f"{r['zero_rate']:.0%}", ', '.join(r['flags'])]
+                for j, text in enumerate(cells):
+                    item = QTableWidgetItem(text)
+                    if r['flags']:
+                        item.setBackground(QColor(255, 230, 200))
+                    table.setItem(i, j, item)
+            table.resizeColumnsToContents()
+            layout.addWidget(table)
+            close_btn = QPushButton("Закрыть")
+            close_btn.clicked.connect(dialog.accept)
+            btn_box = QHBoxLayout()
+            btn_box.addStretch()
+            btn_box.addWidget(close_btn)
+            layout.addLayout(btn_box)
+            dialog.exec()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка статистик входных данных: {str(e)}")
+
+    def on_thumbnail_ready(self, path: str, image: QImage):
+        """Миниатюра готова (GUI-поток): ставим её в метку, если сетка не перестроена."""
+        label = self._thumb_labels.get(path)
+        if label is None:
+            return
+        if image.isNull():
+            label.setText("Не удалось загрузить изображение")
+        else:
+            label.setText("")
+            label.setPixmap(QPixmap.fromImage(image))
+
     def open_image_viewer(self, image_path: str):
         """Открыть диалог с полноразмерным просмотром изображения."""
         try:
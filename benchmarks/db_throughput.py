@@ -0,0 +1,63 @@
+"""
+Пропускная способность DatabaseManager на запись и чтение.
+
+Запуск из корня проекта:
+    python -m benchmarks.db_throughput --n 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from database import DatabaseManager  # noqa: E402
+
+
+def _timed(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return {'ops': n, 'seconds': round(elapsed, 4), 'ops_per_sec': round(n / elapsed, 1) if elapsed else None}
+
+
+def run(n: int = 2000, reads: int = 2000) -> dict:
+    """Замер записи рационов/предсказаний и чтения предсказаний по рациону."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        prediction = {'lauric': 3.1, 'palmitic': 28.0, 'stearic': 10.2,
+                      'oleic': 24.5, 'linoleic': 3.3, 'linolenic': 0.6}
+        diet_ids = []
+
+        results = {
+            'add_diet': _timed(lambda i: diet_ids.append(db.add_diet(name=f'Рацион {i}')), n),
+            'add_prediction': _timed(lambda i: db.add_prediction(diet_ids[i % len(diet_ids)], prediction), n),
+            'get_predictions_for_diet': _timed(
+                lambda i: db.get_predictions_for_diet(diet_ids[i % len(diet_ids)]), reads),
+        }
+        if hasattr(db, 'add_predictions'):
+            bulk_ids = [diet_ids[i % len(diet_ids)] for i in range(n)]
+            start = time.perf_counter()
+            db.add_predictions(bulk_ids, [prediction] * n)
+            elapsed = time.perf_counter() - start
+            results['add_predictions_bulk'] = {'ops': n, 'seconds': round(elapsed, 4),
+                                               'ops_per_sec': round(n / elapsed, 1) if elapsed else None}
+        close = getattr(db, 'close', None)
+        if close is not None:
+            close()
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--n', type=int, default=2000, help='число операций записи')
+    ap.add_argument('--reads', type=int, default=2000, help='число операций чтения')
+    args = ap.parse_args(argv)
+    print(json.dumps(run(args.n, args.reads), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
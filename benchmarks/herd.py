@@ -0,0 +1,82 @@
+"""
+Задержка score_herd (профиль сборного молока) на холдингах разного размера.
+
+Холдинг — фермы по четыре группы (новотельные, раздой, вторая половина лактации,
+сухостой) со случайным поголовьем и удоем; рационы берутся из общего набора типовых
+(--distinct — их доля от числа групп: 1.0 — у каждой группы свой рацион). Для каждого
+числа групп выводится медиана времени score_herd целиком и профили по фермам.
+
+Запуск из корня проекта:
+    python -m benchmarks.herd --groups 100 1000 5000 --distinct 0.25
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from benchmarks.service_load import random_ration  # noqa: E402
+
+GROUP_KINDS = (('fresh', 28.0), ('high', 38.0), ('low', 22.0), ('dry', 0.0))
+
+
+def synthetic_holding(groups: int, distinct: float = 1.0, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    rations = [random_ration(rng) for _ in range(max(1, round(groups * distinct)))]
+    holding = []
+    for i in range(groups):
+        kind, milk_yield = GROUP_KINDS[i % len(GROUP_KINDS)]
+        holding.append(dict(rng.choice(rations), farm=f'farm-{i // len(GROUP_KINDS):04d}', name=kind,
+                            head=rng.randint(20, 400), milk_yield=milk_yield * rng.uniform(0.85, 1.15)))
+    return holding
+
+
+def measure(groups: List[dict], nutrients_model, repeats: int) -> dict:
+    from scoring.herd import score_herd
+
+    result = score_herd(groups, nutrients_model, by='farm')  # прогрев: загрузка моделей
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        score_herd(groups, nutrients_model, by='farm')
+        times.append(time.perf_counter() - started)
+    return {'groups': len(groups), 'rations': result['rations'], 'farms': len(result['by']),
+            'ms': round(statistics.median(times) * 1000, 2), 'ms_max': round(max(times) * 1000, 2)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--groups', type=int, nargs='+', default=[100, 1000, 5000])
+    ap.add_argument('--distinct', type=float, default=0.25, help='доля различных рационов среди групп')
+    ap.add_argument('--repeats', type=int, default=5)
+    ap.add_argument('--nutrient-model', default='parameters/nutrients-_acids_01617_140.pkl')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('-o', '--output', help='записать результаты в JSON')
+    args = ap.parse_args(argv)
+
+    from nutrient_model import load_model
+
+    try:
+        nutrients_model = load_model(args.nutrient_model)
+    except FileNotFoundError as e:
+        print(f"Нет файла модели нутриентов: {e}", file=sys.stderr)
+        return 1
+    results = []
+    print(f"{'групп':>7} {'ферм':>6} {'рационов':>9} {'медиана, мс':>12} {'макс, мс':>9}")
+    for size in args.groups:
+        r = measure(synthetic_holding(size, args.distinct, args.seed), nutrients_model, args.repeats)
+        results.append(r)
+        print(f"{r['groups']:>7} {r['farms']:>6} {r['rations']:>9} {r['ms']:>12.2f} {r['ms_max']:>9.2f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+16 моделей по кислотам против одной модели с 16 выходами: точность и задержка предсказания.
+
+Обе раскладки обучаются ingredient_model.retrain на одних и тех же данных и отложенной
+выборке, затем каждая загружается штатным загрузчиком и вызывается через
+predict_from_features (как в приложении) на пакетах разного размера; для сравнения —
+та же модель в упакованном виде (ingredient_model.packed).
+
+Данные — анализы из БД приложения (--db) или синтетические рационы benchmarks/synthetic.py
+с целями от текущих моделей активного набора и шумом (--rows): так сравнение работает
+без лабораторной выборки, но R² на них выше, чем на реальных анализах.
+
+Запуск из корня проекта:
+    python -m benchmarks.multi_output --rows 600 --workers 4
+    python -m benchmarks.multi_output --db database/milk_analysis.db --trials 12 -o multi.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# Пакеты предсказания: один рацион (GUI), порция сервиса, пакетная оценка
+BATCH_SIZES = (1, 16, 256)
+# Относительный шум синтетических целей (доля стандартного отклонения кислоты)
+NOISE = 0.1
+
+
+def synthetic_dataset(rows: int, seed: int = 0):
+    """X — подготовленные признаки синтетических рационов, Y — текущие модели + шум."""
+    from benchmarks.synthetic import synthetic_ration
+    from ingredient_model import predict_from_features
+    from preprocessing import prepare_ingredients
+    from scoring import ingredients_frame
+
+    import pandas as pd
+
+    rng = random.Random(seed)
+    frame = pd.concat([ingredients_frame(synthetic_ration(rng)) for _ in range(rows)], ignore_index=True)
+    X = prepare_ingredients(frame).to_numpy(dtype=np.float32)
+    Y = np.asarray(predict_from_features(X), dtype=float)
+    Y += np.random.default_rng(seed).normal(size=Y.shape) * Y.std(axis=0) * NOISE
+    return X, Y
+
+
+def tree_count(paths: List[str]) -> int:
+    total = 0
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            total += len(json.load(f)['learner']['gradient_booster']['model']['trees'])
+    return total
+
+
+def latency(model, X: np.ndarray, repeats: int) -> dict:
+    """Медиана времени predict_from_features (мс) для пакетов BATCH_SIZES."""
+    from ingredient_model import get_ingredient_model, predict_from_features, set_ingredient_model
+
+    previous = get_ingredient_model()
+    set_ingredient_model(model)
+    try:
+        result = {}
+        for size in BATCH_SIZES:
+            batch = X[np.arange(size) % len(X)]
+            predict_from_features(batch)  # прогрев: DMatrix, кэши xgboost
+            times = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                predict_from_features(batch)
+                times.append(time.perf_counter() - started)
+            result[f'ms_{size}'] = round(statistics.median(times) * 1000, 3)
+        return result
+    finally:
+        set_ingredient_model(previous)
+
+
+def compare(X: np.ndarray, Y: np.ndarray, workers: int, trials: int, folds: int, repeats: int,
+            multi_strategy: str = 'one_output_per_tree', seed: int = 0) -> List[dict]:
+    from ingredient_model.model_set import booster_paths
+    from ingredient_model.packed import PackedEnsemble
+    from ingredient_model.pipeline import _load_ingredient_model
+    from ingredient_model.retrain import retrain
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout, multi_output in (('per_target', False), ('multi_output', True)):
+            out_dir = os.path.join(tmp, layout)
+            # min_rows=0: обе раскладки обучаются по всем кислотам, без переноса моделей
+            metrics = retrain(X, Y, out_dir, workers, trials, folds, seed=seed, min_rows=0,
+                              multi_output=multi_output, multi_strategy=multi_strategy)
+            paths = booster_paths(out_dir)
+            row = {'layout': layout, 'files': len(paths), 'trees': tree_count(paths),
+                   'train_s': metrics['seconds'], 'mse': metrics['mean']['mse'], 'r2': metrics['mean']['r2']}
+            results.append(dict(row, backend='xgboost', **latency(_load_ingredient_model(out_dir), X, repeats)))
+            try:
+                packed = PackedEnsemble.from_boosters(paths)
+            except ValueError:
+                continue  # multi_output_tree: векторные листья не упаковываются
+            results.append(dict(row, backend='packed', **latency(packed, X, repeats)))
+    return results
+
+
+def format_table(results: List[dict]) -> str:
+    sizes = ''.join(f"{f'{size} стр., мс':>13}" for size in BATCH_SIZES)
+    lines = [f"{'раскладка':<13} {'модель':<8} {'файлов':>6} {'деревьев':>8} {'обучение, с':>11} "
+             f"{'MSE':>8} {'R²':>6}{sizes}"]
+    for r in results:
+        times = ''.join(f"{r[f'ms_{size}']:>13.3f}" for size in BATCH_SIZES)
+        lines.append(f"{r['layout']:<13} {r['backend']:<8} {r['files']:>6} {r['trees']:>8} {r['train_s']:>11.1f} "
+                     f"{r['mse']:>8.4f} {r['r2']:>6.3f}{times}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--db', help='анализы из БД приложения (по умолчанию — синтетические данные)')
+    ap.add_argument('--rows', type=int, default=600, help='синтетических рационов')
+    ap.add_argument('--workers', type=int, default=1, help='процессов для обучения')
+    ap.add_argument('--trials', type=int, default=1, help='вариантов гиперпараметров (1 — DEFAULT_PARAMS)')
+    ap.add_argument('--folds', type=int, default=3)
+    ap.add_argument('--repeats', type=int, default=50, help='повторов замера задержки')
+    ap.add_argument('--multi-strategy', default='one_output_per_tree',
+                    choices=('one_output_per_tree', 'multi_output_tree'))
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('-o', '--output', help='записать результаты в JSON')
+    args = ap.parse_args(argv)
+
+    if args.db:
+        from ingredient_model.retrain import load_training_data
+
+        X, Y = load_training_data(args.db)
+        complete = ~np.isnan(Y).any(axis=1)
+        X, Y = X[complete], Y[complete]  # одинаковые строки для обеих раскладок
+    else:
+        X, Y = synthetic_dataset(args.rows, args.seed)
+    if not len(X):
+        print("Нет данных для обучения", file=sys.stderr)
+        return 1
+    print(f"Строк: {len(X)}, признаков: {X.shape[1]}", file=sys.stderr)
+    results = compare(X, Y, args.workers, args.trials, args.folds, args.repeats, args.multi_strategy, args.seed)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Сквозной бенчмарк конвейера на синтетических рационах: время и память по этапам.
+
+Этапы: parse_pdf_diet (синтетические PDF), categorize_feeds_bulk, prepare_ingredients,
+модель по ингредиентам, модель по нутриентам, запись в БД. Каждый этап
+измеряется на нескольких размерах пакета (число рационов): лучшее время из
+repeat повторов, пропускная способность и пиковая память Python (tracemalloc,
+отдельным прогоном, чтобы трассировка не искажала время; память нативных
+библиотек — xgboost, sqlite — в неё не входит).
+
+Результаты сохраняются в JSON и сравниваются с базовым файлом: этап считается
+регрессией, если он медленнее базового больше чем на порог (по умолчанию 25 %).
+Код возврата 1 при регрессии.
+
+Запуск из корня проекта:
+    python -m benchmarks.pipeline --sizes 1 10 100 1000 -o bench.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json --threshold 0.25 --stage-threshold db_write=0.5
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from benchmarks.synthetic import (  # noqa: E402
+    nutrient_values, ration_feed_names, synthetic_nutrients, synthetic_ration, write_ration_pdf,
+)
+from utils import tracing  # noqa: E402
+
+STAGES = ('parse_pdf_diet', 'categorize_feeds_bulk', 'prepare_ingredients',
+          'ingredient_model', 'nutrient_model', 'db_write')
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+# Разбор PDF (camelot) на порядки медленнее остальных этапов — число файлов ограничено
+DEFAULT_MAX_PDFS = 10
+# Этапы короче этого времени сравниваются по нему: шум таймера не должен давать регрессий
+MIN_COMPARE_SECONDS = 0.002
+
+
+class StageSkipped(Exception):
+    """Этап нельзя выполнить в этом окружении (нет camelot, файла модели, шрифта)."""
+
+
+def measure(fn: Callable[[], object], items: int, repeat: int = 3) -> dict:
+    """Лучшее время из repeat запусков fn() и пиковая память Python отдельным прогоном."""
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'items': items,
+        'seconds': round(best, 6),
+        'per_item_ms': round(best * 1000 / items, 4),
+        'items_per_sec': round(items / best, 1) if best else None,
+        'peak_mb': round(peak / 2 ** 20, 3),
+    }
+
+
+class PipelineBenchmark:
+    """Синтетические рационы одного seed и замеры этапов на их префиксах."""
+
+    def __init__(self, max_size: int, seed: int = 0, nutrient_model_path: Optional[str] = None,
+                 font_path: Optional[str] = None, workdir: Optional[str] = None):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.rations = [synthetic_ration(rng) for _ in range(max_size)]
+        self.nutrients = [synthetic_nutrients(rng) for _ in range(max_size)]
+        self.nutrient_model_path = nutrient_model_path
+        self.font_path = font_path
+        self.workdir = workdir or tempfile.mkdtemp(prefix='bench_')
+        self._pdfs: List[str] = []
+        self._frames = None
+
+    # ---- подготовка входов (вне замеров) ----
+    def frames(self, n: int):
+        """Строки ингредиентов (раскладка categorize_feeds_bulk) и Value_i для первых n рационов."""
+        import pandas as pd
+
+        from preprocessing.filtration import categorize_feeds_bulk
+
+        if self._frames is None or len(self._frames[0]) < n:
+            ing = pd.concat([categorize_feeds_bulk(ration_feed_names(r)) for r in self.rations],
+                            ignore_index=True)
+            nut = pd.DataFrame([nutrient_values(v) for v in self.nutrients])
+            self._frames = (ing, nut)
+        ing, nut = self._frames
+        return ing.iloc[:n].reset_index(drop=True), nut.iloc[:n].reset_index(drop=True)
+
+    def pdfs(self, n: int) -> List[str]:
+        try:
+            from preprocessing.parser import load_camelot
+
+            load_camelot()
+        except ImportError as e:
+            raise StageSkipped(f"camelot недоступен: {e}")
+        try:
+            while len(self._pdfs) < n:
+                i = len(self._pdfs)
+                path = os.path.join(self.workdir, f'ration_{i:04d}.pdf')
+                self._pdfs.append(write_ration_pdf(path, self.rations[i], self.nutrients[i],
+                                                   self.rng, self.font_path))
+        except (ImportError, FileNotFoundError) as e:
+            raise StageSkipped(f"нельзя построить синтетический PDF: {e}")
+        return self._pdfs[:n]
+
+    def nutrient_model(self):
+        from nutrient_model import load_model
+
+        try:
+            return load_model(self.nutrient_model_path) if self.nutrient_model_path else load_model()
+        except FileNotFoundError as e:
+            raise StageSkipped(f"нет файла модели нутриентов: {e}")
+
+    # ---- этапы: каждый возвращает (fn, items) для measure ----
+    def stage_parse_pdf_diet(self, n: int, max_pdfs: int = DEFAULT_MAX_PDFS):
+        from preprocessing import parse_pdf_diet
+
+        paths = self.pdfs(min(n, max_pdfs))
+        return (lambda: [parse_pdf_diet(p) for p in paths]), len(paths)
+
+    def stage_categorize_feeds_bulk(self, n: int):
+        from preprocessing.filtration import categorize_feeds_bulk
+
+        names = [ration_feed_names(r) for r in self.rations[:n]]
+        return (lambda: [categorize_feeds_bulk(r) for r in names]), n
+
+    def stage_prepare_ingredients(self, n: int):
+        from preprocessing import prepare_ingredients
+
+        ing, _ = self.frames(n)
+        return (lambda: prepare_ingredients(ing)), n
+
+    def stage_ingredient_model(self, n: int):
+        from ingredient_model import get_ingredient_model, predict_from_ingredients
+
+        get_ingredient_model()  # загрузка весов — не часть замера
+        ing, _ = self.frames(n)
+        return (lambda: predict_from_ingredients(ing)), n
+
+    def stage_nutrient_model(self, n: int):
+        from nutrient_model import run_predictions
+
+        model = self.nutrient_model()
+        _, nut = self.frames(n)
+        return (lambda: run_predictions(nut, model, verbose=False)), n
+
+    def stage_db_write(self, n: int):
+        from database import DatabaseManager
+        from nutrient_model import prepare_nutrients
+        from preprocessing import prepare_ingredients
+
+        ing, nut = self.frames(n)
+        ingredient_features = prepare_ingredients(ing).to_numpy(dtype=float)
+        nutrient_features = prepare_nutrients(nut).to_numpy(dtype=float)
+        rng = random.Random(n)
+        values = [[rng.uniform(0, 30) for _ in range(16)] for _ in range(n)]
+        db_path = os.path.join(self.workdir, 'bench.db')
+
+        def write():
+            # Новая БД на каждый прогон: время не зависит от числа предыдущих повторов
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            with DatabaseManager(db_path) as db:
+                diet_ids = db.add_diets([f'Синтетический рацион {i}' for i in range(n)])
+                db.add_predictions(diet_ids, values, ingredient_outputs=values, nutrient_outputs=values,
+                                   ingredient_features=ingredient_features,
+                                   nutrient_features=nutrient_features)
+
+        return write, n
+
+    def run(self, sizes: Sequence[int], stages: Sequence[str] = STAGES, repeat: int = 3,
+            max_pdfs: int = DEFAULT_MAX_PDFS, log=None) -> dict:
+        results: Dict[str, Dict[str, dict]] = {}
+        skipped: Dict[str, str] = {}
+        for stage in stages:
+            method = getattr(self, f'stage_{stage}')
+            for n in sizes:
+                try:
+                    fn, items = method(n, max_pdfs) if stage == 'parse_pdf_diet' else method(n)
+                except StageSkipped as e:
+                    skipped[stage] = str(e)
+                    break
+                key = str(items)
+                if key in results.get(stage, {}):
+                    continue  # parse_pdf_diet: размеры выше max_pdfs дают тот же набор файлов
+                results.setdefault(stage, {})[key] = measure(fn, items, repeat)
+                if log:
+                    r = results[stage][key]
+                    log(f"{stage:<22} n={items:<6} {r['seconds']:>9.4f} с  {r['items_per_sec'] or 0:>10.1f}/с  "
+                        f"пик {r['peak_mb']:.1f} МБ")
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'sizes': list(sizes),
+                'repeat': repeat,
+            },
+            'results': results,
+            'skipped': skipped,
+        }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.25,
+            stage_thresholds: Optional[Dict[str, float]] = None,
+            memory_threshold: Optional[float] = None) -> List[dict]:
+    """Регрессии относительно базового файла: этапы/размеры, замедлившиеся больше порога.
+
+    threshold — допустимое относительное замедление (0.25 = +25 %), stage_thresholds —
+    пороги отдельных этапов; memory_threshold (если задан) — то же для пиковой памяти.
+    """
+    stage_thresholds = stage_thresholds or {}
+    regressions = []
+    for stage, by_size in current.get('results', {}).items():
+        base_stage = baseline.get('results', {}).get(stage, {})
+        limit = stage_thresholds.get(stage, threshold)
+        for size, cur in by_size.items():
+            base = base_stage.get(size)
+            if base is None:
+                continue
+            ratio = (max(cur['seconds'], MIN_COMPARE_SECONDS) /
+                     max(base['seconds'], MIN_COMPARE_SECONDS)) - 1
+            if ratio > limit:
+                regressions.append({'stage': stage, 'size': int(size), 'metric': 'seconds',
+                                    'baseline': base['seconds'], 'current': cur['seconds'],
+                                    'change': round(ratio, 3), 'threshold': limit})
+            if memory_threshold is not None and base.get('peak_mb'):
+                mem_ratio = cur['peak_mb'] / base['peak_mb'] - 1
+                if mem_ratio > memory_threshold:
+                    regressions.append({'stage': stage, 'size': int(size), 'metric': 'peak_mb',
+                                        'baseline': base['peak_mb'], 'current': cur['peak_mb'],
+                                        'change': round(mem_ratio, 3), 'threshold': memory_threshold})
+    return regressions
+
+
+def _stage_threshold(text: str):
+    stage, _, value = text.partition('=')
+    if stage not in STAGES or not value:
+        raise argparse.ArgumentTypeError(f"ожидается этап=порог, этапы: {', '.join(STAGES)}")
+    return stage, float(value)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='размеры пакетов (рационов)')
+    ap.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='этапы для замера')
+    ap.add_argument('--repeat', type=int, default=3, help='повторов на замер (берётся лучший)')
+    ap.add_argument('--max-pdfs', type=int, default=DEFAULT_MAX_PDFS, help='максимум PDF для parse_pdf_diet')
+    ap.add_argument('--seed', type=int, default=0, help='seed генератора синтетических данных')
+    ap.add_argument('--nutrient-model', help='путь к модели нутриентов (.pkl)')
+    ap.add_argument('--font', help='TTF-шрифт с кириллицей для синтетических PDF')
+    ap.add_argument('-o', '--output', help='куда записать результаты (JSON); по умолчанию stdout')
+    ap.add_argument('--baseline', help='базовый JSON для сравнения')
+    ap.add_argument('--save-baseline', help='дополнительно сохранить результаты как базовые')
+    ap.add_argument('--threshold', type=float, default=0.25, help='допустимое замедление (0.25 = +25 %%)')
+    ap.add_argument('--stage-threshold', type=_stage_threshold, action='append', default=[],
+                    help='порог отдельного этапа: этап=доля (можно повторять)')
+    ap.add_argument('--memory-threshold', type=float, help='допустимый рост пиковой памяти (доля)')
+    ap.add_argument('--trace', metavar='FILE.json',
+                    help='трасса вложенных этапов (Chrome trace) и сводка; замеры при этом медленнее')
+    args = ap.parse_args(argv)
+    if args.trace:
+        tracing.enable()
+
+    log = lambda message: print(message, file=sys.stderr)
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        bench = PipelineBenchmark(max(args.sizes), args.seed, args.nutrient_model, args.font, workdir)
+        report = bench.run(sorted(set(args.sizes)), args.stages, args.repeat, args.max_pdfs, log)
+    for stage, reason in report['skipped'].items():
+        log(f"{stage}: пропущен — {reason}")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, dict(args.stage_threshold),
+                              args.memory_threshold)
+        report['comparison'] = {'baseline': args.baseline, 'regressions': regressions}
+        for r in regressions:
+            log(f"РЕГРЕССИЯ {r['stage']} n={r['size']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                f"({r['change'] * 100:+.0f} %, порог {r['threshold'] * 100:+.0f} %)")
+        if not regressions:
+            log("Регрессий относительно базового файла нет")
+        exit_code = 1 if regressions else 0
+
+    if args.trace:
+        tracing.write_report(args.trace)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    if not args.output:
+        print(text)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Нагрузочный тест HTTP-сервиса предсказаний (scoring.service) на localhost.
+
+concurrency клиентов с keep-alive соединениями отправляют POST /predict со
+случайными рационами; в конце выводятся задержки клиента, пропускная способность
+и /metrics сервиса (средний размер микро-пакета).
+
+Запуск из корня проекта (сервис уже запущен: python -m scoring.service):
+    python -m benchmarks.service_load --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from nutrient_model import MODEL_FEATURES  # noqa: E402
+from preprocessing.filtration import INGREDIENT_FEATURES  # noqa: E402
+
+
+def random_ration(rng: random.Random) -> dict:
+    codes = rng.sample([code for code, _ in INGREDIENT_FEATURES], 8)
+    return {
+        'ingredients': {code: round(rng.uniform(1, 25), 2) for code in codes},
+        'nutrients': {f: round(rng.uniform(0, 40), 2) for f in MODEL_FEATURES},
+    }
+
+
+async def _request(reader, writer, host: str, method: str, path: str, body: bytes = b''):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = next(int(l.split(':', 1)[1]) for l in lines if l.lower().startswith('content-length'))
+    return status, await reader.readexactly(length)
+
+
+async def _client(host, port, requests_left, latencies, errors, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while requests_left:
+            requests_left.pop()
+            body = json.dumps(random_ration(rng)).encode('utf-8')
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, host, 'POST', '/predict', body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(url: str, requests: int = 2000, concurrency: int = 32) -> dict:
+    parts = urlsplit(url)
+    host, port = parts.hostname or '127.0.0.1', parts.port or 80
+    requests_left = list(range(requests))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, requests_left, latencies, errors, seed)
+                           for seed in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await _request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+
+    ordered = sorted(latencies)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2) if ordered else None
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99)},
+        'server_metrics': json.loads(metrics),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--url', default='http://127.0.0.1:8765', help='адрес запущенного сервиса')
+    ap.add_argument('--requests', type=int, default=2000, help='всего запросов')
+    ap.add_argument('--concurrency', type=int, default=32, help='одновременных клиентов')
+    args = ap.parse_args(argv)
+    results = asyncio.run(run_load(args.url, args.requests, args.concurrency))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 1 if results['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
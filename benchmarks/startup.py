@@ -0,0 +1,123 @@
+"""
+Время запуска GUI: профиль импортов (-X importtime) и время до первого окна.
+
+Каждый замер — отдельный процесс интерпретатора (холодный sys.modules).
+Окно создаётся на платформе Qt offscreen, БД — во временной папке.
+
+Запуск из корня проекта:
+    python -m benchmarks.startup [--repeat 3] [--top 15] [--check]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+APP_DIR = os.path.join(ROOT, 'app')
+
+# Цель: от запуска интерпретатора до показа главного окна
+TARGET_SECONDS = 1.0
+
+# Пакеты, которые не должны импортироваться до первого окна
+DEFERRED_PACKAGES = ('matplotlib', 'pandas', 'camelot', 'xgboost', 'sklearn', 'joblib', 'docx', 'reportlab')
+
+_WINDOW_SCRIPT = '''
+import json, os, sys, time
+t0 = time.perf_counter()
+import app_desktop as A
+t_import = time.perf_counter()
+os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+app = A.QApplication([])
+window = A.MainWindow()
+window.show()
+app.processEvents()
+t_window = time.perf_counter()
+print(json.dumps({
+    'import_seconds': t_import - t0,
+    'window_seconds': t_window - t0,
+    'deferred_loaded': [m for m in %r if m in sys.modules],
+}))
+window.close()
+'''
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([APP_DIR, ROOT] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    return env
+
+
+def import_profile(module: str = 'app_desktop', top: int = 15) -> dict:
+    """Сводка -X importtime: общее время импорта и самые дорогие пакеты верхнего уровня (по self-времени)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    ranked = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'total_ms': round(total_us / 1000, 1),
+        'top_packages_ms': {name: round(us / 1000, 1) for name, us in ranked},
+        'deferred_loaded': [name for name in DEFERRED_PACKAGES if name in packages],
+    }
+
+
+def time_to_first_window(repeat: int = 3) -> dict:
+    """Время до показа главного окна (лучшее из repeat запусков)."""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            # DatabaseManager по умолчанию пишет в database/milk_analysis.db относительно cwd
+            os.makedirs(os.path.join(tmp, 'database'))
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, '-c', _WINDOW_SCRIPT % (DEFERRED_PACKAGES,)],
+                                  cwd=tmp, env=_env(), capture_output=True, text=True, check=True)
+            wall = time.perf_counter() - start
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        run['process_seconds'] = wall
+        runs.append(run)
+    best = min(runs, key=lambda r: r['process_seconds'])
+    return {
+        'repeat': repeat,
+        'process_seconds': round(best['process_seconds'], 3),
+        'import_seconds': round(best['import_seconds'], 3),
+        'window_seconds': round(best['window_seconds'], 3),
+        'deferred_loaded': best['deferred_loaded'],
+        'target_seconds': TARGET_SECONDS,
+        'within_target': best['process_seconds'] <= TARGET_SECONDS and not best['deferred_loaded'],
+    }
+
+
+def run(repeat: int = 3, top: int = 15) -> dict:
+    return {
+        'import_profile': import_profile(top=top),
+        'first_window': time_to_first_window(repeat),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--repeat', type=int, default=3, help='число запусков для замера окна')
+    ap.add_argument('--top', type=int, default=15, help='число пакетов в профиле импортов')
+    ap.add_argument('--check', action='store_true', help='код возврата 1, если цель не достигнута')
+    args = ap.parse_args(argv)
+    results = run(args.repeat, args.top)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.check and not results['first_window']['within_target']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Синтетические данные для бенчмарков: рационы по кодам feed_types, строки «Сводного
+анализа» (Value_i) и PDF-отчёты с решётчатыми таблицами в раскладке реальных отчётов.
+
+Все генераторы детерминированы при заданном random.Random, поэтому замеры разных
+версий кода идут на одних и тех же данных.
+"""
+import random
+from typing import Dict, Optional
+
+from preprocessing.filtration import feed_types
+from preprocessing.parser import all_columns, synonyms_map
+
+# Названия строк «Сводного анализа» в порядке Value_i (синонимы в отчёты не попадают)
+NUTRIENT_ROWS = [name for name in all_columns if name not in synonyms_map]
+
+# Названия кормов в отчётах: справочные, кроме тех, что categorize_feeds_bulk узнаёт только по написанию из отчётов
+FEED_NAMES = dict(feed_types, **{'32': 'Сода. ЭНАПКХ'})
+
+# Колонки таблицы рецепта: название — первая, % СВ — шестая (см. parse_ingredients_table)
+RECIPE_HEADER = ['Ингредиенты', 'Кг ЕВ', 'Кг СВ', '% ЕВ', 'Цена', '% СВ']
+
+
+def synthetic_ration(rng: random.Random, min_items: int = 6, max_items: int = 14) -> Dict[str, float]:
+    """{код feed_types: % СВ} — случайный набор ингредиентов, в сумме 100 %."""
+    codes = rng.sample(sorted(feed_types), rng.randint(min_items, max_items))
+    weights = [rng.uniform(0.5, 10.0) for _ in codes]
+    total = sum(weights)
+    return {code: round(100.0 * w / total, 2) for code, w in zip(codes, weights)}
+
+
+def ration_feed_names(ration: Dict[str, float]) -> Dict[str, float]:
+    """{код: % СВ} -> {название корма: % СВ}, как после parse_ingredients_table."""
+    return {FEED_NAMES[code]: value for code, value in ration.items()}
+
+
+def synthetic_nutrients(rng: random.Random) -> Dict[str, float]:
+    """{название строки «Сводного анализа»: значение}."""
+    return {name: round(rng.uniform(0.0, 40.0), 2) for name in NUTRIENT_ROWS}
+
+
+def nutrient_values(nutrients: Dict[str, float]) -> Dict[str, float]:
+    """Строки «Сводного анализа» -> {Value_i: значение}, как nutrients_from_tables."""
+    return {f'Value_{i}': nutrients.get(name, 0) for i, name in enumerate(all_columns)}
+
+
+def _decimal(value: float) -> str:
+    # В отчётах десятичный разделитель — запятая
+    return f'{value:.2f}'.replace('.', ',')
+
+
+def write_ration_pdf(path: str, ration: Dict[str, float], nutrients: Dict[str, float],
+                     rng: Optional[random.Random] = None, font_path: Optional[str] = None) -> str:
+    """PDF с таблицей рецепта (стр. 1) и таблицей «Сводный анализ» (стр. 2) с линиями сетки.
+
+    ration — {код feed_types: % СВ}, nutrients — как из synthetic_nutrients.
+    Нужен reportlab и TTF-шрифт с кириллицей (см. reports.render.find_font).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import PageBreak, SimpleDocTemplate, Table, TableStyle
+
+    from reports.render import PDF_FONT_NAME, find_font
+
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, find_font(font_path)))
+    rng = rng or random.Random(0)
+    style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), PDF_FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('LEADING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ])
+
+    recipe = [RECIPE_HEADER]
+    for name, percent_sv in ration_feed_names(ration).items():
+        kg_sv = percent_sv * 0.25
+        recipe.append([name, _decimal(kg_sv / rng.uniform(0.3, 0.9)), _decimal(kg_sv),
+                       _decimal(rng.uniform(1, 30)), _decimal(rng.uniform(5, 60)), _decimal(percent_sv)])
+    recipe.append(['Итого', '', _decimal(sum(ration.values()) * 0.25), '100,00', '', _decimal(sum(ration.values()))])
+
+    analysis = [['Сводный анализ', 'Ед.', 'Значение']]
+    analysis += [[name, '%', _decimal(value)] for name, value in nutrients.items()]
+
+    elements = []
+    for i, rows in enumerate((recipe, analysis)):
+        if i:
+            elements.append(PageBreak())
+        table = Table(rows)
+        table.setStyle(style)
+        elements.append(table)
+    # «Сводный анализ» должен уместиться на одной странице: camelot видит продолжение как другую таблицу
+    SimpleDocTemplate(path, pagesize=A4, topMargin=28, bottomMargin=28).build(elements)
+    return path
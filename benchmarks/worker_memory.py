@@ -0,0 +1,144 @@
+"""
+Память процессов пула оценки: собственные модели в каждом процессе против общих.
+
+Режимы:
+  bare    — процесс только импортирует конвейер оценки (базовый уровень);
+  private — каждый процесс грузит 16 бустеров xgboost и pickle модели нутриентов сам;
+  shared  — модели опубликованы один раз (scoring.model_store), процессы подключаются к ним.
+
+Для каждого числа процессов все процессы пула выполняют небольшую оценку, затем
+снимаются RSS, PSS (общие страницы делятся между процессами) и USS (только свои
+страницы) из /proc/self/smaps_rollup. Рост USS с числом процессов — цена моделей.
+
+Запуск из корня проекта:
+    python -m benchmarks.worker_memory --workers 1 4 16 --nutrient-model parameters/nutrients-_acids_01617_140.pkl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+MODES = ('bare', 'private', 'shared')
+
+# Рационов в пробной оценке каждого процесса
+PROBE_RATIONS = 8
+
+_models = None
+
+
+def process_memory() -> Dict[str, float]:
+    """RSS/PSS/USS текущего процесса в МБ (без /proc — только пиковый RSS)."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.split()[-1] == 'kB'}
+    except OSError:
+        return {'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    uss = sum(fields.get(k, 0) for k in ('Private_Clean', 'Private_Dirty'))
+    return {'rss_mb': fields.get('Rss', 0) / 1024, 'pss_mb': fields.get('Pss', 0) / 1024, 'uss_mb': uss / 1024}
+
+
+def _init_worker(mode: str, nutrient_model_path: Optional[str], descriptor: Optional[dict]):
+    global _models
+    import scoring  # noqa: F401  — импорт конвейера одинаков для всех режимов
+
+    if mode == 'private':
+        from ingredient_model import get_ingredient_model
+        from nutrient_model import load_model
+
+        get_ingredient_model()
+        _models = load_model(nutrient_model_path)
+    elif mode == 'shared':
+        from scoring.model_store import install_worker_models, worker_nutrients_model
+
+        install_worker_models(descriptor)
+        _models = worker_nutrients_model()
+
+
+def _probe(seed: int):
+    """Пробная оценка (кроме bare) и память процесса; пауза даёт задачам разойтись по всем процессам."""
+    if _models is not None:
+        from benchmarks.synthetic import nutrient_values, synthetic_nutrients, synthetic_ration
+        from scoring import ingredients_frame, nutrients_frame, score_diets
+
+        rng = random.Random(seed)
+        score_diets([ingredients_frame(synthetic_ration(rng)) for _ in range(PROBE_RATIONS)],
+                    [nutrients_frame(nutrient_values(synthetic_nutrients(rng))) for _ in range(PROBE_RATIONS)],
+                    _models, with_features=False)
+    time.sleep(0.2)
+    return os.getpid(), process_memory()
+
+
+def measure(mode: str, workers: int, nutrient_model_path: Optional[str], start_method: str) -> dict:
+    from scoring.model_store import ModelStore
+
+    store = ModelStore(nutrient_model_path=nutrient_model_path) if mode == 'shared' else None
+    try:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                                 initializer=_init_worker,
+                                 initargs=(mode, nutrient_model_path, store and store.descriptor)) as pool:
+            per_pid = {}
+            for attempt in range(20):
+                per_pid.update(pool.map(_probe, range(attempt * workers, (attempt + 1) * workers)))
+                if len(per_pid) >= workers:
+                    break
+        elapsed = time.perf_counter() - started
+    finally:
+        if store is not None:
+            store.close()
+    stats = list(per_pid.values())
+    result = {'mode': mode, 'workers': workers, 'measured': len(stats), 'seconds': round(elapsed, 2),
+              'shared_store_mb': round(store.nbytes / 2 ** 20, 2) if store else None}
+    for key in stats[0]:
+        values = [s[key] for s in stats]
+        result[f'{key}_mean'] = round(sum(values) / len(values), 1)
+        result[f'{key}_max'] = round(max(values), 1)
+    if 'pss_mb' in stats[0]:
+        result['pss_total_mb'] = round(sum(s['pss_mb'] for s in stats), 1)
+    return result
+
+
+def format_table(results: List[dict]) -> str:
+    lines = [f"{'режим':<8} {'процессов':>9} {'RSS, МБ':>9} {'PSS, МБ':>9} {'USS, МБ':>9} {'ΣPSS, МБ':>9}"]
+    for r in results:
+        lines.append(f"{r['mode']:<8} {r['workers']:>9} {r['rss_mb_mean']:>9.1f} {r.get('pss_mb_mean', 0):>9.1f} "
+                     f"{r.get('uss_mb_mean', 0):>9.1f} {r.get('pss_total_mb', 0):>9.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16], help='числа процессов пула')
+    ap.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    ap.add_argument('--nutrient-model', default='parameters/nutrients-_acids_01617_140.pkl',
+                    help='путь к модели нутриентов')
+    ap.add_argument('--start-method', default='spawn', choices=multiprocessing.get_all_start_methods(),
+                    help='spawn — каждый процесс импортирует и грузит всё сам, как на хостах загрузки')
+    ap.add_argument('-o', '--output', help='записать результаты в JSON')
+    args = ap.parse_args(argv)
+    if not os.path.isfile(args.nutrient_model) and set(args.modes) - {'bare'}:
+        print(f"Нет модели нутриентов: {args.nutrient_model}", file=sys.stderr)
+        return 1
+
+    results = []
+    for workers in args.workers:
+        for mode in args.modes:
+            results.append(measure(mode, workers, args.nutrient_model, args.start_method))
+            print(format_table(results[-1:]).splitlines()[-1], file=sys.stderr, flush=True)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,7 @@
 from .db import DatabaseManager
+from .writer import BackgroundWriter
 
 __all__ = [
-    'DatabaseManager'
-]
\ No newline at end of file
+    'DatabaseManager',
+    'BackgroundWriter',
+]
@@ -1,62 +1,195 @@
+import math
 import sqlite3
-from typing import List, Dict, Optional
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Sequence, Union
+
+from .schema import (
+    ACID_KEYS,
+    ANALYSIS_COLUMNS,
+    DIET_RATIO_COLUMNS,
+    INPUT_STATS_UPSERT,
+    PREDICTION_COLUMNS,
+    SOURCES,
+    VECTOR_COLUMNS,
+    acid_key,
+    migrate,
+    add_to_summary,
+    pack_vector,
+    unpack_vector,
+)
+from utils.tracing import span, traced
+
+# Настройки соединения: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в WAL-режиме безопасен и не делает fsync на каждый commit
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA busy_timeout=5000',
+)
+
+DIET_COLUMNS = ('id', 'name') + DIET_RATIO_COLUMNS + ('created_at', 'updated_at')
+
+# Колонки постраничной выборки истории предсказаний (таблица результатов в GUI)
+HISTORY_COLUMNS = ('id', 'diet_name', 'prediction_date') + PREDICTION_COLUMNS
+_HISTORY_SQL_COLUMNS = ('p.id', 'd.name', 'p.prediction_date') + tuple(f'p.{c}' for c in PREDICTION_COLUMNS)
+
+
+def _to_float(value) -> Optional[float]:
+    """Приводит значение (в т.ч. numpy-скаляр) к float, None оставляет как есть."""
+    return None if value is None else float(value)
+
+
+def _acid_row(values: Union[Dict, Sequence], default=None) -> tuple:
+    """Значения 16 кислот в порядке ACID_KEYS.
+
+    Словарь может быть с ключами ('lauric') или русскими названиями ('Лауриновая');
+    последовательность/строка массива — в порядке выхода моделей.
+    """
+    if isinstance(values, dict):
+        by_key = {acid_key(k): v for k, v in values.items()}
+        return tuple(_to_float(by_key.get(key, default)) for key in ACID_KEYS)
+    values = list(values)
+    values += [default] * (len(ACID_KEYS) - len(values))
+    return tuple(_to_float(v) for v in values[:len(ACID_KEYS)])
+
+
+def _rows_to_dicts(cursor: sqlite3.Cursor) -> List[Dict]:
+    """Строки курсора -> словари; BLOB-векторы распаковываются в списки float."""
+    columns = [d[0] for d in cursor.description]
+    vector_idx = [i for i, c in enumerate(columns) if c in VECTOR_COLUMNS]
+    result = []
+    for row in cursor:
+        item = dict(zip(columns, row))
+        for i in vector_idx:
+            item[columns[i]] = unpack_vector(row[i])
+        result.append(item)
+    return result
 
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "database/milk_analysis.db"):
+    def __init__(self, db_path: str = "database/milk_analysis.db", cached_statements: int = 256):
         self.db_path = db_path
+        self.cached_statements = cached_statements
+        # Одно соединение на поток; список нужен, чтобы закрыть их все в close()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_database()
 
-    def init_database(self):
-        """Инициализация базы данных с необходимыми таблицами"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Создание таблицы рационов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS diets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Создание таблицы анализа жирных кислот
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fatty_acid_analysis (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                diet_id INTEGER,
-                lauric_acid REAL,
-                palmitic_acid REAL,
-                stearic_acid REAL,
-                oleic_acid REAL,
-                linoleic_acid REAL,
-                linolenic_acid REAL,
-                analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (diet_id) REFERENCES diets (id)
-            )
-        ''')
-
-        # Создание таблицы предсказаний
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                diet_id INTEGER,
-                predicted_lauric REAL,
-                predicted_palmitic REAL,
-                predicted_stearic REAL,
-                predicted_oleic REAL,
-                predicted_linoleic REAL,
-                predicted_linolenic REAL,
-                prediction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (diet_id) REFERENCES diets (id)
-            )
-        ''')
-
-        conn.commit()
+    def _insert_many(self, conn: sqlite3.Connection, sql: str, rows: List[tuple]) -> List[int]:
+        """executemany внутри открытой транзакции; возвращает присвоенные id.
+
+        BEGIN IMMEDIATE держит блокировку записи, поэтому id вставленных строк
+        идут подряд и заканчиваются на last_insert_rowid().
+        """
+        if not rows:
+            return []
+        with span('db.insert_many', rows=len(rows)):
+            conn.executemany(sql, rows)
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    def _update_summary(self, conn: sqlite3.Connection, source: str, ids: List[int]):
+        """Пакетное обновление acid_summary для только что вставленных строк."""
+        if ids:
+            with span('db.update_summary', rows=len(ids)):
+                add_to_summary(conn, source, ids[0], ids[-1])
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает новое соединение с настроенными pragma."""
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,  # транзакциями управляем явно через transaction()
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Переиспользуемое соединение текущего потока."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Явная транзакция на соединении текущего потока.
+
+        Вложенные вызовы присоединяются к внешней транзакции.
+        """
+        conn = self.connection
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            with span('db.commit'):
+                conn.execute('COMMIT')
+
+    @contextmanager
+    def snapshot(self):
+        """Согласованное чтение: все запросы внутри видят одно состояние БД (WAL не блокирует писателей)."""
+        conn = self.connection
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN DEFERRED')
+        try:
+            yield conn
+        finally:
+            conn.execute('COMMIT')
+
+    def close_thread_connection(self):
+        """Закрытие соединения текущего потока (для завершающихся рабочих потоков)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
         conn.close()
 
+    def close(self):
+        """Закрытие всех открытых соединений"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def init_database(self):
+        """Инициализация базы данных с необходимыми таблицами.
+
+        Существующие файлы БД обновляются до актуальной схемы на месте (см. schema.migrate).
+        """
+        with self.transaction() as conn:
+            migrate(conn)
+
     def add_diet(self, name: str,
                  corn_ratio: float = None,
                  soybean_ratio: float = None,
@@ -66,24 +199,24 @@ class DatabaseManager:
 
         Поля ratio необязательны. Если они не переданы, сохраняем только name.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        if all(v is None for v in (corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)):
-            cursor.execute('''
-                INSERT INTO diets (name)
-                VALUES (?)
-            ''', (name,))
-        else:
-            cursor.execute('''
-                INSERT INTO diets (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio))
-
-        diet_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return diet_id
+        with self.transaction() as conn:
+            if all(v is None for v in (corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)):
+                cursor = conn.execute('''
+                    INSERT INTO diets (name)
+                    VALUES (?)
+                ''', (name,))
+            else:
+                cursor = conn.execute('''
+                    INSERT INTO diets (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio))
+            return cursor.lastrowid
+
+    def add_diets(self, names: Sequence[str]) -> List[int]:
+        """Массовое добавление рационов одной транзакцией. Возвращает id в порядке names."""
+        rows = [(str(name),) for name in names]
+        with self.transaction() as conn:
+            return self._insert_many(conn, 'INSERT INTO diets (name) VALUES (?)', rows)
 
     def update_diet(self, diet_id: int, name: str,
                     corn_ratio: float = None,
@@ -94,157 +227,405 @@ class DatabaseManager:
 
         Если ratios не переданы, обновляем только name.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        if all(v is None for v in (corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)):
-            cursor.execute('''
-                UPDATE diets
-                SET name = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (name, diet_id))
-        else:
-            cursor.execute('''
-                UPDATE diets 
-                SET name = ?, corn_ratio = ?, soybean_ratio = ?, 
-                    alfalfa_ratio = ?, other_ratio = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio, diet_id))
-
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            if all(v is None for v in (corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio)):
+                conn.execute('''
+                    UPDATE diets
+                    SET name = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (name, diet_id))
+            else:
+                conn.execute('''
+                    UPDATE diets 
+                    SET name = ?, corn_ratio = ?, soybean_ratio = ?, 
+                        alfalfa_ratio = ?, other_ratio = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (name, corn_ratio, soybean_ratio, alfalfa_ratio, other_ratio, diet_id))
 
     def get_diet(self, diet_id: int) -> Optional[Dict]:
         """Получение конкретного рациона по ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM diets WHERE id = ?', (diet_id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if result:
-            return {
-                'id': result[0],
-                'name': result[1],
-                'corn_ratio': result[2],
-                'soybean_ratio': result[3],
-                'alfalfa_ratio': result[4],
-                'other_ratio': result[5],
-                'created_at': result[6],
-                'updated_at': result[7]
-            }
-        return None
+        cursor = self.connection.execute(
+            f'SELECT {", ".join(DIET_COLUMNS)} FROM diets WHERE id = ?', (diet_id,)
+        )
+        results = _rows_to_dicts(cursor)
+        return results[0] if results else None
 
     def get_all_diets(self) -> List[Dict]:
         """Получение всех рационов"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM diets ORDER BY created_at DESC')
-        results = cursor.fetchall()
-        conn.close()
-
-        return [{
-            'id': row[0],
-            'name': row[1],
-            'corn_ratio': row[2],
-            'soybean_ratio': row[3],
-            'alfalfa_ratio': row[4],
-            'other_ratio': row[5],
-            'created_at': row[6],
-            'updated_at': row[7]
-        } for row in results]
+        cursor = self.connection.execute(
+            f'SELECT {", ".join(DIET_COLUMNS)} FROM diets ORDER BY created_at DESC'
+        )
+        return _rows_to_dicts(cursor)
 
     def add_fatty_acid_analysis(self, diet_id: int, lauric: float, palmitic: float,
                                 stearic: float, oleic: float, linoleic: float = None,
-                                linolenic: float = None) -> int:
-        """Добавление результатов анализа жирных кислот"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            INSERT INTO fatty_acid_analysis 
-            (diet_id, lauric_acid, palmitic_acid, stearic_acid, oleic_acid, 
-             linoleic_acid, linolenic_acid)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (diet_id, lauric, palmitic, stearic, oleic, linoleic, linolenic))
-
-        analysis_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return analysis_id
-
-    def add_prediction(self, diet_id: int, predicted_values: Dict) -> int:
-        """Добавление результатов предсказания"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            INSERT INTO predictions 
-            (diet_id, predicted_lauric, predicted_palmitic, predicted_stearic,
-             predicted_oleic, predicted_linoleic, predicted_linolenic)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (diet_id, predicted_values.get('lauric', 0), predicted_values.get('palmitic', 0),
-              predicted_values.get('stearic', 0), predicted_values.get('oleic', 0),
-              predicted_values.get('linoleic', 0), predicted_values.get('linolenic', 0)))
-
-        prediction_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return prediction_id
+                                linolenic: float = None, **other_acids) -> int:
+        """Добавление результатов анализа жирных кислот.
 
-    def get_predictions_for_diet(self, diet_id: int) -> List[Dict]:
-        """Получение всех предсказаний для конкретного рациона"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Остальные кислоты передаются именованными аргументами по ключам ACID_KEYS
+        (например, butyric=3.1) или словарём через add_fatty_acid_analyses.
+        """
+        values = dict(other_acids, lauric=lauric, palmitic=palmitic, stearic=stearic,
+                      oleic=oleic, linoleic=linoleic, linolenic=linolenic)
+        return self.add_fatty_acid_analyses([diet_id], [values])[0]
 
-        cursor.execute('SELECT * FROM predictions WHERE diet_id = ? ORDER BY prediction_date DESC', (diet_id,))
-        results = cursor.fetchall()
-        conn.close()
+    def add_fatty_acid_analyses(self, diet_ids: Sequence[int], values: Sequence) -> List[int]:
+        """Массовое добавление результатов анализа одной транзакцией.
 
-        return [{
-            'id': row[0],
-            'diet_id': row[1],
-            'predicted_lauric': row[2],
-            'predicted_palmitic': row[3],
-            'predicted_stearic': row[4],
-            'predicted_oleic': row[5],
-            'predicted_linoleic': row[6],
-            'predicted_linolenic': row[7],
-            'prediction_date': row[8]
-        } for row in results]
+        values — словари (ключи или русские названия кислот) либо строки (списки,
+        2D numpy-массив) из 16 значений в порядке ACID_KEYS. Возвращает id в порядке входных строк.
+        """
+        if len(diet_ids) != len(values):
+            raise ValueError("Длины diet_ids и values не совпадают")
+        rows = [(int(diet_id),) + _acid_row(row) for diet_id, row in zip(diet_ids, values)]
+        with self.transaction() as conn:
+            ids = self._insert_many(conn, f'''
+                INSERT INTO fatty_acid_analysis (diet_id, {", ".join(ANALYSIS_COLUMNS)})
+                VALUES ({", ".join("?" * (len(ANALYSIS_COLUMNS) + 1))})
+            ''', rows)
+            self._update_summary(conn, 'analysis', ids)
+            return ids
+
+    def add_prediction(self, diet_id: int, predicted_values: Dict,
+                       ingredient_output=None, nutrient_output=None,
+                       ingredient_features=None, nutrient_features=None,
+                       uncertainty=None, ood_score: Optional[float] = None) -> int:
+        """Добавление результатов предсказания.
+
+        predicted_values — усреднённые значения 16 кислот (ключи или русские названия).
+        Выходы обоих потоков и подготовленные признаки сохраняются как BLOB float32,
+        uncertainty (как predicted_values) — тоже; ood_score — OOD-оценка рациона.
+        """
+        return self.add_predictions(
+            [diet_id], [predicted_values],
+            ingredient_outputs=None if ingredient_output is None else [ingredient_output],
+            nutrient_outputs=None if nutrient_output is None else [nutrient_output],
+            ingredient_features=None if ingredient_features is None else [ingredient_features],
+            nutrient_features=None if nutrient_features is None else [nutrient_features],
+            uncertainties=None if uncertainty is None else [uncertainty],
+            ood_scores=None if ood_score is None else [ood_score],
+        )[0]
+
+    def add_predictions(self, diet_ids: Sequence[int], predicted_values: Sequence,
+                        ingredient_outputs: Sequence = None, nutrient_outputs: Sequence = None,
+                        ingredient_features: Sequence = None, nutrient_features: Sequence = None,
+                        uncertainties: Sequence = None, ood_scores: Sequence = None) -> List[int]:
+        """Массовое добавление предсказаний одной транзакцией.
+
+        predicted_values — словари, как в add_prediction, либо строки (списки,
+        2D numpy-массив) из 16 значений в порядке ACID_KEYS; uncertainties — так же.
+        Векторные аргументы и ood_scores необязательны и при наличии должны совпадать
+        по длине с diet_ids. Возвращает id в порядке входных строк.
+        """
+        n = len(diet_ids)
+        if len(predicted_values) != n:
+            raise ValueError("Длины diet_ids и predicted_values не совпадают")
+        if uncertainties is not None:
+            uncertainties = [None if u is None else _acid_row(u) for u in uncertainties]
+        vectors = []
+        for column in (ingredient_outputs, nutrient_outputs, ingredient_features, nutrient_features, uncertainties):
+            if column is None:
+                vectors.append([None] * n)
+            elif len(column) != n:
+                raise ValueError("Длины векторных аргументов и diet_ids не совпадают")
+            else:
+                vectors.append([pack_vector(v) for v in column])
+        if ood_scores is None:
+            ood_scores = [None] * n
+        elif len(ood_scores) != n:
+            raise ValueError("Длины ood_scores и diet_ids не совпадают")
+        rows = [
+            (int(diet_id),) + _acid_row(row, default=0) + tuple(vec[i] for vec in vectors)
+            + (_to_float(ood_scores[i]),)
+            for i, (diet_id, row) in enumerate(zip(diet_ids, predicted_values))
+        ]
+        columns = PREDICTION_COLUMNS + VECTOR_COLUMNS + ('ood_score',)
+        with self.transaction() as conn:
+            ids = self._insert_many(conn, f'''
+                INSERT INTO predictions (diet_id, {", ".join(columns)})
+                VALUES ({", ".join("?" * (len(columns) + 1))})
+            ''', rows)
+            self._update_summary(conn, 'predictions', ids)
+            return ids
+
+    def get_predictions_for_diet(self, diet_id: int) -> List[Dict]:
+        """Получение всех предсказаний для конкретного рациона"""
+        columns = ('id', 'diet_id') + PREDICTION_COLUMNS + VECTOR_COLUMNS + ('ood_score', 'prediction_date')
+        cursor = self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM predictions WHERE diet_id = ? ORDER BY prediction_date DESC',
+            (diet_id,)
+        )
+        return _rows_to_dicts(cursor)
 
     def get_analysis_for_diet(self, diet_id: int) -> List[Dict]:
         """Получение всех результатов анализа для конкретного рациона"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM fatty_acid_analysis WHERE diet_id = ? ORDER BY analysis_date DESC', (diet_id,))
-        results = cursor.fetchall()
-        conn.close()
-
-        return [{
-            'id': row[0],
-            'diet_id': row[1],
-            'lauric_acid': row[2],
-            'palmitic_acid': row[3],
-            'stearic_acid': row[4],
-            'oleic_acid': row[5],
-            'linoleic_acid': row[6],
-            'linolenic_acid': row[7],
-            'analysis_date': row[8]
-        } for row in results]
+        columns = ('id', 'diet_id') + ANALYSIS_COLUMNS + ('analysis_date',)
+        cursor = self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM fatty_acid_analysis WHERE diet_id = ? ORDER BY analysis_date DESC',
+            (diet_id,)
+        )
+        return _rows_to_dicts(cursor)
 
     def delete_diet(self, diet_id: int):
         """Удаление рациона и всех связанных данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Сначала удалить связанные предсказания и анализы
-        cursor.execute('DELETE FROM predictions WHERE diet_id = ?', (diet_id,))
-        cursor.execute('DELETE FROM fatty_acid_analysis WHERE diet_id = ?', (diet_id,))
-        cursor.execute('DELETE FROM diets WHERE id = ?', (diet_id,))
-
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            # Сначала удалить связанные предсказания и анализы
+            conn.execute('DELETE FROM predictions WHERE diet_id = ?', (diet_id,))
+            conn.execute('DELETE FROM fatty_acid_analysis WHERE diet_id = ?', (diet_id,))
+            conn.execute('DELETE FROM diets WHERE id = ?', (diet_id,))
+
+    # -------------------- Постраничная история предсказаний --------------------
+    @staticmethod
+    def _history_filter(name_filter: Optional[str]) -> (str, list):
+        if not name_filter:
+            return '1', []
+        escaped = name_filter.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return "d.name LIKE ? ESCAPE '\\'", [f'%{escaped}%']
+
+    @traced('db.count_predictions')
+    def count_predictions(self, name_filter: Optional[str] = None) -> int:
+        """Число предсказаний (с фильтром по подстроке названия рациона)."""
+        where, params = self._history_filter(name_filter)
+        return self.connection.execute(f'''
+            SELECT COUNT(*) FROM predictions p LEFT JOIN diets d ON d.id = p.diet_id WHERE {where}
+        ''', params).fetchone()[0]
+
+    @traced('db.get_predictions_page')
+    def get_predictions_page(self, offset: int, limit: int, order_by: str = 'prediction_date',
+                             descending: bool = True, name_filter: Optional[str] = None) -> List[tuple]:
+        """Страница истории предсказаний в виде кортежей в порядке HISTORY_COLUMNS.
+
+        Сортировка и фильтрация выполняются в SQL; order_by — одна из HISTORY_COLUMNS.
+        """
+        if order_by not in HISTORY_COLUMNS:
+            raise ValueError(f"Недопустимая колонка сортировки: {order_by}")
+        sort_col = _HISTORY_SQL_COLUMNS[HISTORY_COLUMNS.index(order_by)]
+        direction = 'DESC' if descending else 'ASC'
+        where, params = self._history_filter(name_filter)
+        return self.connection.execute(f'''
+            SELECT {", ".join(_HISTORY_SQL_COLUMNS)}
+            FROM predictions p LEFT JOIN diets d ON d.id = p.diet_id
+            WHERE {where}
+            ORDER BY {sort_col} {direction}, p.id {direction}
+            LIMIT ? OFFSET ?
+        ''', params + [int(limit), int(offset)]).fetchall()
+
+    @traced('db.get_predictions_history')
+    def get_predictions_history(self, date_from=None, date_to=None, diet_ids: Sequence[int] = None,
+                                prediction_ids: Sequence[int] = None, with_uncertainty: bool = False) -> List[tuple]:
+        """Предсказания за окно дат / по рационам / по id в порядке p.id, кортежи в порядке HISTORY_COLUMNS.
+
+        with_uncertainty — последним элементом кортежа идёт неопределённость (список или None).
+        """
+        where, params = self._window_filter('p.prediction_date', date_from, date_to, diet_ids)
+        if prediction_ids is not None:
+            prediction_ids = [int(i) for i in prediction_ids]
+            where += f' AND p.id IN ({", ".join("?" * len(prediction_ids))})' if prediction_ids else ' AND 0'
+            params.extend(prediction_ids)
+        columns = _HISTORY_SQL_COLUMNS + (('p.uncertainty',) if with_uncertainty else ())
+        rows = self.connection.execute(f'''
+            SELECT {", ".join(columns)}
+            FROM predictions p LEFT JOIN diets d ON d.id = p.diet_id
+            WHERE {where}
+            ORDER BY p.id
+        ''', params).fetchall()
+        if with_uncertainty:
+            rows = [row[:-1] + (unpack_vector(row[-1]),) for row in rows]
+        return rows
+
+    @traced('db.get_training_rows')
+    def get_training_rows(self, date_from=None, date_to=None, diet_ids: Sequence[int] = None) -> List[tuple]:
+        """Лабораторные анализы с признаками рациона для переобучения моделей.
+
+        Кортежи (id анализа, diet_id, analysis_date, ingredient_features, 16 значений в порядке
+        ACID_KEYS). Признаки берутся из последнего предсказания того же рациона не позже даты
+        анализа (если таких нет — из последнего вообще); анализы рационов без признаков пропускаются.
+        """
+        where, params = self._window_filter('a.analysis_date', date_from, date_to, None)
+        if diet_ids is not None:
+            diet_ids = [int(d) for d in diet_ids]
+            where += f' AND a.diet_id IN ({", ".join("?" * len(diet_ids))})' if diet_ids else ' AND 0'
+            params.extend(diet_ids)
+        rows = self.connection.execute(f'''
+            SELECT * FROM (
+                SELECT a.id, a.diet_id, a.analysis_date, COALESCE((
+                    SELECT p.ingredient_features FROM predictions p
+                    WHERE p.diet_id = a.diet_id AND p.ingredient_features IS NOT NULL
+                      AND p.prediction_date <= a.analysis_date
+                    ORDER BY p.prediction_date DESC, p.id DESC LIMIT 1
+                ), (
+                    SELECT p.ingredient_features FROM predictions p
+                    WHERE p.diet_id = a.diet_id AND p.ingredient_features IS NOT NULL
+                    ORDER BY p.prediction_date DESC, p.id DESC LIMIT 1
+                )) AS features, {", ".join(f'a.{c}' for c in ANALYSIS_COLUMNS)}
+                FROM fatty_acid_analysis a
+                WHERE {where}
+            ) WHERE features IS NOT NULL
+            ORDER BY id
+        ''', params).fetchall()
+        return [row[:3] + (unpack_vector(row[3]),) + row[4:] for row in rows]
+
+    # -------------------- Агрегаты для графиков истории --------------------
+    @staticmethod
+    def _source(source: str):
+        if source not in SOURCES:
+            raise ValueError(f"Неизвестный источник: {source}. Допустимо: {', '.join(SOURCES)}")
+        return SOURCES[source]
+
+    @staticmethod
+    def _window_filter(date_col: str, date_from=None, date_to=None,
+                       diet_ids: Sequence[int] = None) -> (str, list):
+        """Условие WHERE по окну дат (включительно) и подмножеству рационов."""
+        clauses, params = [], []
+        if date_from is not None:
+            clauses.append(f'{date_col} >= ?')
+            params.append(str(date_from))
+        if date_to is not None:
+            clauses.append(f'{date_col} <= ?')
+            params.append(str(date_to))
+        if diet_ids is not None:
+            diet_ids = [int(d) for d in diet_ids]
+            clauses.append(f'diet_id IN ({", ".join("?" * len(diet_ids))})' if diet_ids else '0')
+            params.extend(diet_ids)
+        return ' AND '.join(clauses) or '1', params
+
+    @traced('db.aggregate_acids')
+    def aggregate_acids(self, source: str = 'analysis', date_from=None, date_to=None,
+                        diet_ids: Sequence[int] = None,
+                        quantiles: Sequence[float] = (0.25, 0.5, 0.75)) -> Dict[str, Dict]:
+        """Среднее, количество и квантили по каждой кислоте, посчитанные в SQL.
+
+        source — 'analysis' (лабораторные анализы) или 'predictions'.
+        date_from/date_to — строки 'YYYY-MM-DD[ HH:MM:SS]' или date/datetime.
+        Квантили — линейная интерполяция между соседними порядковыми статистиками;
+        в Python передаются только нужные строки, а не вся выборка.
+        """
+        table, date_col, columns = self._source(source)
+        where, params = self._window_filter(date_col, date_from, date_to, diet_ids)
+        conn = self.connection
+
+        stats = conn.execute(
+            f'SELECT {", ".join(f"COUNT({c}), AVG({c})" for c in columns)} FROM {table} WHERE {where}',
+            params
+        ).fetchone()
+
+        result = {}
+        for i, (key, col) in enumerate(zip(ACID_KEYS, columns)):
+            count, mean = stats[2 * i], stats[2 * i + 1]
+            item = {'count': count, 'mean': mean, 'quantiles': {}}
+            if count:
+                positions = {q: q * (count - 1) for q in quantiles}
+                ranks = sorted({r for p in positions.values() for r in (math.floor(p), math.ceil(p))})
+                ordered = dict(conn.execute(f'''
+                    SELECT rn, v FROM (
+                        SELECT {col} AS v, ROW_NUMBER() OVER (ORDER BY {col}) - 1 AS rn
+                        FROM {table} WHERE {col} IS NOT NULL AND {where}
+                    ) WHERE rn IN ({", ".join("?" * len(ranks))})
+                ''', params + ranks).fetchall())
+                for q, pos in positions.items():
+                    lo, hi = ordered[math.floor(pos)], ordered[math.ceil(pos)]
+                    item['quantiles'][q] = lo + (hi - lo) * (pos - math.floor(pos))
+            result[key] = item
+        return result
+
+    @traced('db.get_acid_series')
+    def get_acid_series(self, source: str, acid: str, date_from=None, date_to=None,
+                        diet_ids: Sequence[int] = None) -> List[tuple]:
+        """Временной ряд одной кислоты: [(unix-время в секундах, значение)] по возрастанию даты.
+
+        acid — ключ ('palmitic') или русское название; пустые значения пропускаются.
+        Выборка идёт по индексу даты, прореживание для графика — на стороне вызывающего.
+        """
+        table, date_col, columns = self._source(source)
+        key = acid_key(acid)
+        if key not in ACID_KEYS:
+            raise ValueError(f"Неизвестная кислота: {acid}")
+        col = columns[ACID_KEYS.index(key)]
+        where, params = self._window_filter(date_col, date_from, date_to, diet_ids)
+        return self.connection.execute(f'''
+            SELECT CAST(strftime('%s', {date_col}) AS INTEGER), {col} FROM {table}
+            WHERE {col} IS NOT NULL AND {date_col} IS NOT NULL AND {where}
+            ORDER BY {date_col}
+        ''', params).fetchall()
+
+    @traced('db.get_acid_summary')
+    def get_acid_summary(self, source: str = 'analysis', date_from=None, date_to=None) -> Dict[str, Dict]:
+        """Количество, среднее и стандартное отклонение по кислотам из сводной таблицы.
+
+        Сводка обновляется при вставке/удалении, поэтому время
+        запроса зависит только от числа дней в окне, а не от числа записей.
+        Границы окна — даты 'YYYY-MM-DD' (включительно).
+        """
+        self._source(source)
+        clauses, params = ['source = ?'], [source]
+        if date_from is not None:
+            clauses.append('day >= ?')
+            params.append(str(date_from)[:10])
+        if date_to is not None:
+            clauses.append('day <= ?')
+            params.append(str(date_to)[:10])
+        rows = self.connection.execute(f'''
+            SELECT acid, SUM(n), SUM(total), SUM(total_sq) FROM acid_summary
+            WHERE {' AND '.join(clauses)} GROUP BY acid
+        ''', params).fetchall()
+        by_acid = {acid: (n, total, total_sq) for acid, n, total, total_sq in rows}
+
+        result = {}
+        for key in ACID_KEYS:
+            n, total, total_sq = by_acid.get(key, (0, 0.0, 0.0))
+            if n:
+                mean = total / n
+                var = max(total_sq / n - mean * mean, 0.0)
+                result[key] = {'count': n, 'mean': mean, 'std': math.sqrt(var)}
+            else:
+                result[key] = {'count': 0, 'mean': None, 'std': None}
+        return result
+
+    # -------------------- Статистики входных признаков (scoring.drift) --------------------
+    @traced('db.merge_input_stats')
+    def merge_input_stats(self, rows: Sequence[tuple]) -> int:
+        """Слить пакетные статистики в input_stats одной транзакцией.
+
+        rows — (day, stream, feature, n, mean, m2, min, max, zeros), как из scoring.drift.
+        """
+        rows = [tuple(row) for row in rows if row[3]]
+        if rows:
+            with self.transaction() as conn:
+                conn.executemany(INPUT_STATS_UPSERT, rows)
+        return len(rows)
+
+    @traced('db.get_input_stats')
+    def get_input_stats(self, date_from=None, date_to=None, stream: Optional[str] = None) -> Dict[str, Dict]:
+        """{поток: {признак: count/mean/std/min/max/zero_rate}} за окно дней (включительно).
+
+        Дни объединяются по суммам n·mean и m2 + n·mean², поэтому время запроса зависит
+        от числа дней и признаков, а не от числа рационов.
+        """
+        clauses, params = [], []
+        if stream is not None:
+            clauses.append('stream = ?')
+            params.append(stream)
+        if date_from is not None:
+            clauses.append('day >= ?')
+            params.append(str(date_from)[:10])
+        if date_to is not None:
+            clauses.append('day <= ?')
+            params.append(str(date_to)[:10])
+        rows = self.connection.execute(f'''
+            SELECT stream, feature, SUM(n), SUM(n * mean), SUM(m2 + n * mean * mean),
+                   MIN(min_value), MAX(max_value), SUM(zeros)
+            FROM input_stats WHERE {' AND '.join(clauses) or '1'}
+            GROUP BY stream, feature
+        ''', params).fetchall()
+
+        result = {}
+        for stream_name, feature, n, total, total_sq, low, high, zeros in rows:
+            if not n:
+                continue
+            mean = total / n
+            m2 = max(total_sq - n * mean * mean, 0.0)
+            result.setdefault(stream_name, {})[feature] = {
+                'count': n, 'mean': mean, 'std': math.sqrt(m2 / (n - 1)) if n > 1 else 0.0,
+                'min': low, 'max': high, 'zero_rate': zeros / n,
+            }
+        return result
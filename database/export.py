@@ -0,0 +1,207 @@
+"""
+Колоночная выгрузка истории (рационы, предсказания, анализы) для анализа в pandas.
+
+Таблицы читаются из одного снимка БД порциями по chunk_size строк, поэтому
+память ограничена размером порции, а не размером истории. При наличии pyarrow
+каждая таблица пишется в Parquet (порция = row group), иначе — в .npz, где каждая
+колонка — отдельный .npy-массив.
+
+Запуск из корня проекта:
+    python -m database.export out_dir [--db database/milk_analysis.db] [--format npz]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import zipfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .db import DatabaseManager
+from .schema import ANALYSIS_COLUMNS, DIET_RATIO_COLUMNS, PREDICTION_COLUMNS, VECTOR_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Типы колонок: int — int64, float — float64, text — строка,
+# date — datetime64[s], vector — BLOB float32 -> матрица (n, dim)
+TABLES = {
+    'diets': ('diets', (
+        [('id', 'int'), ('name', 'text')]
+        + [(c, 'float') for c in DIET_RATIO_COLUMNS]
+        + [('created_at', 'date'), ('updated_at', 'date')]
+    )),
+    'predictions': ('predictions', (
+        [('id', 'int'), ('diet_id', 'int')]
+        + [(c, 'float') for c in PREDICTION_COLUMNS]
+        + [('ood_score', 'float'), ('prediction_date', 'date')]
+        + [(c, 'vector') for c in VECTOR_COLUMNS]
+    )),
+    'analysis': ('fatty_acid_analysis', (
+        [('id', 'int'), ('diet_id', 'int')]
+        + [(c, 'float') for c in ANALYSIS_COLUMNS]
+        + [('analysis_date', 'date')]
+    )),
+}
+
+NUMPY_TYPES = {'int': np.int64, 'float': np.float64, 'date': 'datetime64[s]', 'vector': np.float32}
+
+
+def _column_array(values: list, kind: str, dim: int = 0, width: int = 1) -> np.ndarray:
+    """Значения одной колонки порции -> типизированный numpy-массив."""
+    if kind == 'vector':
+        nan_row = np.full(dim, np.nan, dtype=np.float32).tobytes()
+        row_bytes = dim * 4
+        buf = b''.join(
+            nan_row if v is None else (v[:row_bytes] + nan_row[len(v):]) for v in values
+        )
+        return np.frombuffer(buf, dtype=np.float32).reshape(len(values), dim)
+    if kind == 'text':
+        return np.array(['' if v is None else v for v in values], dtype=f'<U{width}')
+    if kind == 'int':
+        return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+    return np.array(values, dtype=NUMPY_TYPES[kind])
+
+
+class _ParquetSink:
+    def __init__(self, path: str, spec: List[Tuple[str, str]], dims: Dict[str, int], n_rows: int):
+        self.path = path
+        self.spec = [(name, kind) for name, kind in spec if kind != 'vector' or dims[name]]
+        self.dims = dims
+        fields = []
+        for name, kind in self.spec:
+            if kind == 'vector':
+                fields.append(pa.field(name, pa.list_(pa.float32(), dims[name])))
+            elif kind == 'text':
+                fields.append(pa.field(name, pa.string()))
+            elif kind == 'date':
+                fields.append(pa.field(name, pa.timestamp('s')))
+            else:
+                fields.append(pa.field(name, pa.from_numpy_dtype(np.dtype(NUMPY_TYPES[kind]))))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, columns: Dict[str, np.ndarray]):
+        arrays = []
+        for name, kind in self.spec:
+            arr = columns[name]
+            if kind == 'vector':
+                arrays.append(pa.FixedSizeListArray.from_arrays(pa.array(arr.ravel()), self.dims[name]))
+            else:
+                arrays.append(pa.array(arr, type=self.schema.field(name).type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class _NpzSink:
+    """Каждая колонка пишется во временный .npy (заголовок с итоговой формой сразу),
+    в конце файлы складываются в zip без сжатия — np.load читает его напрямую."""
+
+    def __init__(self, path: str, spec: List[Tuple[str, str]], dims: Dict[str, int],
+                 n_rows: int, widths: Dict[str, int]):
+        self.path = path
+        self.tmpdir = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {}
+        for name, kind in spec:
+            if kind == 'text':
+                dtype = np.dtype(f'<U{widths[name]}')
+            else:
+                dtype = np.dtype(NUMPY_TYPES[kind])
+            shape = (n_rows, dims[name]) if kind == 'vector' else (n_rows,)
+            fp = open(os.path.join(self.tmpdir.name, f'{name}.npy'), 'wb')
+            np.lib.format.write_array_header_2_0(fp, {
+                'descr': np.lib.format.dtype_to_descr(dtype),
+                'fortran_order': False,
+                'shape': shape,
+            })
+            self.files[name] = fp
+
+    def write(self, columns: Dict[str, np.ndarray]):
+        for name, fp in self.files.items():
+            fp.write(np.ascontiguousarray(columns[name]).tobytes())
+
+    def close(self):
+        try:
+            with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+                for name, fp in self.files.items():
+                    fp.close()
+                    zf.write(fp.name, arcname=f'{name}.npy')
+        finally:
+            self.tmpdir.cleanup()
+
+
+def _export_table(conn: sqlite3.Connection, table: str, spec: List[Tuple[str, str]],
+                  path: str, fmt: str, chunk_size: int):
+    n_rows = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    dims, widths = {}, {}
+    for name, kind in spec:
+        if kind == 'vector':
+            dims[name] = (conn.execute(f'SELECT MAX(LENGTH({name})) FROM {table}').fetchone()[0] or 0) // 4
+        elif kind == 'text':
+            widths[name] = max(conn.execute(f'SELECT MAX(LENGTH({name})) FROM {table}').fetchone()[0] or 0, 1)
+
+    if fmt == 'parquet':
+        sink = _ParquetSink(path, spec, dims, n_rows)
+    else:
+        sink = _NpzSink(path, spec, dims, n_rows, widths)
+    try:
+        cursor = conn.execute(f'SELECT {", ".join(name for name, _ in spec)} FROM {table} ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            values = list(zip(*rows))
+            sink.write({
+                name: _column_array(list(values[i]), kind, dims.get(name, 0), widths.get(name, 1))
+                for i, (name, kind) in enumerate(spec)
+            })
+    finally:
+        sink.close()
+
+
+def export_history(db: DatabaseManager, out_dir: str, fmt: str = 'auto',
+                   chunk_size: int = 50000) -> Dict[str, str]:
+    """Выгрузка таблиц diets, predictions и analysis в колоночные файлы.
+
+    fmt — 'parquet', 'npz' или 'auto' (Parquet при установленном pyarrow).
+    Возвращает {имя таблицы: путь к файлу}.
+    """
+    if fmt == 'auto':
+        fmt = 'parquet' if PYARROW_AVAILABLE else 'npz'
+    if fmt == 'parquet' and not PYARROW_AVAILABLE:
+        raise ImportError("Для выгрузки в Parquet установите pyarrow: pip install pyarrow")
+    if fmt not in ('parquet', 'npz'):
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    with db.snapshot() as conn:
+        for name, (table, spec) in TABLES.items():
+            path = os.path.join(out_dir, f'{name}.{fmt}')
+            _export_table(conn, table, spec, path, fmt, chunk_size)
+            paths[name] = path
+    return paths
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Колоночная выгрузка истории предсказаний и анализов")
+    ap.add_argument('out_dir', help='папка для файлов выгрузки')
+    ap.add_argument('--db', default='database/milk_analysis.db', help='путь к файлу БД')
+    ap.add_argument('--format', default='auto', choices=['auto', 'parquet', 'npz'])
+    ap.add_argument('--chunk-size', type=int, default=50000, help='строк в одной порции')
+    args = ap.parse_args(argv)
+    with DatabaseManager(args.db) as db:
+        for name, path in export_history(db, args.out_dir, args.format, args.chunk_size).items():
+            print(f'{name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
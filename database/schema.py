@@ -0,0 +1,283 @@
+"""
+Схема базы данных и миграции.
+
+Версия схемы хранится в PRAGMA user_version. Новые таблицы создаются в исходном
+(нулевом) виде и доводятся до актуальной версии теми же миграциями, что и
+существующие файлы milk_analysis.db, поэтому раскладка колонок у них совпадает.
+"""
+import sqlite3
+from array import array
+from typing import List, Optional, Sequence
+
+from utils.constants import FATTY_ACIDS
+
+SCHEMA_VERSION = 5
+
+# Ключи всех 16 кислот в порядке выхода моделей
+ACID_KEYS = tuple(key for key, _ in FATTY_ACIDS)
+
+# Русское название -> ключ (GUI оперирует русскими названиями)
+ACID_KEY_BY_NAME = {name: key for key, name in FATTY_ACIDS}
+
+PREDICTION_COLUMNS = tuple(f'predicted_{key}' for key in ACID_KEYS)
+ANALYSIS_COLUMNS = tuple(f'{key}_acid' for key in ACID_KEYS)
+
+# Векторы (выходы потоков моделей, подготовленные признаки, неопределённость по 16 кислотам)
+# хранятся как BLOB float32
+VECTOR_COLUMNS = ('ingredient_output', 'nutrient_output', 'ingredient_features', 'nutrient_features',
+                  'uncertainty')
+
+DIET_RATIO_COLUMNS = ('corn_ratio', 'soybean_ratio', 'alfalfa_ratio', 'other_ratio')
+
+# Источники значений кислот: имя -> (таблица, колонка даты, колонки кислот в порядке ACID_KEYS)
+SOURCES = {
+    'predictions': ('predictions', 'prediction_date', PREDICTION_COLUMNS),
+    'analysis': ('fatty_acid_analysis', 'analysis_date', ANALYSIS_COLUMNS),
+}
+
+BASE_TABLES = (
+    # Таблица рационов
+    '''
+    CREATE TABLE IF NOT EXISTS diets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Таблица анализа жирных кислот
+    '''
+    CREATE TABLE IF NOT EXISTS fatty_acid_analysis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        diet_id INTEGER,
+        lauric_acid REAL,
+        palmitic_acid REAL,
+        stearic_acid REAL,
+        oleic_acid REAL,
+        linoleic_acid REAL,
+        linolenic_acid REAL,
+        analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (diet_id) REFERENCES diets (id)
+    )
+    ''',
+    # Таблица предсказаний
+    '''
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        diet_id INTEGER,
+        predicted_lauric REAL,
+        predicted_palmitic REAL,
+        predicted_stearic REAL,
+        predicted_oleic REAL,
+        predicted_linoleic REAL,
+        predicted_linolenic REAL,
+        prediction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (diet_id) REFERENCES diets (id)
+    )
+    ''',
+)
+
+
+def _existing_columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: Sequence[str], sql_type: str):
+    existing = _existing_columns(conn, table)
+    for column in columns:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {sql_type}')
+
+
+def _migrate_v1(conn: sqlite3.Connection):
+    """Все 16 кислот, векторы потоков/признаков, ratio-колонки рационов и индексы."""
+    _add_columns(conn, 'diets', DIET_RATIO_COLUMNS, 'REAL')
+    _add_columns(conn, 'predictions', PREDICTION_COLUMNS, 'REAL')
+    _add_columns(conn, 'predictions', VECTOR_COLUMNS[:4], 'BLOB')
+    _add_columns(conn, 'fatty_acid_analysis', ANALYSIS_COLUMNS, 'REAL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_diet_date '
+                 'ON predictions (diet_id, prediction_date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analysis_diet_date '
+                 'ON fatty_acid_analysis (diet_id, analysis_date)')
+
+
+SUMMARY_UPSERT = '''
+    INSERT INTO acid_summary (source, day, acid, n, total, total_sq)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (source, day, acid) DO UPDATE SET
+        n = n + excluded.n,
+        total = total + excluded.total,
+        total_sq = total_sq + excluded.total_sq
+'''
+
+
+def _summary_day(date_col: str) -> str:
+    """День строки в acid_summary: 'YYYY-MM-DD' или '' для строк без даты."""
+    return f"COALESCE(date({date_col}), '')"
+
+
+def add_to_summary(conn: sqlite3.Connection, source: str, first_id: int, last_id: int):
+    """Добавляет в acid_summary строки источника с id в диапазоне [first_id, last_id].
+
+    Вызывается один раз на пакет вставки (а не триггером на каждую строку):
+    один проход по диапазону id считает суммы сразу для всех 16 кислот.
+    Строки без даты (или с нераспознанной) копятся под днём '': NULL в первичном
+    ключе не совпадает сам с собой, и ON CONFLICT плодил бы дубликаты.
+    """
+    table, date_col, columns = SOURCES[source]
+    aggregates = ', '.join(f'COUNT({c}), TOTAL({c}), TOTAL({c} * {c})' for c in columns)
+    rows = conn.execute(f'''
+        SELECT {_summary_day(date_col)}, {aggregates} FROM {table}
+        WHERE id BETWEEN ? AND ? GROUP BY 1
+    ''', (first_id, last_id)).fetchall()
+    updates = []
+    for row in rows:
+        for i, key in enumerate(ACID_KEYS):
+            n, total, total_sq = row[1 + 3 * i:4 + 3 * i]
+            if n:
+                updates.append((source, row[0], key, n, total, total_sq))
+    conn.executemany(SUMMARY_UPSERT, updates)
+
+
+def _summary_delete_trigger(source: str) -> str:
+    """Триггер, вычитающий удалённые строки источника из acid_summary."""
+    table, date_col, columns = SOURCES[source]
+    statements = ''.join(f'''
+            UPDATE acid_summary
+            SET n = n - 1, total = total - OLD.{col}, total_sq = total_sq - OLD.{col} * OLD.{col}
+            WHERE OLD.{col} IS NOT NULL
+              AND source = '{source}' AND day = {_summary_day(f'OLD.{date_col}')} AND acid = '{key}';'''
+                         for key, col in zip(ACID_KEYS, columns))
+    return f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_delete AFTER DELETE ON {table}
+            BEGIN {statements}
+            END'''
+
+
+def _migrate_v2(conn: sqlite3.Connection):
+    """Сводная таблица по дням (count/sum/sum of squares), индексы по дате.
+
+    Графики истории читают acid_summary, размер которой зависит от числа дней,
+    а не от числа сохранённых рационов. Вставки DatabaseManager дополняют сводку
+    пакетно (add_to_summary), удаления вычитаются триггером.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS acid_summary (
+            source TEXT NOT NULL,
+            day TEXT,
+            acid TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            total_sq REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (source, day, acid)
+        )
+    ''')
+    for source, (table, date_col, columns) in SOURCES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} ({date_col})')
+        _rebuild_summary(conn, source)
+
+
+def _rebuild_summary(conn: sqlite3.Connection, source: str):
+    """Пересчёт сводки источника по сохранённым строкам и пересоздание триггера удаления."""
+    table = SOURCES[source][0]
+    conn.execute('DELETE FROM acid_summary WHERE source = ?', (source,))
+    max_id = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+    if max_id is not None:
+        add_to_summary(conn, source, 0, max_id)
+    conn.execute(f'DROP TRIGGER IF EXISTS trg_{table}_summary_delete')
+    conn.execute(_summary_delete_trigger(source))
+
+
+def _migrate_v3(conn: sqlite3.Connection):
+    """Неопределённость предсказания по кислотам (BLOB float32) и OOD-оценка рациона."""
+    _add_columns(conn, 'predictions', ('uncertainty',), 'BLOB')
+    _add_columns(conn, 'predictions', ('ood_score',), 'REAL')
+
+
+INPUT_STATS_UPSERT = '''
+    INSERT INTO input_stats (day, stream, feature, n, mean, m2, min_value, max_value, zeros)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, stream, feature) DO UPDATE SET
+        n = n + excluded.n,
+        mean = mean + (excluded.mean - mean) * excluded.n / (n + excluded.n),
+        m2 = m2 + excluded.m2 + (excluded.mean - mean) * (excluded.mean - mean) * n * excluded.n / (n + excluded.n),
+        min_value = MIN(min_value, excluded.min_value),
+        max_value = MAX(max_value, excluded.max_value),
+        zeros = zeros + excluded.zeros
+'''
+
+
+def _migrate_v4(conn: sqlite3.Connection):
+    """Бегущие статистики входных признаков рационов по дням (scoring.drift).
+
+    Строка — признак потока за день: количество, среднее и сумма квадратов отклонений
+    (Welford), min/max, число нулей. Новые пакеты сливаются в строку формулой Чана
+    (INPUT_STATS_UPSERT), так что размер таблицы зависит от числа дней, а не рационов.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS input_stats (
+            day TEXT NOT NULL,
+            stream TEXT NOT NULL,
+            feature TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            min_value REAL,
+            max_value REAL,
+            zeros INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, stream, feature)
+        )
+    ''')
+
+
+def _migrate_v5(conn: sqlite3.Connection):
+    """Строки без даты в acid_summary — под днём '' вместо NULL.
+
+    С day = NULL каждая вставка добавляла новую строку сводки, а триггер удаления
+    (day = NULL никогда не истинно) их не вычитал: сводка и триггеры пересоздаются.
+    """
+    for source in SOURCES:
+        _rebuild_summary(conn, source)
+
+
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+)
+
+
+def migrate(conn: sqlite3.Connection):
+    """Создаёт недостающие таблицы и применяет миграции (внутри открытой транзакции)."""
+    for sql in BASE_TABLES:
+        conn.execute(sql)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, step in MIGRATIONS:
+        if version < target:
+            step(conn)
+            version = target
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def acid_key(name: str) -> str:
+    """Ключ кислоты по ключу или русскому названию ('Масляная' -> 'butyric')."""
+    return ACID_KEY_BY_NAME.get(name, name)
+
+
+def pack_vector(values) -> Optional[bytes]:
+    """Упаковка вектора (список или numpy-массив) в компактный BLOB float32."""
+    if values is None:
+        return None
+    if hasattr(values, 'astype'):
+        return values.astype('float32').ravel().tobytes()
+    return array('f', (float(v) for v in values)).tobytes()
+
+
+def unpack_vector(blob: Optional[bytes]) -> Optional[List[float]]:
+    """Обратное преобразование BLOB float32 -> список float."""
+    if blob is None:
+        return None
+    vec = array('f')
+    vec.frombytes(blob)
+    return vec.tolist()
@@ -0,0 +1,144 @@
+"""
+Фоновая запись в БД (write-behind).
+
+Один поток-писатель забирает операции из ограниченной очереди и выполняет
+накопившиеся операции одной транзакцией. Вызывающий код сразу получает
+concurrent.futures.Future с результатом (обычно присвоенным id) и не ждёт commit.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from .db import DatabaseManager
+
+_STOP = object()
+
+
+class _Flush:
+    """Маркер в очереди: выставляет событие, когда всё до него записано."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BackgroundWriter:
+    def __init__(self, db: DatabaseManager, max_pending: int = 10000, max_batch: int = 500):
+        """
+        db          — менеджер БД (у потока-писателя будет своё соединение);
+        max_pending — размер очереди; при переполнении submit ждёт свободного места;
+        max_batch   — максимум операций в одной транзакции.
+        """
+        self.db = db
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    # -------------------- API производителя --------------------
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """Поставить в очередь вызов метода DatabaseManager (например, 'add_diet').
+
+        В аргументах можно передавать Future предыдущих операций — писатель
+        подставит их результат (например, diet_id ещё не записанного рациона).
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundWriter остановлен")
+        if not callable(getattr(self.db, method, None)):
+            raise AttributeError(f"У DatabaseManager нет метода {method}")
+        future = Future()
+        self._queue.put((future, method, args, kwargs))
+        return future
+
+    def add_diet(self, *args, **kwargs) -> Future:
+        return self.submit('add_diet', *args, **kwargs)
+
+    def add_prediction(self, *args, **kwargs) -> Future:
+        return self.submit('add_prediction', *args, **kwargs)
+
+    def add_fatty_acid_analysis(self, *args, **kwargs) -> Future:
+        return self.submit('add_fatty_acid_analysis', *args, **kwargs)
+
+    def merge_input_stats(self, *args, **kwargs) -> Future:
+        return self.submit('merge_input_stats', *args, **kwargs)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться записи всех операций, поставленных до вызова."""
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def shutdown(self, wait: bool = True):
+        """Остановить писателя; все уже поставленные операции будут записаны."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    # -------------------- Поток-писатель --------------------
+    @staticmethod
+    def _resolve(value, results: Dict[Future, object]):
+        if isinstance(value, Future):
+            return results[value] if value in results else value.result()
+        return value
+
+    def _call(self, op, results: Dict[Future, object]):
+        _, method, args, kwargs = op
+        args = [self._resolve(a, results) for a in args]
+        kwargs = {k: self._resolve(v, results) for k, v in kwargs.items()}
+        return getattr(self.db, method)(*args, **kwargs)
+
+    def _write_batch(self, batch: List[tuple]):
+        """Пакет одной транзакцией; при ошибке — повтор по одной операции."""
+        # Отменённые через Future.cancel() операции пропускаем
+        batch = [op for op in batch if op[0].set_running_or_notify_cancel()]
+        results = {}
+        try:
+            with self.db.transaction():
+                for op in batch:
+                    results[op[0]] = self._call(op, results)
+        except Exception:
+            for op in batch:
+                future = op[0]
+                try:
+                    future.set_result(self._call(op, {}))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for future, result in results.items():
+            future.set_result(result)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, markers = [], []
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _Flush):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            for marker in markers:
+                marker.done.set()
+        self.db.close_thread_connection()
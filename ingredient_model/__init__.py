@@ -1,5 +1,8 @@
-from .pipeline import predict_from_ingredients
+from .pipeline import predict_from_ingredients, predict_from_features, get_ingredient_model, set_ingredient_model
 
 __all__ = [
-    'predict_from_ingredients'
+    'predict_from_ingredients',
+    'predict_from_features',
+    'get_ingredient_model',
+    'set_ingredient_model',
 ]
\ No newline at end of file
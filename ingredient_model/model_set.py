@@ -0,0 +1,82 @@
+"""
+Версионированные наборы моделей ингредиентного потока.
+
+Исходные модели хакатона лежат прямо в parameters/ (xgb_output_*.json). Наборы,
+обученные заново (python -m ingredient_model.retrain), складываются в
+parameters/models/<версия>/ вместе с metrics.json и feature_stats.json; активный
+набор записан в parameters/models/active. Без этого файла используются исходные модели.
+
+Набор — либо 16 моделей по кислотам (xgb_output_<i>.json), либо одна модель с 16 выходами
+(xgb_multi.json, xgboost multi_strategy); раскладка определяется по наличию файла.
+"""
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+
+PARAMETERS_DIR = 'parameters'
+MODEL_SETS_DIR = os.path.join(PARAMETERS_DIR, 'models')
+ACTIVE_FILE = os.path.join(MODEL_SETS_DIR, 'active')
+N_TARGETS = 16
+MULTI_OUTPUT_FILE = 'xgb_multi.json'
+
+PER_TARGET = 'per_target'
+MULTI_OUTPUT = 'multi_output'
+
+
+def active_model_dir() -> str:
+    """Папка активного набора моделей (parameters/, если набор не выбран)."""
+    try:
+        with open(ACTIVE_FILE, encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return PARAMETERS_DIR
+    return os.path.join(MODEL_SETS_DIR, version) if version else PARAMETERS_DIR
+
+
+def model_layout(model_dir: Optional[str] = None) -> str:
+    """MULTI_OUTPUT, если в наборе есть xgb_multi.json, иначе PER_TARGET."""
+    model_dir = model_dir or active_model_dir()
+    return MULTI_OUTPUT if os.path.isfile(os.path.join(model_dir, MULTI_OUTPUT_FILE)) else PER_TARGET
+
+
+def booster_paths(model_dir: Optional[str] = None) -> List[str]:
+    """JSON-модели набора в порядке выходов: [xgb_multi.json] или 16 файлов по кислотам."""
+    model_dir = model_dir or active_model_dir()
+    if model_layout(model_dir) == MULTI_OUTPUT:
+        return [os.path.join(model_dir, MULTI_OUTPUT_FILE)]
+    return [os.path.join(model_dir, f"xgb_output_{i}.json") for i in range(N_TARGETS)]
+
+
+def list_model_sets() -> List[str]:
+    """Версии наборов в порядке создания."""
+    if not os.path.isdir(MODEL_SETS_DIR):
+        return []
+    return sorted(name for name in os.listdir(MODEL_SETS_DIR)
+                  if os.path.isfile(os.path.join(MODEL_SETS_DIR, name, 'metrics.json')))
+
+
+def new_version() -> str:
+    """Следующая версия: v<номер>-<дата>, номер на единицу больше последнего."""
+    numbers = [int(v[1:4]) for v in list_model_sets() if v[:1] == 'v' and v[1:4].isdigit()]
+    return f"v{max(numbers, default=0) + 1:03d}-{datetime.now():%Y%m%d}"
+
+
+def read_metrics(model_dir: Optional[str] = None) -> Optional[dict]:
+    try:
+        with open(os.path.join(model_dir or active_model_dir(), 'metrics.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def activate(version: Optional[str]):
+    """Сделать набор активным; None — вернуться к исходным моделям из parameters/."""
+    if version is None:
+        if os.path.exists(ACTIVE_FILE):
+            os.remove(ACTIVE_FILE)
+        return
+    if version not in list_model_sets():
+        raise ValueError(f"Нет набора моделей {version} в {MODEL_SETS_DIR}")
+    with open(ACTIVE_FILE, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
@@ -0,0 +1,161 @@
+"""
+Упакованный ансамбль ингредиентного потока: все деревья 16 бустеров в нескольких
+плоских numpy-массивах (пороги и значения листьев — float32, индексы признаков —
+малый целый тип) и предсказание без xgboost.
+
+Плоские массивы можно разместить в общей памяти (см. scoring.model_store): процессы
+пула подключают их без копирования вместо того, чтобы каждый грузил 16 JSON-моделей.
+
+Обход векторный: за шаг все деревья продвигаются на один уровень. Деревья упорядочены
+по убыванию глубины, поэтому на уровне k обходятся только те, что глубже k; деревья из
+одного листа (их в ансамбле больше трети) сразу прибавлены к base_score. Листья ссылаются
+сами на себя, правый потомок всегда следует за левым (так узлы раскладывает xgboost).
+"""
+import json
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .model_set import booster_paths
+
+# Строк за один проход обхода: матрица узлов [деревья, строки] остаётся в пределах десятков МБ
+PREDICT_CHUNK_ROWS = 256
+
+
+def _tree_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    depth = np.zeros(len(left), dtype=np.int64)
+    # Потомки в JSON xgboost всегда после родителя — достаточно одного прохода
+    for node in np.flatnonzero(left != -1):
+        depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return depth
+
+
+def _base_scores(text: str) -> List[float]:
+    """base_score из learner_model_param: '2.64E0' (xgboost < 3) или '[2.64E0,...]' (xgboost 3, по целям)."""
+    return [float(v) for v in str(text).strip('[]').split(',')]
+
+
+def pack_boosters(paths: Iterable[str]) -> Dict[str, np.ndarray]:
+    """JSON-модели xgboost -> словарь плоских массивов.
+
+    Модели — по одной на цель или с несколькими выходами (multi_strategy='one_output_per_tree',
+    цель дерева — tree_info); порядок выходов — порядок файлов, внутри файла — порядок целей.
+    """
+    trees, base_score = [], []
+    num_feature = 0
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            learner = json.load(f)['learner']
+        if learner['objective']['name'] != 'reg:squarederror':
+            raise ValueError(f"{path}: поддерживается только reg:squarederror")
+        num_feature = max(num_feature, int(learner['learner_model_param']['num_feature']))
+        offset = len(base_score)
+        base_score.extend(_base_scores(learner['learner_model_param']['base_score']))
+        model = learner['gradient_booster']['model']
+        tree_info = model.get('tree_info') or [0] * len(model['trees'])
+        for tree, tree_target in zip(model['trees'], tree_info):
+            if int(tree['tree_param'].get('size_leaf_vector', 1)) > 1:
+                raise ValueError(f"{path}: деревья с векторными листьями (multi_output_tree) не упаковываются")
+            target = offset + int(tree_target)
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            # У листьев split_conditions — значение листа (уже с учётом eta)
+            value = np.asarray(tree['split_conditions'], dtype=np.float32)
+            if len(left) == 1:
+                base_score[target] += float(value[0])
+                continue
+            split = left != -1
+            if np.any(right[split] != left[split] + 1):
+                raise ValueError(f"{path}: правый потомок не следует за левым")
+            trees.append((int(_tree_depths(left, right).max()), target, left, value,
+                          np.asarray(tree['split_indices'], dtype=np.int64),
+                          np.asarray(tree['default_left'], dtype=bool)))
+    if not base_score:
+        raise ValueError("Не передано ни одной модели")
+    # Глубокие деревья первыми: на уровне k активен префикс из level_counts[k] деревьев
+    trees.sort(key=lambda t: -t[0])
+    depths = np.asarray([t[0] for t in trees], dtype=np.int64)
+    max_depth = int(depths.max()) if len(trees) else 0
+
+    feature, threshold, value, left, default_left, roots = [], [], [], [], [], []
+    n_nodes = 0
+    for _, _, tree_left, tree_value, tree_feature, tree_default in trees:
+        leaf = tree_left == -1
+        own = np.arange(len(tree_left)) + n_nodes
+        roots.append(n_nodes)
+        left.append(np.where(leaf, own, tree_left + n_nodes))
+        feature.append(np.where(leaf, 0, tree_feature))
+        # Лист никуда не переходит: x >= inf ложно, пропуск (nan) уходит «влево» — в себя
+        threshold.append(np.where(leaf, np.float32(np.inf), tree_value))
+        value.append(np.where(leaf, tree_value, np.float32(0)))
+        default_left.append(tree_default | leaf)
+        n_nodes += len(tree_left)
+    index_type = np.int32 if n_nodes < 2 ** 31 else np.int64
+    concat = (lambda parts, dtype: np.concatenate(parts).astype(dtype)) if trees else \
+        (lambda parts, dtype: np.zeros(0, dtype=dtype))
+    return {
+        'feature': concat(feature, np.min_scalar_type(max(num_feature - 1, 0))),
+        'threshold': concat(threshold, np.float32),
+        'value': concat(value, np.float32),
+        'left': concat(left, index_type),
+        'default_left': concat(default_left, bool),
+        'roots': np.asarray(roots, dtype=index_type),
+        'tree_target': np.asarray([t[1] for t in trees], dtype=np.min_scalar_type(max(len(base_score) - 1, 0))),
+        'level_counts': np.asarray([(depths > k).sum() for k in range(max_depth)], dtype=np.int32),
+        'base_score': np.asarray(base_score, dtype=np.float32),
+        'num_feature': np.asarray([num_feature], dtype=np.int32),
+    }
+
+
+class PackedEnsemble:
+    """Предсказание по упакованным массивам (собственным или подключённым из общей памяти)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.left = arrays['left']
+        self.default_left = arrays['default_left']
+        self.roots = arrays['roots']
+        self.level_counts = arrays['level_counts']
+        self.base_score = arrays['base_score']
+        self.num_feature = int(arrays['num_feature'][0])
+        # Сумма листьев по целям — одно умножение на матрицу принадлежности деревьев [деревья, цели]
+        self._membership = np.zeros((len(self.roots), len(self.base_score)), dtype=np.float32)
+        self._membership[np.arange(len(self.roots)), arrays['tree_target']] = 1.0
+
+    @classmethod
+    def from_boosters(cls, paths: Optional[Iterable[str]] = None) -> 'PackedEnsemble':
+        return cls(pack_boosters(paths or booster_paths()))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.arrays.values())
+
+    def predict(self, X) -> np.ndarray:
+        """[n_samples, n_features] -> [n_samples, n_targets], как столбцы 16 бустеров."""
+        # Сравнение с порогом в float32, как в xgboost
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.num_feature:
+            raise ValueError(f"Ожидается матрица [n, {self.num_feature}], получено {X.shape}")
+        out = np.empty((len(X), len(self.base_score)), dtype=np.float32)
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            out[start:start + PREDICT_CHUNK_ROWS] = self._predict_chunk(X[start:start + PREDICT_CHUNK_ROWS])
+        return out
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n = len(X)
+        flat = X.ravel()
+        row_base = np.arange(n) * self.num_feature
+        has_missing = bool(np.isnan(flat).any())
+        # Узлы [деревья, строки]: активный префикс деревьев — непрерывный блок памяти
+        node = np.repeat(self.roots[:, None], n, axis=1)
+        for count in self.level_counts:
+            active = node[:count]
+            x = flat[self.feature[active] + row_base]
+            go_right = x >= self.threshold[active]
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~self.default_left[active], go_right)
+            node[:count] = self.left[active] + go_right
+        return (self._membership.T @ self.value[node]).T + self.base_score
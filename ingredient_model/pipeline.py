@@ -1,27 +1,68 @@
-from xgboost import XGBRegressor
+import json
+import threading
+from typing import Optional
+
 import numpy as np
 
 from preprocessing import prepare_ingredients
+from utils.tracing import span, traced
+from .model_set import MULTI_OUTPUT, N_TARGETS, booster_paths, model_layout
+
+INGR_MODEL = None
+_INGR_MODEL_LOCK = threading.Lock()
 
 
-def _load_ingredient_model():
+@traced('ingredient_model.load')
+def _load_ingredient_model(model_dir: Optional[str] = None):
+    """16 XGBRegressor по кислотам или один XGBRegressor с 16 выходами — по раскладке набора."""
+    from xgboost import XGBRegressor  # xgboost (и sklearn) импортируются при первом предсказании
+
     models = []
-    for i in range(16):
+    for path in booster_paths(model_dir):
         model = XGBRegressor()
-        model.load_model(f"parameters/xgb_output_{i}.json")
+        model.load_model(path)
         models.append(model)
+    if model_layout(model_dir) == MULTI_OUTPUT:
+        config = json.loads(models[0].get_booster().save_config())
+        n_targets = int(config['learner']['learner_model_param']['num_target'])
+        if n_targets != N_TARGETS:
+            raise ValueError(f"{booster_paths(model_dir)[0]}: выходов {n_targets}, ожидается {N_TARGETS}")
+        return models[0]
     return models
 
 
-INGR_MODEL = _load_ingredient_model()
+def get_ingredient_model():
+    """Модели активного набора (список по кислотам, модель с 16 выходами или установленный
+    PackedEnsemble); загружаются один раз."""
+    global INGR_MODEL
+    with _INGR_MODEL_LOCK:
+        if INGR_MODEL is None:
+            INGR_MODEL = _load_ingredient_model()
+    return INGR_MODEL
+
+
+def set_ingredient_model(model):
+    """Заменить модели ингредиентного потока, например ансамблем из общей памяти (scoring.model_store)."""
+    global INGR_MODEL
+    with _INGR_MODEL_LOCK:
+        INGR_MODEL = model
 
 
 def predict_from_ingredients(ingredients_by_name):
     """Предсказывает кислоты из состава ингредиентов."""
-    X_df = prepare_ingredients(ingredients_by_name)
-    preds = []
-    for model in INGR_MODEL:
-        y_pred = model.predict(X_df.to_numpy())
-        preds.append(y_pred)
-    Y_pred = np.column_stack(preds)  # [n_samples, n_targets]
+    return predict_from_features(prepare_ingredients(ingredients_by_name).to_numpy())
+
+
+def predict_from_features(X):
+    """Предсказание по уже подготовленным признакам (результат prepare_ingredients)."""
+    model = get_ingredient_model()
+    with span('ingredient_model.predict', rows=len(X)):
+        if hasattr(model, 'predict'):
+            # Модель с 16 выходами или упакованный ансамбль: все цели за один вызов
+            return model.predict(X)
+        preds = []
+        for i, booster in enumerate(model):
+            with span('ingredient_model.booster', target=i):
+                preds.append(booster.predict(X))
+        Y_pred = np.column_stack(preds)  # [n_samples, n_targets]
     return Y_pred
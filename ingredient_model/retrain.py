@@ -0,0 +1,406 @@
+"""
+Переобучение 16 моделей ингредиентного потока по лабораторным анализам из БД.
+
+Обучающая матрица: анализы fatty_acid_analysis (цели — 16 кислот) и подготовленные
+признаки рациона (результат prepare_ingredients), сохранённые с предсказаниями того же
+рациона. Модели кислот обучаются параллельно в пуле процессов: для каждой —
+ограниченный случайный поиск гиперпараметров (--trials вариантов) с k-кратной
+кросс-валидацией на обучающей части, затем дообучение лучшего варианта и оценка
+MSE/R² на отложенной выборке. Результат — новый набор в parameters/models/<версия>/
+(xgb_output_*.json, metrics.json, feature_stats.json); --activate делает его активным.
+
+С --multi-output обучается одна модель с 16 выходами (xgb_multi.json, xgboost
+multi_strategy) по анализам, где измерены все кислоты; в пуле тогда считаются пары
+(вариант, блок) кросс-валидации. Загрузчик определяет раскладку набора сам.
+
+Запуск из корня проекта:
+    python -m ingredient_model.retrain --db database/milk_analysis.db --workers 4 --activate
+    python -m ingredient_model.retrain --multi-output --workers 4
+    python -m ingredient_model.retrain --list
+    python -m ingredient_model.retrain --use v002-20250101     # или --use original
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.constants import FATTY_ACIDS
+
+from . import model_set
+
+ACID_KEYS = tuple(key for key, _ in FATTY_ACIDS)
+
+# Метрики исходных моделей хакатона (валидация, README) — для сравнения с новыми наборами
+BASELINE_METRICS = {'mse': 0.1617, 'r2': 0.878}
+
+# Пространство поиска; первый вариант — DEFAULT_PARAMS, остальные — случайные без повторов
+SEARCH_SPACE = {
+    'n_estimators': (200, 400, 600),
+    'max_depth': (3, 4, 5, 6, 8),
+    'learning_rate': (0.03, 0.05, 0.1, 0.2),
+    'subsample': (0.7, 0.85, 1.0),
+    'colsample_bytree': (0.7, 0.85, 1.0),
+    'min_child_weight': (1, 3, 5),
+}
+DEFAULT_PARAMS = {'n_estimators': 400, 'max_depth': 6, 'learning_rate': 0.1,
+                  'subsample': 1.0, 'colsample_bytree': 1.0, 'min_child_weight': 1}
+
+# Меньше строк с анализом кислоты — её модель переносится из активного набора без переобучения
+MIN_ROWS = 30
+
+
+def load_training_data(db_path: str, date_from=None, date_to=None) -> Tuple[np.ndarray, np.ndarray]:
+    """X [n, признаки] (float32) и Y [n, 16] (nan — кислота не измерялась) из БД приложения."""
+    from database import DatabaseManager
+
+    with DatabaseManager(db_path) as db:
+        rows = db.get_training_rows(date_from, date_to)
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros((0, len(ACID_KEYS)))
+    widths = {len(row[3]) for row in rows}
+    if len(widths) != 1:
+        raise ValueError(f"Признаки рационов разной длины: {sorted(widths)}")
+    X = np.asarray([row[3] for row in rows], dtype=np.float32)
+    Y = np.asarray([[np.nan if v is None else v for v in row[4:]] for row in rows], dtype=float)
+    return X, Y
+
+
+def sample_candidates(trials: int, seed: int = 0) -> List[dict]:
+    """Варианты гиперпараметров: DEFAULT_PARAMS и trials - 1 случайных из SEARCH_SPACE."""
+    rng = random.Random(seed)
+    candidates = [dict(DEFAULT_PARAMS)]
+    total = int(np.prod([len(v) for v in SEARCH_SPACE.values()]))
+    while len(candidates) < min(trials, total):
+        params = {name: rng.choice(values) for name, values in SEARCH_SPACE.items()}
+        if params not in candidates:
+            candidates.append(params)
+    return candidates[:max(trials, 1)]
+
+
+def _regressor(params: dict, seed: int, multi_strategy: Optional[str] = None):
+    from xgboost import XGBRegressor
+
+    extra = {'multi_strategy': multi_strategy} if multi_strategy else {}
+    # Параллелизм — по задачам в пуле процессов, поэтому внутри одной модели один поток
+    return XGBRegressor(objective='reg:squarederror', tree_method='hist', n_jobs=1, random_state=seed,
+                        **params, **extra)
+
+
+def _fold_indices(n: int, folds: int, seed: int) -> List[np.ndarray]:
+    order = np.random.default_rng(seed).permutation(n)
+    return np.array_split(order, folds)
+
+
+def _fit_target(task: dict) -> dict:
+    """Задача процесса пула: поиск, кросс-валидация, дообучение и оценка модели одной кислоты."""
+    started = time.perf_counter()
+    X_train, y_train, X_test, y_test = task['X_train'], task['y_train'], task['X_test'], task['y_test']
+    seed = task['seed']
+    folds = _fold_indices(len(X_train), min(task['folds'], len(X_train)), seed)
+    best_params, best_cv = None, np.inf
+    for params in task['candidates']:
+        errors = []
+        for k, valid in enumerate(folds):
+            train = np.concatenate(folds[:k] + folds[k + 1:])
+            model = _regressor(params, seed).fit(X_train[train], y_train[train])
+            errors.append(float(np.mean((model.predict(X_train[valid]) - y_train[valid]) ** 2)))
+        cv_mse = float(np.mean(errors))
+        if cv_mse < best_cv:
+            best_params, best_cv = params, cv_mse
+    model = _regressor(best_params, seed).fit(X_train, y_train)
+    booster = model.get_booster()
+    if task['feature_names']:
+        booster.feature_names = task['feature_names']
+    booster.save_model(task['out_path'])
+    result = {'status': 'trained', 'params': best_params, 'cv_mse': best_cv,
+              'n_train': int(len(X_train)), 'n_test': int(len(X_test))}
+    if len(X_test):
+        pred = model.predict(X_test)
+        mse = float(np.mean((pred - y_test) ** 2))
+        variance = float(np.var(y_test))
+        result.update(mse=mse, r2=1.0 - mse / variance if variance > 0 else None)
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def _cv_multi_output(task: dict) -> float:
+    """Задача процесса пула для модели с 16 выходами: MSE одного варианта на одном блоке."""
+    X, Y, train, valid = task['X'], task['Y'], task['train'], task['valid']
+    model = _regressor(task['params'], task['seed'], task['multi_strategy']).fit(X[train], Y[train])
+    return float(np.mean((model.predict(X[valid]) - Y[valid]) ** 2))
+
+
+def _map(fn, tasks: list, workers: int) -> list:
+    if workers <= 1 or len(tasks) <= 1:
+        return [fn(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return list(pool.map(fn, tasks))
+
+
+def _feature_names(paths: Sequence[str], width: int) -> Optional[List[str]]:
+    """Имена признаков из текущих моделей (если их число совпадает с обучающей матрицей)."""
+    try:
+        with open(paths[0], encoding='utf-8') as f:
+            names = json.load(f)['learner'].get('feature_names') or []
+    except (OSError, ValueError, KeyError):
+        return None
+    return list(names) if len(names) == width else None
+
+
+def _write_feature_stats(out_dir: str, X: np.ndarray, feature_names: Optional[List[str]]):
+    """Диапазоны ингредиентного потока по обучающей матрице; остальные потоки — из активного набора."""
+    from scoring.uncertainty import feature_stats_path, save_feature_stats
+
+    streams = {}
+    try:
+        with open(feature_stats_path(), encoding='utf-8') as f:
+            streams = json.load(f)['streams']
+    except FileNotFoundError:
+        pass
+    streams['ingredient'] = {
+        'source': 'dataset',
+        'rows': int(len(X)),
+        'features': feature_names or [f'f{i}' for i in range(X.shape[1])],
+        'low': np.nanmin(X, axis=0).astype(float).tolist(),
+        'high': np.nanmax(X, axis=0).astype(float).tolist(),
+    }
+    save_feature_stats(streams, os.path.join(out_dir, 'feature_stats.json'))
+
+
+def _fit_per_target(X, Y, out_dir, is_test, candidates, workers, folds, seed, min_rows,
+                    feature_names, progress) -> Dict[str, dict]:
+    """16 моделей по кислотам; пул — по кислотам. Кислоты с малым числом анализов переносятся."""
+    current_dir = model_set.active_model_dir()
+    acids: Dict[str, dict] = {}
+    tasks = []
+    for i, key in enumerate(ACID_KEYS):
+        out_path = os.path.join(out_dir, f"xgb_output_{i}.json")
+        measured = ~np.isnan(Y[:, i])
+        if measured.sum() < min_rows:
+            if model_set.model_layout(current_dir) == model_set.MULTI_OUTPUT:
+                raise ValueError(f"{key}: меньше {min_rows} анализов, а модель по кислоте нельзя перенести "
+                                 f"из набора с 16 выходами ({current_dir}); используйте --multi-output")
+            shutil.copyfile(model_set.booster_paths(current_dir)[i], out_path)
+            acids[key] = {'status': 'copied', 'rows': int(measured.sum()),
+                          'reason': f"меньше {min_rows} анализов; модель перенесена из {current_dir}"}
+            continue
+        train, test = measured & ~is_test, measured & is_test
+        tasks.append((key, {
+            'X_train': X[train], 'y_train': Y[train, i], 'X_test': X[test], 'y_test': Y[test, i],
+            'candidates': candidates, 'folds': folds, 'seed': seed + i,
+            'out_path': out_path, 'feature_names': feature_names,
+        }))
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = map(_fit_target, (task for _, task in tasks))
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+        results = pool.map(_fit_target, (task for _, task in tasks))
+    try:
+        for (key, _), result in zip(tasks, results):
+            acids[key] = result
+            if progress:
+                progress(key, result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return acids
+
+
+def _fit_multi_output(X, Y, out_dir, is_test, candidates, workers, folds, seed, min_rows,
+                      feature_names, multi_strategy, progress) -> Dict[str, dict]:
+    """Одна модель с 16 выходами (xgb_multi.json) по анализам со всеми кислотами; пул — по
+    парам (вариант, блок) кросс-валидации."""
+    started = time.perf_counter()
+    complete = ~np.isnan(Y).any(axis=1)
+    if complete.sum() < min_rows:
+        raise ValueError(f"Анализов со всеми 16 кислотами {int(complete.sum())}, нужно не меньше {min_rows}")
+    train, test = complete & ~is_test, complete & is_test
+    X_train, Y_train = X[train], Y[train]
+    fold_index = _fold_indices(len(X_train), min(folds, len(X_train)), seed)
+    tasks = []
+    for params in candidates:
+        for k, valid in enumerate(fold_index):
+            tasks.append({'X': X_train, 'Y': Y_train, 'valid': valid, 'params': params, 'seed': seed,
+                          'train': np.concatenate(fold_index[:k] + fold_index[k + 1:]),
+                          'multi_strategy': multi_strategy})
+    errors = np.asarray(_map(_cv_multi_output, tasks, workers)).reshape(len(candidates), len(fold_index))
+    best = int(np.argmin(errors.mean(axis=1)))
+    best_params, best_cv = candidates[best], float(errors[best].mean())
+
+    model = _regressor(best_params, seed, multi_strategy).fit(X_train, Y_train)
+    booster = model.get_booster()
+    if feature_names:
+        booster.feature_names = feature_names
+    booster.save_model(os.path.join(out_dir, model_set.MULTI_OUTPUT_FILE))
+    pred = model.predict(X[test]) if test.any() else None
+    seconds = round(time.perf_counter() - started, 2)
+    acids: Dict[str, dict] = {}
+    for i, key in enumerate(ACID_KEYS):
+        result = {'status': 'trained', 'params': best_params, 'cv_mse': best_cv,
+                  'n_train': int(train.sum()), 'n_test': int(test.sum())}
+        if pred is not None:
+            y_test = Y[test, i]
+            mse = float(np.mean((pred[:, i] - y_test) ** 2))
+            variance = float(np.var(y_test))
+            result.update(mse=mse, r2=1.0 - mse / variance if variance > 0 else None)
+        result['seconds'] = seconds
+        acids[key] = result
+        if progress:
+            progress(key, result)
+    return acids
+
+
+def retrain(X: np.ndarray, Y: np.ndarray, out_dir: str, workers: int = 1, trials: int = 12, folds: int = 5,
+            test_size: float = 0.2, seed: int = 0, min_rows: int = MIN_ROWS, source: Optional[dict] = None,
+            progress=None, multi_output: bool = False, multi_strategy: str = 'one_output_per_tree') -> dict:
+    """Обучить набор моделей в out_dir; возвращает (и записывает в metrics.json) метрики по кислотам.
+
+    multi_output — вместо 16 моделей одна с 16 выходами (xgboost multi_strategy).
+    """
+    started = time.perf_counter()
+    feature_names = _feature_names(model_set.booster_paths(), X.shape[1])
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Одна отложенная выборка для всех кислот: метрики наборов сравнимы между собой
+    order = np.random.default_rng(seed).permutation(len(X))
+    n_test = int(round(len(X) * test_size))
+    is_test = np.zeros(len(X), dtype=bool)
+    is_test[order[:n_test]] = True
+    candidates = sample_candidates(trials, seed)
+
+    if multi_output:
+        acids = _fit_multi_output(X, Y, out_dir, is_test, candidates, workers, folds, seed, min_rows,
+                                  feature_names, multi_strategy, progress)
+    else:
+        acids = _fit_per_target(X, Y, out_dir, is_test, candidates, workers, folds, seed, min_rows,
+                                feature_names, progress)
+
+    trained = [acids[k] for k in ACID_KEYS if acids[k]['status'] == 'trained' and acids[k].get('mse') is not None]
+    r2_values = [a['r2'] for a in trained if a.get('r2') is not None]
+    metrics = {
+        'version': os.path.basename(os.path.normpath(out_dir)),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'layout': model_set.MULTI_OUTPUT if multi_output else model_set.PER_TARGET,
+        'multi_strategy': multi_strategy if multi_output else None,
+        'source': dict(source or {}, rows=int(len(X))),
+        'search': {'trials': len(candidates), 'folds': folds, 'test_size': test_size, 'seed': seed},
+        'acids': {key: acids[key] for key in ACID_KEYS},
+        'mean': {'mse': float(np.mean([a['mse'] for a in trained])) if trained else None,
+                 'r2': float(np.mean(r2_values)) if r2_values else None},
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+    _write_feature_stats(out_dir, X, feature_names)
+    # metrics.json пишется последним: по нему list_model_sets узнаёт завершённые наборы
+    with open(os.path.join(out_dir, 'metrics.json'), 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+    return metrics
+
+
+def _fmt(value, digits=4) -> str:
+    return '—' if value is None else f"{value:.{digits}f}"
+
+
+def format_metrics(metrics: dict, previous: Optional[dict] = None) -> str:
+    names = dict(FATTY_ACIDS)
+    lines = [f"{'Кислота':<16} {'строк':>6} {'MSE':>8} {'R²':>7}  параметры"]
+    for key in ACID_KEYS:
+        a = metrics['acids'][key]
+        if a['status'] == 'copied':
+            lines.append(f"{names[key]:<16} {a['rows']:>6} {'—':>8} {'—':>7}  {a['reason']}")
+            continue
+        p = a['params']
+        lines.append(f"{names[key]:<16} {a['n_train'] + a['n_test']:>6} {_fmt(a.get('mse')):>8} "
+                     f"{_fmt(a.get('r2'), 3):>7}  depth={p['max_depth']} lr={p['learning_rate']} "
+                     f"trees={p['n_estimators']}")
+    mean = metrics['mean']
+    lines.append(f"Среднее: MSE {_fmt(mean['mse'])}, R² {_fmt(mean['r2'], 3)}")
+    previous = (previous or {}).get('mean') or BASELINE_METRICS
+    lines.append(f"Активный набор: MSE {_fmt(previous.get('mse'))}, R² {_fmt(previous.get('r2'), 3)}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Переобучение моделей ингредиентного потока по анализам из БД")
+    ap.add_argument('--db', default='database/milk_analysis.db', help='путь к файлу БД')
+    ap.add_argument('--from', dest='date_from', help='анализы с даты (YYYY-MM-DD)')
+    ap.add_argument('--to', dest='date_to', help='анализы по дату включительно')
+    ap.add_argument('--workers', type=int, default=0, help='процессов (0 — по числу ядер)')
+    ap.add_argument('--trials', type=int, default=12, help='вариантов гиперпараметров на кислоту')
+    ap.add_argument('--folds', type=int, default=5, help='блоков кросс-валидации')
+    ap.add_argument('--test-size', type=float, default=0.2, help='доля отложенной выборки для MSE/R²')
+    ap.add_argument('--min-rows', type=int, default=MIN_ROWS, help='минимум анализов кислоты для переобучения')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--multi-output', action='store_true',
+                    help='одна модель с 16 выходами вместо 16 моделей (по анализам со всеми кислотами)')
+    ap.add_argument('--multi-strategy', default='one_output_per_tree',
+                    choices=('one_output_per_tree', 'multi_output_tree'),
+                    help='multi_strategy xgboost; multi_output_tree не упаковывается для --shared-models')
+    ap.add_argument('--version', help='имя набора (по умолчанию v<номер>-<дата>)')
+    ap.add_argument('--activate', action='store_true', help='сделать новый набор активным')
+    ap.add_argument('--list', action='store_true', help='показать наборы моделей и выйти')
+    ap.add_argument('--use', metavar='ВЕРСИЯ', help="сделать активным готовый набор ('original' — исходные модели)")
+    args = ap.parse_args(argv)
+
+    if args.list:
+        active = model_set.active_model_dir()
+        print(f"{'*' if active == model_set.PARAMETERS_DIR else ' '} original  "
+              f"MSE {BASELINE_METRICS['mse']}, R² {BASELINE_METRICS['r2']} (README)")
+        for version in model_set.list_model_sets():
+            mean = model_set.read_metrics(os.path.join(model_set.MODEL_SETS_DIR, version))['mean']
+            marker = '*' if active == os.path.join(model_set.MODEL_SETS_DIR, version) else ' '
+            layout = model_set.model_layout(os.path.join(model_set.MODEL_SETS_DIR, version))
+            print(f"{marker} {version}  MSE {_fmt(mean['mse'])}, R² {_fmt(mean['r2'], 3)} ({layout})")
+        return 0
+    if args.use:
+        try:
+            model_set.activate(None if args.use == 'original' else args.use)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"Активный набор: {model_set.active_model_dir()}")
+        return 0
+
+    X, Y = load_training_data(args.db, args.date_from, args.date_to)
+    if not len(X):
+        print("В БД нет анализов с признаками рациона (признаки сохраняются вместе с предсказаниями)",
+              file=sys.stderr)
+        return 1
+    version = args.version or model_set.new_version()
+    out_dir = os.path.join(model_set.MODEL_SETS_DIR, version)
+    if os.path.exists(os.path.join(out_dir, 'metrics.json')):
+        print(f"Набор {version} уже существует", file=sys.stderr)
+        return 1
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    print(f"Анализов: {len(X)}, признаков: {X.shape[1]}, вариантов: {args.trials}, блоков: {args.folds}, "
+          f"процессов: {workers}", file=sys.stderr)
+    previous = model_set.read_metrics()
+    try:
+        metrics = retrain(
+            X, Y, out_dir, workers, args.trials, args.folds, args.test_size, args.seed, args.min_rows,
+            source={'db': os.path.abspath(args.db), 'date_from': args.date_from, 'date_to': args.date_to},
+            progress=lambda key, r: print(f"  {key}: MSE {_fmt(r.get('mse'))} за {r['seconds']} с",
+                                          file=sys.stderr, flush=True),
+            multi_output=args.multi_output, multi_strategy=args.multi_strategy)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(format_metrics(metrics, previous))
+    print(f"Набор записан: {out_dir} ({metrics['seconds']} с)")
+    if args.activate:
+        model_set.activate(version)
+        print(f"Набор {version} активен")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,10 @@
-from .pipeline import load_model, run_predictions
+from .pipeline import load_model, run_predictions, predict_prepared, prepare_nutrients, numeric_nutrients, MODEL_FEATURES
 
 __all__ = [
     'run_predictions',
-    'load_model'
-]
\ No newline at end of file
+    'predict_prepared',
+    'load_model',
+    'prepare_nutrients',
+    'numeric_nutrients',
+    'MODEL_FEATURES',
+]
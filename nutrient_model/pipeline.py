@@ -1,22 +1,53 @@
 import pandas as pd
-import joblib
 
+from utils.tracing import span, traced
 
+# Подмножество Value_i, на котором обучена модель нутриентов
+MODEL_FEATURES = ['Value_3', 'Value_5', 'Value_7', 'Value_12', 'Value_14', 'Value_17',
+                  'Value_18', 'Value_22', 'Value_24', 'Value_29', 'Value_33', 'Value_37',
+                  'Value_39', 'Value_40', 'Value_43', 'Value_45', 'Value_50', 'Value_57']
+
+
+@traced('nutrient_model.load')
 def load_model(path="parameters/nutrients-_acids_01617_140.pkl"):
+    import joblib  # распаковка модели импортирует sklearn — только при первой загрузке
+
     return joblib.load(path)
 
 
-def run_predictions(data, model):
-    X_pred = ['Value_3', 'Value_5', 'Value_7', 'Value_12', 'Value_14', 'Value_17',
-          'Value_18', 'Value_22', 'Value_24', 'Value_29', 'Value_33', 'Value_37',
-          'Value_39', 'Value_40', 'Value_43', 'Value_45', 'Value_50', 'Value_57']
+def prepare_nutrients(data):
+    """Приводит строку(и) Value_i к числам и оставляет признаки модели."""
+    with span('nutrient_model.prepare', rows=len(data)):
+        return _prepare_nutrients(data)
+
+
+def numeric_nutrients(data):
+    """Все Value_i как числа (пропуски и нечисловые ячейки -> 0), как их видит модель."""
     df = data.copy()
-    df = df.applymap(lambda x: str(x).replace(',', '.') if pd.notnull(x) else x)
-    df = df.apply(pd.to_numeric, errors='coerce')
-    df = df.fillna(0)
-    df = df.drop([col for col in df.columns if col not in X_pred], axis=1)
-    print("___" * 30)
-    print(df, len(df))
-    print("___" * 30)
-    y_pred = model.predict(df)
-    return y_pred
+    # Строки из PDF ('1,23') чистим поячеечно; уже числовые кадры (ручной ввод) — без этого прохода
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        df = df.applymap(lambda x: str(x).replace(',', '.') if pd.notnull(x) else x)
+        df = df.apply(pd.to_numeric, errors='coerce')
+    return df.fillna(0)
+
+
+def _prepare_nutrients(data):
+    df = numeric_nutrients(data)
+    df = df.drop([col for col in df.columns if col not in MODEL_FEATURES], axis=1)
+    return df
+
+
+def run_predictions(data, model, verbose=True):
+    """Предсказание модели нутриентов; verbose печатает подготовленные признаки (отладка GUI)."""
+    df = prepare_nutrients(data)
+    if verbose:
+        print("___" * 30)
+        print(df, len(df))
+        print("___" * 30)
+    return predict_prepared(df, model)
+
+
+def predict_prepared(df, model):
+    """Предсказание по уже подготовленным признакам (результат prepare_nutrients)."""
+    with span('nutrient_model.predict', rows=len(df)):
+        return model.predict(df)
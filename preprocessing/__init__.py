@@ -1,15 +1,19 @@
-from .filtration import (
-    feed_types,
-    NUTRIENT_FEATURES,
-    INGREDIENT_FEATURES,
-)
-from .prepare import (
-    prepare_ingredients,
-)
-from .parser import (
-    parse_pdf_diet,
-    get_nutrients_data,
-)
+import importlib
+
+# Имя -> подмодуль. Подмодули импортируются при первом обращении к имени:
+# справочникам filtration (нужны GUI при запуске) не нужны pandas и camelot из parser.
+_EXPORTS = {
+    'feed_types': 'filtration',
+    'NUTRIENT_FEATURES': 'filtration',
+    'INGREDIENT_FEATURES': 'filtration',
+    'prepare_ingredients': 'prepare',
+    'parse_pdf_diet': 'parser',
+    'get_nutrients_data': 'parser',
+    'ParsingCancelled': 'errors',
+    'ParsingError': 'errors',
+    'IsolatedParser': 'isolation',
+    'IsolatedPool': 'isolation',
+}
 
 __all__ = [
     'parse_pdf_diet',
@@ -18,4 +22,21 @@ __all__ = [
     'NUTRIENT_FEATURES',
     'INGREDIENT_FEATURES',
     'get_nutrients_data',
+    'ParsingCancelled',
+    'ParsingError',
+    'IsolatedParser',
+    'IsolatedPool',
 ]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
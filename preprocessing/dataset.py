@@ -0,0 +1,306 @@
+"""
+Формирование обучающей выборки из сводной таблицы анализов и PDF-отчётов рационов.
+
+Сводная книга Excel (строка — анализ молока: регион, дата, ЖК, имя отчёта рациона,
+16 кислот) сопоставляется с отчётами в папках регионов (REGION_FOLDERS). Отчёты
+разбираются в пуле процессов тем же parse_pdf_diet, что и при предсказании: ингредиенты —
+% СВ по колонкам feed_types (categorize_feeds_bulk), нутриенты — Value_i из «Сводного
+анализа», поэтому признаки обучения и предсказания не расходятся.
+
+Результат каждого файла сразу дописывается в контрольную точку (JSONL): прерванный
+запуск продолжается с места остановки, изменённые с тех пор PDF разбираются заново.
+Каждый отчёт разбирается в изолированном процессе (preprocessing.isolation) с лимитами
+времени (--timeout) и памяти (--max-memory): зависший или упавший camelot стоит одного
+файла, а не всего запуска. Ошибки по файлам (со страницей, если она известна) выводятся
+в stderr и в <выход>.errors.csv. Итоговая таблица
+(метаданные и имя отчёта, ингредиенты, Value_i, 16 кислот) пишется в Parquet (pyarrow) или .npz.
+
+Запуск из корня проекта:
+    python -m preprocessing.dataset "Сводная информация по ЖКС.xlsx" --data-dir "Для Хакатона/" \\
+        -o dataset.parquet --workers 4
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.constants import FATTY_ACIDS
+
+from .errors import ParsingError
+from .filtration import INGREDIENT_FEATURES
+from .isolation import DEFAULT_MEMORY_MB, DEFAULT_TIMEOUT, IsolatedPool
+from .parser import all_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Регион в сводной книге -> папка с отчётами
+REGION_FOLDERS = {
+    'ЭНА': 'ЭНА',
+    'Ока': 'ОМ',
+    'СевНива': 'СН',
+    'Калуга': 'КН',
+    'МоПеТю': 'Тюмень',
+}
+
+# Раскладка сводной книги: строки заголовка, затем регион, дата, ЖК, рацион и 16 кислот
+HEADER_ROWS = 3
+META_COLUMNS = ('region', 'date', 'farm', 'ration')
+ACID_KEYS = tuple(key for key, _ in FATTY_ACIDS)
+
+INGREDIENT_COLUMNS = [label for _, label in INGREDIENT_FEATURES]
+NUTRIENT_COLUMNS = [f'Value_{i}' for i in range(len(all_columns))]
+
+# В одной ячейке «Рацион» бывает несколько отчётов подряд: '..._ЭНАВ   ..._ЭНАВ'
+_REPORT_NAME = re.compile(r'\S.*?_[А-ЯЁA-Z]+(?=\s|$)')
+
+
+def read_summary(xlsx_path: str) -> List[dict]:
+    """Строки сводной книги: {'row', 'region', 'date', 'farm', 'ration', кислоты...}."""
+    import pandas as pd
+
+    df = pd.read_excel(xlsx_path, header=None, skiprows=HEADER_ROWS)
+    rows = []
+    for index, values in enumerate(df.itertuples(index=False), start=HEADER_ROWS + 1):
+        values = list(values)
+        if len(values) < len(META_COLUMNS) + len(ACID_KEYS):
+            raise ValueError(f"В сводной книге {len(values)} столбцов, ожидается не меньше "
+                             f"{len(META_COLUMNS) + len(ACID_KEYS)}")
+        region, date, farm, ration = values[:len(META_COLUMNS)]
+        if pd.isna(ration) or not str(ration).strip():
+            continue
+        row = {'row': index, 'region': '' if pd.isna(region) else str(region).strip(),
+               'date': pd.to_datetime(date, errors='coerce', dayfirst=True),
+               'farm': '' if pd.isna(farm) else str(farm).strip(), 'ration': str(ration).strip()}
+        acids = pd.to_numeric(pd.Series(values[len(META_COLUMNS):len(META_COLUMNS) + len(ACID_KEYS)]),
+                              errors='coerce')
+        row.update(zip(ACID_KEYS, acids.astype(float).tolist()))
+        rows.append(row)
+    return rows
+
+
+def resolve_report(data_dir: str, region: str, ration: str) -> Tuple[Optional[str], Optional[str]]:
+    """(путь к PDF, ошибка): папка региона + имя отчёта; из нескольких отчётов в ячейке — первый найденный."""
+    folder = REGION_FOLDERS.get(region)
+    if folder is None:
+        return None, f"Неизвестный регион: {region!r}"
+    names = [ration] + [name for name in _REPORT_NAME.findall(ration) if name != ration]
+    for name in names:
+        path = os.path.join(data_dir, folder, name.strip() + '.pdf')
+        if os.path.isfile(path):
+            return os.path.abspath(path), None
+    return None, f"Отчёт не найден: {os.path.join(folder, ration)}.pdf"
+
+
+def _file_stamp(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def parse_report(path: str, parser=None) -> dict:
+    """Разбор одного отчёта -> запись контрольной точки; parser — IsolatedParser (иначе в этом процессе)."""
+    started = time.perf_counter()
+    record = {'path': path, 'stamp': _file_stamp(path), 'status': 'error', 'error': None}
+    try:
+        from nutrient_model import numeric_nutrients
+
+        if parser is None:
+            from .parser import parse_pdf_diet
+
+            ing_df, nut_df = parse_pdf_diet(path)
+        else:
+            ing_df, nut_df = parser.parse(path)
+        if nut_df is None or nut_df.empty:
+            raise ValueError("Не найдена таблица «Сводный анализ»")
+        ingredients = {label: float(ing_df[label].iloc[0]) for label in INGREDIENT_COLUMNS if label in ing_df}
+        nutrients = numeric_nutrients(nut_df).iloc[0]
+        record.update(status='ok', ingredients=ingredients,
+                      nutrients={col: float(nutrients[col]) for col in NUTRIENT_COLUMNS if col in nutrients})
+    except ParsingError as e:
+        record.update(error=str(e), error_kind=e.kind, error_page=e.page)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    """{путь к PDF: последняя запись}; оборванная последняя строка (прерывание) пропускается."""
+    records = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record['path']] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _is_current(record: Optional[dict], path: str, retry_failed: bool) -> bool:
+    if record is None or record.get('stamp') != _file_stamp(path):
+        return False
+    return record['status'] == 'ok' or not retry_failed
+
+
+def parse_reports(paths: List[str], checkpoint_path: str, workers: int = 1,
+                  retry_failed: bool = False, progress=None, isolation: Optional[dict] = None) -> Dict[str, dict]:
+    """Разбор отчётов с дозаписью каждого результата в контрольную точку; {путь: запись}.
+
+    Файлы, уже разобранные (с тем же размером и временем изменения), не разбираются
+    повторно; файлы с ошибкой — только при retry_failed. isolation — параметры
+    IsolatedParser (timeout, memory_mb): файлы разбираются в workers изолированных
+    процессах; None — в пуле процессов без лимитов.
+    """
+    done = load_checkpoint(checkpoint_path)
+    pending = [p for p in dict.fromkeys(paths) if not _is_current(done.get(p), p, retry_failed)]
+    if progress is not None:
+        progress(f"Отчётов: {len(set(paths))}, из контрольной точки: {len(set(paths)) - len(pending)}, "
+                 f"к разбору: {len(pending)}")
+    if not pending:
+        return done
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+    with open(checkpoint_path, 'a+b') as out:
+        # Оборванную при прерывании строку закрываем, чтобы не склеить её со следующей записью
+        if os.path.getsize(checkpoint_path):
+            out.seek(-1, os.SEEK_END)
+            if out.read(1) != b'\n':
+                out.write(b'\n')
+
+        def save(record):
+            out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            out.flush()
+            done[record['path']] = record
+            if progress is not None:
+                status = 'ok' if record['status'] == 'ok' else f"ошибка: {record['error']}"
+                progress(f"[{len(pending) - len(left)}/{len(pending)}] {os.path.basename(record['path'])}: {status}")
+
+        left = set(pending)
+        if isolation is not None:
+            with IsolatedPool(min(workers, len(pending)), **isolation) as pool:
+                for future in as_completed([pool.submit(path, parse_report) for path in pending]):
+                    record = future.result()
+                    left.discard(record['path'])
+                    save(record)
+        elif workers <= 1 or len(pending) == 1:
+            for path in pending:
+                left.discard(path)
+                save(parse_report(path))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                for future in as_completed([pool.submit(parse_report, path) for path in pending]):
+                    record = future.result()
+                    left.discard(record['path'])
+                    save(record)
+    return done
+
+
+def build_table(rows: List[dict], reports: Dict[str, dict]) -> Dict[str, np.ndarray]:
+    """Колонки итоговой таблицы по строкам книги с успешно разобранными отчётами."""
+    import pandas as pd
+
+    ok = [(row, reports[row['path']]) for row in rows
+          if row.get('path') and reports.get(row['path'], {}).get('status') == 'ok']
+    columns = {
+        'row': np.array([row['row'] for row, _ in ok], dtype=np.int64),
+        'region': np.array([row['region'] for row, _ in ok], dtype=str),
+        # Пустая или нераспознанная дата в книге — NaT (read_summary), np.array её не принимает
+        'date': pd.to_datetime([row['date'] for row, _ in ok]).to_numpy('datetime64[s]'),
+        'farm': np.array([row['farm'] for row, _ in ok], dtype=str),
+        'ration': np.array([row['ration'] for row, _ in ok], dtype=str),
+        'report': np.array([os.path.basename(row['path']) for row, _ in ok], dtype=str),
+    }
+    for group, names in (('ingredients', INGREDIENT_COLUMNS), ('nutrients', NUTRIENT_COLUMNS)):
+        for name in names:
+            columns[name] = np.array([report[group].get(name, 0.0) for _, report in ok], dtype=np.float64)
+    for key in ACID_KEYS:
+        columns[key] = np.array([row[key] for row, _ in ok], dtype=np.float64)
+    return columns
+
+
+def write_table(columns: Dict[str, np.ndarray], path: str, fmt: str = 'auto') -> str:
+    """Parquet (pyarrow) или .npz (колонка — отдельный массив); возвращает формат."""
+    if fmt == 'auto':
+        fmt = 'npz' if path.lower().endswith('.npz') or not PYARROW_AVAILABLE else 'parquet'
+    if fmt == 'parquet':
+        if not PYARROW_AVAILABLE:
+            raise ImportError("Для записи в Parquet установите pyarrow: pip install pyarrow")
+        pq.write_table(pa.table(columns), path)
+    elif fmt == 'npz':
+        # ZIP без сжатия: np.load читает колонки напрямую
+        with open(path, 'wb') as f:
+            np.savez(f, **columns)
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    return fmt
+
+
+def write_errors(rows: List[dict], reports: Dict[str, dict], path: str) -> int:
+    """CSV со строками книги, не попавшими в выборку (нет отчёта или ошибка разбора)."""
+    failed = []
+    for row in rows:
+        report = reports.get(row['path'], {})
+        error = row.get('error') or report.get('error')
+        if error:
+            page = '' if row.get('error') or report.get('error_page') is None else report['error_page']
+            failed.append((row['row'], row['region'], row['ration'], row.get('path') or '', error, page))
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'region', 'ration', 'file', 'error', 'page'])
+        writer.writerows(failed)
+    return len(failed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Формирование обучающей выборки: сводная книга анализов + PDF-отчёты")
+    ap.add_argument('summary', help='сводная книга Excel с анализами и именами отчётов')
+    ap.add_argument('--data-dir', required=True, help='папка с подпапками регионов (ЭНА, ОМ, СН, КН, Тюмень)')
+    ap.add_argument('-o', '--output', default='dataset.parquet', help='итоговая таблица (.parquet или .npz)')
+    ap.add_argument('--format', default='auto', choices=('auto', 'parquet', 'npz'))
+    ap.add_argument('--workers', type=int, default=1, help='процессов для разбора PDF (0 — по числу ядер)')
+    ap.add_argument('--checkpoint', help='контрольная точка JSONL (по умолчанию <выход>.checkpoint.jsonl)')
+    ap.add_argument('--retry-failed', action='store_true', help='заново разобрать файлы, завершившиеся ошибкой')
+    ap.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='секунд на разбор одного PDF (0 — без лимита)')
+    ap.add_argument('--max-memory', type=int, default=DEFAULT_MEMORY_MB,
+                    help='лимит памяти процесса разбора, МБ (0 — без лимита; только Linux/macOS)')
+    args = ap.parse_args(argv)
+
+    stem = os.path.splitext(args.output)[0]
+    checkpoint = args.checkpoint or stem + '.checkpoint.jsonl'
+    try:
+        rows = read_summary(args.summary)
+    except Exception as e:
+        print(f"Не удалось прочитать сводную книгу: {e}", file=sys.stderr)
+        return 1
+    for row in rows:
+        row['path'], row['error'] = resolve_report(args.data_dir, row['region'], row['ration'])
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    reports = parse_reports([row['path'] for row in rows if row['path']], checkpoint, workers,
+                            args.retry_failed, progress=lambda message: print(message, file=sys.stderr),
+                            isolation={'timeout': args.timeout, 'memory_mb': args.max_memory})
+    columns = build_table(rows, reports)
+    fmt = write_table(columns, args.output, args.format)
+    failed = write_errors(rows, reports, stem + '.errors.csv')
+    print(f"Строк в выборке: {len(columns['row'])} из {len(rows)} ({fmt}: {args.output}), "
+          f"пропущено: {failed} (см. {stem}.errors.csv)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# errors.py
+# Исключения разбора вынесены отдельно от parser.py: их импорт не тянет pandas и camelot
+
+
+class ParsingCancelled(Exception):
+    """Разбор PDF отменён пользователем."""
+
+
+class ParsingError(Exception):
+    """Отчёт не разобран: причина, этап и (если известна) страница PDF.
+
+    kind — 'error' (ошибка разбора), 'timeout' (превышено время на файл),
+    'memory' (превышен лимит памяти), 'crash' (процесс разбора аварийно завершился),
+    'import' (процесс разбора не запустился: не установлен camelot или его зависимости).
+    Атрибуты сериализуются to_dict() и переживают передачу между процессами.
+    """
+
+    KINDS = ('error', 'timeout', 'memory', 'crash', 'import')
+
+    def __init__(self, message: str, path=None, page=None, stage=None, kind: str = 'error'):
+        super().__init__(message)
+        self.message = message
+        self.path = None if path is None else str(path)
+        self.page = page
+        self.stage = stage
+        self.kind = kind
+
+    def __str__(self):
+        return self.message if self.page is None else f"{self.message} (стр. {self.page})"
+
+    def __reduce__(self):
+        return type(self).from_dict, (self.to_dict(),)
+
+    def to_dict(self) -> dict:
+        return {'message': self.message, 'path': self.path, 'page': self.page,
+                'stage': self.stage, 'kind': self.kind}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ParsingError':
+        return cls(data['message'], data.get('path'), data.get('page'), data.get('stage'), data.get('kind', 'error'))
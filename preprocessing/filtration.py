@@ -1,6 +1,7 @@
 # filtration.py
 import re
-import pandas as pd
+
+from utils.tracing import span
 
 # Финальные фичи под модель нутриентов (Value_i)
 NUTRIENT_FEATURES = [
@@ -111,6 +112,12 @@ def is_combikorm_token(s: str):
 
 
 def categorize_feeds_bulk(feed_names_dict):
+    """{название корма из рецепта: % СВ} -> строка DataFrame с колонками feed_types."""
+    with span('filtration.categorize_feeds_bulk', rows=len(feed_names_dict)):
+        return _categorize_feeds_bulk(feed_names_dict)
+
+
+def _categorize_feeds_bulk(feed_names_dict):
     feed_types = {
         '01': '05.06 зерно(кукуруза) плющенное',
         '02': '12.01 тритикале сенаж',
@@ -357,5 +364,7 @@ def categorize_feeds_bulk(feed_names_dict):
         else:
             new_dict[x] = 0
 
+    import pandas as pd  # справочники модуля нужны GUI при запуске, pandas — только здесь
+
     ingredients_df = pd.DataFrame({k: [v] for k, v in new_dict.items()})
     return ingredients_df
@@ -0,0 +1,288 @@
+"""
+Разбор PDF-отчётов в отдельном процессе с лимитами времени и памяти.
+
+Camelot (Ghostscript/OpenCV) на испорченном или огромном PDF может работать минутами
+или упасть вместе с процессом. IsolatedParser держит долгоживущий процесс разбора
+(импорт camelot и pandas — один раз), отправляет ему пути и ждёт результат не дольше
+timeout секунд на файл; память процесса ограничена RLIMIT_AS (memory_mb, только POSIX:
+на Windows лимит памяти не применяется). Зависший или упавший процесс завершается
+и пересоздаётся при следующем файле, а вызывающий получает ParsingError с видом
+ошибки (kind) и страницей, на которой остановился разбор.
+
+IsolatedPool — несколько таких процессов для пакетной обработки: файлы раздаются
+свободным процессам, так что один тяжёлый отчёт занимает только свой процесс и не
+дольше timeout, а падение не ломает пул (в отличие от ProcessPoolExecutor).
+
+    with IsolatedPool(workers=4, timeout=60, memory_mb=1500) as pool:
+        for path, future in zip(paths, [pool.submit(p) for p in paths]):
+            ing_df, nut_df = future.result()   # или ParsingError
+"""
+import multiprocessing
+import queue
+import signal
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from preprocessing.errors import ParsingCancelled, ParsingError
+from utils import tracing
+
+# Время на один файл (с) и лимит адресного пространства процесса разбора (МБ); 0 — без лимита
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_MEMORY_MB = 2048
+# Запуск процесса: импорт pandas, camelot, opencv не входит во время файла
+STARTUP_TIMEOUT = 120.0
+# Как часто ждущий поток проверяет отмену и жизнь процесса (с)
+POLL_INTERVAL = 0.1
+
+
+def _apply_memory_limit(memory_mb: int) -> bool:
+    try:
+        import resource
+    except ImportError:
+        return False  # Windows: лимит памяти не поддерживается
+    limit = int(memory_mb) * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    return True
+
+
+def _worker_main(conn, memory_mb: int, trace: bool, trace_memory: bool):
+    """Цикл процесса разбора: путь из conn -> ('ok', ing, nut, события) или ('error', ParsingError.to_dict())."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C обрабатывает родитель
+    if trace:
+        tracing.enable(trace_memory)
+    if memory_mb:
+        _apply_memory_limit(memory_mb)
+    try:
+        from preprocessing.parser import load_camelot, parse_pdf_diet
+
+        load_camelot()
+    except Exception as e:
+        # Ошибка окружения (нет camelot, opencv): родитель покажет её текст, а не «процесс упал»
+        conn.send(('error', ParsingError(str(e), stage='start', kind='import').to_dict()))
+        return
+    conn.send(('ready',))
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+        state = {'stage': None, 'page': None}
+
+        def progress(stage, info):
+            state['stage'] = stage
+            if stage == 'page':
+                state['page'] = info['page']
+            conn.send(('progress', stage, info))
+
+        try:
+            ing_df, nut_df = parse_pdf_diet(path, progress)
+            conn.send(('ok', ing_df, nut_df, tracing.drain()))
+        except ParsingError as e:
+            conn.send(('error', e.to_dict()))
+        except MemoryError:
+            conn.send(('error', ParsingError(f"Превышен лимит памяти {memory_mb} МБ", path, state['page'],
+                                             state['stage'], 'memory').to_dict()))
+            return  # после MemoryError состояние процесса ненадёжно — родитель запустит новый
+        except Exception as e:
+            conn.send(('error', ParsingError(f"{type(e).__name__}: {e}", path, state['page'],
+                                             state['stage']).to_dict()))
+
+
+def _exit_reason(exitcode: Optional[int]) -> str:
+    if exitcode is not None and exitcode < 0:
+        try:
+            return f"сигнал {signal.Signals(-exitcode).name}"
+        except ValueError:
+            return f"сигнал {-exitcode}"
+    return f"код {exitcode}"
+
+
+class IsolatedParser:
+    """Один процесс разбора PDF с лимитами; parse() вызывается из одного потока за раз."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._process = None
+        self._conn = None
+        # Ошибка окружения при запуске (kind='import') — не перезапускаем процесс на каждый файл
+        self._startup_error: Optional[ParsingError] = None
+        # spawn: без копии состояния родителя (потоки Qt, открытые БД) и одинаково на всех ОС
+        self._context = multiprocessing.get_context('spawn')
+
+    def _start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name='pdf-parser', daemon=True,
+            args=(child_conn, self.memory_mb, tracing.enabled(), tracing.memory_enabled()))
+        process.start()
+        child_conn.close()
+        try:
+            ready = parent_conn.poll(STARTUP_TIMEOUT) and parent_conn.recv()
+        except (EOFError, OSError):
+            ready = None
+        if not ready or ready[0] != 'ready':
+            process.join(1)
+            exitcode = process.exitcode  # до kill: иначе причиной всегда будет SIGKILL
+            if process.is_alive():
+                process.kill()
+            process.join()
+            parent_conn.close()
+            if ready and ready[0] == 'error':
+                self._startup_error = ParsingError.from_dict(ready[1])
+                raise self._startup_error
+            reason = f"не ответил за {STARTUP_TIMEOUT:g} с" if exitcode is None else _exit_reason(exitcode)
+            raise ParsingError(f"Процесс разбора не запустился ({reason})", stage='start', kind='crash')
+        self._process, self._conn = process, parent_conn
+
+    def _stop(self, kill: bool):
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if process is None:
+            return
+        if kill:
+            process.kill()
+        else:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                process.kill()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
+
+    def _crashed(self, path, page, stage) -> ParsingError:
+        process = self._process
+        process.join(1)
+        exitcode = process.exitcode
+        self._stop(kill=True)
+        message = f"Процесс разбора аварийно завершился ({_exit_reason(exitcode)})"
+        if self.memory_mb and exitcode is not None and -exitcode in (signal.SIGABRT, signal.SIGSEGV):
+            # Нативный код (OpenCV, Ghostscript) при нехватке памяти обычно падает, а не бросает MemoryError
+            message += f"; возможна нехватка памяти (лимит {self.memory_mb} МБ)"
+        return ParsingError(message, path, page, stage, 'crash')
+
+    def parse(self, path, progress: Optional[Callable[[str, dict], None]] = None,
+              is_cancelled: Optional[Callable[[], bool]] = None):
+        """(ing_df, nut_df) как у parse_pdf_diet; иначе ParsingError или ParsingCancelled.
+
+        progress и is_cancelled — как у parse_pdf_diet, но вызываются в потоке вызывающего;
+        при отмене процесс разбора завершается, не дожидаясь конца текущей страницы.
+        """
+        path = str(path)
+        if self._startup_error is not None:
+            raise ParsingError(self._startup_error.message, path, stage='start', kind='import')
+        if self._process is None or not self._process.is_alive():
+            self._stop(kill=True)
+            try:
+                self._start()
+            except ParsingError as e:
+                e.path = path
+                raise
+        self._conn.send(path)
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        page = stage = None
+        try:
+            while True:
+                if is_cancelled is not None and is_cancelled():
+                    raise ParsingCancelled(stage or 'tables')
+                wait = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.monotonic())
+                if wait <= 0:
+                    self._stop(kill=True)
+                    raise ParsingError(f"Разбор не уложился в {self.timeout:g} с", path, page, stage, 'timeout')
+                if not self._conn.poll(wait):
+                    if not self._process.is_alive():
+                        raise self._crashed(path, page, stage)
+                    continue
+                try:
+                    message = self._conn.recv()
+                except (EOFError, OSError):
+                    raise self._crashed(path, page, stage)
+                if message[0] == 'progress':
+                    stage, info = message[1], message[2]
+                    if stage == 'page':
+                        page = info['page']
+                    if progress is not None:
+                        progress(stage, info)
+                elif message[0] == 'ok':
+                    tracing.merge(message[3])
+                    return message[1], message[2]
+                else:
+                    error = ParsingError.from_dict(message[1])
+                    if error.kind == 'memory':
+                        self._stop(kill=True)
+                    raise error
+        except ParsingError:
+            raise
+        except BaseException:
+            # Отмена, исключение из progress или KeyboardInterrupt: файл ещё разбирается — процесс завершаем
+            self._stop(kill=True)
+            raise
+
+    def close(self):
+        self._stop(kill=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_isolated(path, timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB,
+                   progress: Optional[Callable[[str, dict], None]] = None,
+                   is_cancelled: Optional[Callable[[], bool]] = None):
+    """Разбор одного файла в новом процессе с лимитами (для разовых вызовов)."""
+    with IsolatedParser(timeout, memory_mb) as parser:
+        return parser.parse(path, progress, is_cancelled)
+
+
+class IsolatedPool:
+    """workers процессов разбора; submit(path) -> Future с (ing_df, nut_df) или ParsingError.
+
+    submit(item, fn) выполняет fn(item, parser) на свободном процессе — для обёрток,
+    которым нужен не только результат разбора (проверки, запись ошибок, временные файлы).
+    """
+
+    def __init__(self, workers: int = 1, timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB):
+        self.workers = max(1, workers)
+        self._parsers: List[IsolatedParser] = []
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(self.workers):
+            parser = IsolatedParser(timeout, memory_mb)
+            self._parsers.append(parser)
+            self._idle.put(parser)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pdf-parser')
+
+    def _run(self, item, fn):
+        parser = self._idle.get()
+        try:
+            return parser.parse(item) if fn is None else fn(item, parser)
+        finally:
+            self._idle.put(parser)
+
+    def submit(self, item, fn: Optional[Callable] = None) -> Future:
+        return self._executor.submit(self._run, item, fn)
+
+    def map(self, items, fn: Optional[Callable] = None) -> list:
+        """Результаты по порядку items."""
+        return [future.result() for future in [self.submit(item, fn) for item in items]]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for parser in self._parsers:
+            parser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
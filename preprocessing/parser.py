@@ -2,21 +2,32 @@
 import re
 import pandas as pd
 
-try:
-    import camelot  # Requires camelot-py (import name: camelot)
-
-    CAMELOT_AVAILABLE = True
-    CAMELOT_IMPORT_ERROR = None
-except Exception as e:
-    CAMELOT_AVAILABLE = False
-    CAMELOT_IMPORT_ERROR = e
 # OCR не используется в текущей реализации, удалён
 
+from preprocessing.errors import ParsingCancelled, ParsingError
+from utils.tracing import span, traced
 from preprocessing.filtration import (
     categorize_feeds_bulk,
 )
 
-from typing import List
+from typing import Callable, List, Optional
+
+_camelot = None
+
+
+def load_camelot():
+    """Импорт camelot (вместе с opencv и pdfminer) при первом разборе PDF, а не при запуске."""
+    global _camelot
+    if _camelot is None:
+        try:
+            import camelot  # Requires camelot-py (import name: camelot)
+        except Exception as e:
+            raise ImportError(
+                "Camelot (camelot-py) недоступен. Установите 'camelot-py[cv]' и удалите возможный пакет 'camelot'. "
+                f"Исходная ошибка импорта: {e}"
+            ) from e
+        _camelot = camelot
+    return _camelot
 
 # Обновлённый список all_columns
 all_columns = [
@@ -65,28 +76,61 @@ def postprocess_table_data(df: pd.DataFrame) -> List:
     return result
 
 
-def parse_pdf(pdf_path):
+def page_numbers(pdf_path) -> List[int]:
+    """Номера страниц PDF (с 1) так, как их перебирает camelot."""
+    from camelot.handlers import PDFHandler
+
     try:
-        tables = camelot.read_pdf(pdf_path, pages="all", flavor="lattice")
-        all_df = []
-        if tables:
-            print(f"Найдено {len(tables)} таблиц Camelot")
-            for i, table in enumerate(tables):
-                df = table.df
-                all_df.append(df)
-            return all_df
-        else:
-            raise ValueError("Camelot не нашёл таблицы")
+        return list(PDFHandler(str(pdf_path), pages='all').pages)
     except Exception as e:
-        print("Camelot не справился:", e)
-        return []
+        raise ParsingError(f"Не удалось открыть PDF: {type(e).__name__}: {e}", pdf_path, stage='open') from e
+
+
+def read_tables(pdf_path, on_page: Optional[Callable[[int, int], None]] = None, **kwargs) -> list:
+    """Таблицы camelot (lattice) со всех страниц по порядку.
+
+    Страницы читаются по одной (как внутри camelot при pages='all'), поэтому ошибка
+    возвращается как ParsingError с номером страницы, а on_page(страница, всего)
+    вызывается перед каждой — по нему изолированный разбор знает, где он остановился.
+    """
+    camelot = load_camelot()
+    pages = page_numbers(pdf_path)
+    tables = []
+    with span('parser.camelot_read', path=str(pdf_path), pages=len(pages)) as sp:
+        for page in pages:
+            if on_page is not None:
+                on_page(page, len(pages))
+            try:
+                tables.extend(camelot.read_pdf(str(pdf_path), pages=str(page), flavor='lattice', **kwargs))
+            except MemoryError:
+                raise ParsingError("Не хватило памяти при чтении таблиц", pdf_path, page, 'tables', 'memory')
+            except Exception as e:
+                raise ParsingError(f"Camelot не справился: {type(e).__name__}: {e}", pdf_path, page, 'tables') from e
+        sp.set(rows=len(tables))
+    return tables
+
+
+def parse_pdf(pdf_path, on_page: Optional[Callable[[int, int], None]] = None) -> List[pd.DataFrame]:
+    """Сырые таблицы отчёта (DataFrame); нет ни одной таблицы — ParsingError."""
+    all_df = [table.df for table in read_tables(pdf_path, on_page)]
+    if not all_df:
+        raise ParsingError("Camelot не нашёл таблицы", pdf_path, stage='tables')
+    return all_df
 
 
 def get_nutrients_data(full_path):
     """
     Возвращает pd.DataFrame с одной строкой, содержащей все значения из "Сводного анализа".
     """
-    all_tables = parse_pdf(full_path)
+    return nutrients_from_tables(parse_pdf(full_path))
+
+
+@traced('parser.nutrients_from_tables')
+def nutrients_from_tables(all_tables):
+    """
+    То же, что get_nutrients_data, но по уже извлечённым таблицам (список DataFrame
+    из parse_pdf, без strip_text — как при формировании обучающей выборки).
+    """
     analysis = None
     for j in range(len(all_tables)):
         first_cell = str(all_tables[j].iloc[0, 0])
@@ -95,8 +139,8 @@ def get_nutrients_data(full_path):
             break
 
     if analysis is None:
-        print("Таблица 'Сводный анализ' не найдена.")
-        # Возвращаем пустую строку с нужными колонками
+        # Пустая таблица с нужными колонками: отсутствие анализа — не ошибка разбора,
+        # parse_pdf_diet сообщает о нём этапом 'nutrients' (found=False)
         return pd.DataFrame(columns=[f'Value_{i}' for i in range(len(all_columns))])
 
     # Обрабатываем таблицу
@@ -116,23 +160,26 @@ def numeric_from_str(s):
 
 
 def find_tables(pdf_path):
-    if not CAMELOT_AVAILABLE:
-        raise ImportError(
-            "Парсер PDF недоступен: не установлен или повреждён camelot-py. "
-            "Удалите пакет 'camelot' (не тот) и установите 'camelot-py[cv]'."
-        )
-    try:
-        return camelot.read_pdf(str(pdf_path), pages='all', flavor='lattice', strip_text='\n')
-    except Exception as e:
-        print(f"PDF read error: {e}")
-        return []
+    """Таблицы camelot без переводов строк в ячейках; ошибка чтения — ParsingError со страницей."""
+    return read_tables(pdf_path, strip_text='\n')
+
+
+def strip_newlines(df: pd.DataFrame) -> pd.DataFrame:
+    """Аналог camelot strip_text='\n' для уже извлечённой таблицы."""
+    return df.astype(str).apply(lambda col: col.str.replace('\n', '', regex=False))
+
+
+def _table_df(table) -> pd.DataFrame:
+    # Принимаем как таблицы camelot, так и готовые DataFrame
+    return table.df if hasattr(table, 'df') else table
 
 
+@traced('parser.classify_tables')
 def classify_tables(tables):
     recipe_tables = []
     nutrient_tables = []
     for table in tables:
-        flat_text = " ".join(table.df.astype(str).values.flatten())
+        flat_text = " ".join(_table_df(table).astype(str).values.flatten())
         if re.search(r'Ингредиенты|Рецепт', flat_text, re.I):
             recipe_tables.append(table)
         elif re.search(r'Сводный анализ|Нутриент|Лактирующая корова', flat_text, re.I):
@@ -140,8 +187,9 @@ def classify_tables(tables):
     return recipe_tables, nutrient_tables
 
 
+@traced('parser.parse_ingredients_table')
 def parse_ingredients_table(table):
-    df = table.df.copy()
+    df = _table_df(table).copy()
     name_col_idx = 0
     percent_sv_col_idx = 5
     ingredients = {}
@@ -155,20 +203,41 @@ def parse_ingredients_table(table):
     return ingredients
 
 
-def parse_pdf_diet(pdf_path):
-    if not CAMELOT_AVAILABLE:
-        raise ImportError(
-            "Camelot (camelot-py) недоступен. Установите 'camelot-py[cv]' и удалите возможный пакет 'camelot'. "
-            f"Исходная ошибка импорта: {CAMELOT_IMPORT_ERROR}"
-        )
+@traced('parser.parse_pdf_diet')
+def parse_pdf_diet(pdf_path,
+                   progress: Optional[Callable[[str, dict], None]] = None,
+                   is_cancelled: Optional[Callable[[], bool]] = None):
+    """
+    Разбор отчёта: ингредиенты (% СВ по кодам feed_types) и нутриенты (Value_i).
+
+    Camelot вызывается один раз: сырые таблицы идут в «Сводный анализ» как при
+    обучении, а для рецептов переводы строк удаляются (как strip_text='\n').
+    progress(stage, info) вызывается после этапов 'tables', 'classification',
+    'ingredients', 'nutrients' и перед каждой страницей ('page': page, pages); если
+    is_cancelled() вернёт True, между этапами выбрасывается ParsingCancelled.
+    Нечитаемый PDF, отчёт без таблиц или без рецепта — ParsingError (с номером
+    страницы, если ошибка привязана к ней).
+    """
+    load_camelot()
 
-    tables = find_tables(pdf_path)
-    ingredients_by_name = {}
+    def report(stage, **info):
+        if is_cancelled is not None and is_cancelled():
+            raise ParsingCancelled(stage)
+        if progress is not None:
+            progress(stage, info)
 
-    if tables:
-        recipe_tables, nutrient_tables = classify_tables(tables)
-        for table in recipe_tables:
-            ingredients_by_name.update(parse_ingredients_table(table))
-            df_ingredients = categorize_feeds_bulk(ingredients_by_name)
-        df_nutrients = get_nutrients_data(pdf_path)
+    raw_tables = parse_pdf(str(pdf_path), lambda page, pages: report('page', page=page, pages=pages))
+    report('tables', count=len(raw_tables))
+
+    recipe_tables, nutrient_tables = classify_tables([strip_newlines(df) for df in raw_tables])
+    report('classification', recipe=len(recipe_tables), nutrient=len(nutrient_tables))
+    if not recipe_tables:
+        raise ParsingError("Не найдена таблица рецепта (ингредиенты)", pdf_path, stage='classification')
+    ingredients_by_name = {}
+    for table in recipe_tables:
+        ingredients_by_name.update(parse_ingredients_table(table))
+    df_ingredients = categorize_feeds_bulk(ingredients_by_name)
+    report('ingredients', count=len(ingredients_by_name))
+    df_nutrients = nutrients_from_tables(raw_tables)
+    report('nutrients', found=not df_nutrients.empty)
     return df_ingredients, df_nutrients
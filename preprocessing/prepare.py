@@ -1,8 +1,15 @@
 import pandas as pd
 
+from utils.tracing import span
+
 
 def prepare_ingredients(data_x):
-    new_data = data_x
+    with span('preprocessing.prepare_ingredients', rows=len(data_x)):
+        return _prepare_ingredients(data_x)
+
+
+def _prepare_ingredients(data_x):
+    new_data = data_x.copy()  # не портим исходный DataFrame при повторных вызовах
     new_data.iloc[:, 1] = new_data.iloc[:, [1, 2, 9, 10, 12, 15, 17, 28, 33, 35, 37, 39, 40, 41]].sum(axis=1)
     cols_drop = new_data.columns[[2, 9, 10, 12, 15, 17, 28, 33, 35, 37, 39, 40, 41]]
     new_data_x = new_data.drop(cols_drop, axis=1)
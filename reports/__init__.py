@@ -0,0 +1,11 @@
+from .render import get_renderer, report_rows, gost_level_text, confidence_text
+from .batch import generate_reports, predictions_from_history
+
+__all__ = [
+    'get_renderer',
+    'report_rows',
+    'gost_level_text',
+    'confidence_text',
+    'generate_reports',
+    'predictions_from_history',
+]
@@ -0,0 +1,165 @@
+"""
+Пакетная генерация отчётов DOCX/PDF по сохранённым предсказаниям в пуле процессов.
+
+Каждый процесс-исполнитель при старте один раз строит рендереры (шрифт, стили,
+шаблон документа), затем получает предсказания порциями. По желанию все PDF
+объединяются в один файл: через pypdf, если он установлен, иначе сводный PDF
+строится отдельной задачей того же пула.
+
+Запуск из корня проекта:
+    python -m reports.batch out_dir --from 2024-05-01 --to 2024-05-31 --format both --merge all.pdf
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from utils.constants import FATTY_ACIDS
+from .render import get_renderer, report_rows
+
+# pypdf необязателен; сам модуль импортируется только при объединении
+PYPDF_AVAILABLE = importlib.util.find_spec('pypdf') is not None
+
+FORMATS = ('docx', 'pdf')
+
+_worker_font: Optional[str] = None
+
+
+def _init_worker(formats: Sequence[str], font_path: Optional[str]):
+    """Инициализатор процесса: шрифты, стили и шаблоны строятся до первой задачи."""
+    global _worker_font
+    _worker_font = font_path
+    for fmt in formats:
+        get_renderer(fmt, font_path)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', str(name or 'рацион')).strip('_')[:60] or 'рацион'
+
+
+def _subtitle(prediction: dict) -> str:
+    return f"Рацион: {prediction.get('diet_name') or '—'}, дата предсказания: {prediction.get('prediction_date') or '—'}"
+
+
+def _render_one(job: tuple) -> dict:
+    """Задача исполнителя: один отчёт во всех запрошенных форматах."""
+    prediction, values, uncertainties, paths = job
+    rows = report_rows(values, uncertainties)
+    subtitle = _subtitle(prediction)
+    try:
+        for fmt, path in paths.items():
+            get_renderer(fmt, _worker_font).render(path, rows, subtitle)
+        return {'id': prediction['id'], 'paths': paths, 'error': None}
+    except Exception as e:
+        return {'id': prediction['id'], 'paths': paths, 'error': f"{type(e).__name__}: {e}"}
+
+
+def _render_combined(job: tuple) -> str:
+    path, reports = job
+    get_renderer('pdf', _worker_font).render_many(
+        path, [(report_rows(values, uncertainties), _subtitle(prediction))
+               for prediction, values, uncertainties in reports])
+    return path
+
+
+def generate_reports(predictions: Sequence[dict], out_dir: str, formats: Sequence[str] = ('pdf',),
+                     workers: int = 1, merge_path: Optional[str] = None,
+                     font_path: Optional[str] = None) -> dict:
+    """Отчёты по предсказаниям.
+
+    predictions — словари с ключами id, diet_name, prediction_date, values
+    (16 значений в порядке FATTY_ACIDS) и необязательным uncertainty (в том же порядке),
+    как возвращает predictions_from_history.
+    Возвращает {'reports': [{id, paths, error}], 'merged': путь или None}.
+    """
+    formats = [fmt for fmt in FORMATS if fmt in formats]
+    if not formats:
+        raise ValueError(f"Укажите хотя бы один формат: {', '.join(FORMATS)}")
+    if merge_path and 'pdf' not in formats and PYPDF_AVAILABLE:
+        formats.append('pdf')
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for p in predictions:
+        stem = f"{int(p['id']):06d}_{_safe_name(p.get('diet_name'))}"
+        paths = {fmt: os.path.join(out_dir, f'{stem}.{fmt}') for fmt in formats}
+        jobs.append(({k: p.get(k) for k in ('id', 'diet_name', 'prediction_date')}, list(p['values']),
+                     p.get('uncertainty'), paths))
+
+    merged = None
+    if workers <= 1:
+        _init_worker(formats, font_path)
+        results = [_render_one(job) for job in jobs]
+        if merge_path and not PYPDF_AVAILABLE:
+            merged = _render_combined((merge_path, [job[:3] for job in jobs]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(formats, font_path)) as pool:
+            combined = None
+            if merge_path and not PYPDF_AVAILABLE:
+                combined = pool.submit(_render_combined, (merge_path, [job[:3] for job in jobs]))
+            # Порции по нескольку отчётов — меньше обменов между процессами
+            chunksize = max(1, min(32, len(jobs) // (workers * 4) or 1))
+            results = list(pool.map(_render_one, jobs, chunksize=chunksize))
+            if combined is not None:
+                merged = combined.result()
+
+    if merge_path and PYPDF_AVAILABLE:
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        for result in results:
+            if result['error'] is None:
+                writer.append(result['paths']['pdf'])
+        with open(merge_path, 'wb') as f:
+            writer.write(f)
+        merged = merge_path
+    return {'reports': results, 'merged': merged}
+
+
+def predictions_from_history(rows: Sequence[tuple]) -> List[dict]:
+    """Кортежи DatabaseManager.get_predictions_history(with_uncertainty=True) -> словари для generate_reports."""
+    n = len(FATTY_ACIDS)
+    return [{'id': row[0], 'diet_name': row[1], 'prediction_date': row[2], 'values': list(row[3:3 + n]),
+             'uncertainty': row[3 + n] if len(row) > 3 + n else None}
+            for row in rows]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетная генерация отчётов по сохранённым предсказаниям")
+    ap.add_argument('out_dir', help='папка для отчётов')
+    ap.add_argument('--db', default='database/milk_analysis.db', help='путь к файлу БД')
+    ap.add_argument('--from', dest='date_from', help='начало окна дат (YYYY-MM-DD)')
+    ap.add_argument('--to', dest='date_to', help='конец окна дат (включительно, YYYY-MM-DD[ HH:MM:SS])')
+    ap.add_argument('--diet-id', type=int, action='append', help='только эти рационы (можно повторять)')
+    ap.add_argument('--id', type=int, action='append', dest='prediction_ids', help='только эти предсказания')
+    ap.add_argument('--format', default='pdf', choices=FORMATS + ('both',))
+    ap.add_argument('--workers', type=int, default=0, help='процессов (0 — по числу ядер)')
+    ap.add_argument('--merge', help='дополнительно собрать все отчёты в один PDF')
+    ap.add_argument('--font', help='TTF-шрифт с кириллицей для PDF')
+    args = ap.parse_args(argv)
+
+    from database import DatabaseManager
+
+    with DatabaseManager(args.db) as db:
+        rows = db.get_predictions_history(args.date_from, args.date_to, args.diet_id, args.prediction_ids,
+                                          with_uncertainty=True)
+    if not rows:
+        print("Нет предсказаний по заданным условиям", file=sys.stderr)
+        return 1
+    formats = FORMATS if args.format == 'both' else (args.format,)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    result = generate_reports(predictions_from_history(rows), args.out_dir, formats,
+                              min(workers, len(rows)), args.merge, args.font)
+    failed = [r for r in result['reports'] if r['error']]
+    for r in failed:
+        print(f"Ошибка отчёта {r['id']}: {r['error']}", file=sys.stderr)
+    print(f"Отчётов: {len(rows) - len(failed)} из {len(rows)}"
+          + (f", сводный PDF: {result['merged']}" if result['merged'] else ''), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
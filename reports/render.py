@@ -0,0 +1,189 @@
+"""
+Отчёты о предсказании жирнокислотного состава: общая разметка и рендереры DOCX/PDF.
+
+Рендерер создаётся один раз на процесс (get_renderer): регистрация TTF-шрифта,
+стили reportlab и документ DOCX строятся в конструкторе, а render() только
+заполняет таблицу. Этими же рендерерами пользуются экспорт GUI и пакетная генерация.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+
+from utils import check_fatty_acid_ranges
+from utils.constants import FATTY_ACIDS
+
+REPORT_TITLE = 'Результаты предсказания жирнокислотного состава'
+TABLE_HEADER = ['Жирная кислота', 'Значение (%)', 'Уровень по ГОСТу', 'Уверенность']
+
+# Шрифты с кириллицей: первый найденный регистрируется под именем PDF_FONT_NAME
+FONT_CANDIDATES = (
+    'arial.ttf',
+    'DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+)
+PDF_FONT_NAME = 'Arial'
+
+
+def gost_level_text(text: str) -> str:
+    """Единый формат отображения уровня по ГОСТу в экспорте и печати."""
+    if isinstance(text, str):
+        if text.startswith('Ниже на '):
+            return f"Ниже нормы на {text.replace('Ниже на ', '')} %"
+        if text.startswith('Выше на '):
+            return f"Выше нормы на {text.replace('Выше на ', '')} %"
+    return text
+
+
+# Уверенность по относительной неопределённости u / max(|значение|, CONFIDENCE_FLOOR):
+# не больше первого порога — «Высокая», не больше второго — «Средняя», иначе «Низкая»
+CONFIDENCE_THRESHOLDS = (0.15, 0.35)
+CONFIDENCE_FLOOR = 0.1
+
+
+def confidence_text(value: float, uncertainty: Optional[float] = None) -> str:
+    """Единый формат отображения уверенности предсказания.
+
+    uncertainty — неопределённость из scoring.score_diets (в % кислоты); без неё
+    (предсказания, сохранённые до её появления) действует прежнее правило по значению.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return "Средняя"
+    if uncertainty is None or uncertainty != uncertainty:  # None или nan
+        return "Высокая" if value > 0.1 else "Средняя"
+    relative = float(uncertainty) / max(abs(value), CONFIDENCE_FLOOR)
+    if relative <= CONFIDENCE_THRESHOLDS[0]:
+        level = "Высокая"
+    elif relative <= CONFIDENCE_THRESHOLDS[1]:
+        level = "Средняя"
+    else:
+        level = "Низкая"
+    return f"{level} (±{float(uncertainty):.2f})"
+
+
+def report_rows(values: Sequence[float], uncertainties: Optional[Sequence[float]] = None) -> List[List[str]]:
+    """16 значений (и неопределённостей) в порядке FATTY_ACIDS -> строки таблицы отчёта (без заголовка)."""
+    values = [0.0 if v is None else float(v) for v in values]
+    uncertainties = list(uncertainties) if uncertainties is not None else [None] * len(values)
+    gost_levels = check_fatty_acid_ranges(values)
+    return [
+        [name, f"{value:.2f}", gost_level_text(level), confidence_text(value, u)]
+        for (_, name), value, level, u in zip(FATTY_ACIDS, values, gost_levels, uncertainties)
+    ]
+
+
+def find_font(font_path: Optional[str] = None) -> str:
+    for path in ((font_path,) if font_path else FONT_CANDIDATES):
+        if path and os.path.isfile(path):
+            return path
+    raise FileNotFoundError(
+        "Не найден TTF-шрифт с кириллицей: положите arial.ttf (или DejaVuSans.ttf) "
+        "в рабочую папку или укажите путь к шрифту"
+    )
+
+
+class DocxRenderer:
+    """DOCX-отчёты; документ (заголовок, подзаголовок, таблица 16 кислот) собирается один раз,
+    render() лишь переписывает текст ячеек и сохраняет копию."""
+
+    def __init__(self):
+        from docx import Document
+
+        self._doc = Document()
+        self._doc.add_heading(REPORT_TITLE, 0)
+        self._subtitle = self._doc.add_paragraph()
+        # 4 колонки: Кислота, Значение, Уровень по ГОСТу, Уверенность
+        table = self._doc.add_table(rows=1 + len(FATTY_ACIDS), cols=len(TABLE_HEADER))
+        table.style = 'Light Grid Accent 1'
+        table_rows = table.rows
+        for cell, text in zip(table_rows[0].cells, TABLE_HEADER):
+            cell.text = text
+        self._cells = [row.cells for row in table_rows[1:]]
+
+    def render(self, path, rows: List[List[str]], subtitle: Optional[str] = None):
+        if len(rows) != len(self._cells):
+            raise ValueError(f"Ожидается {len(self._cells)} строк отчёта, получено {len(rows)}")
+        self._subtitle.text = subtitle or ''
+        for cells, row in zip(self._cells, rows):
+            for cell, text in zip(cells, row):
+                cell.text = text
+        self._doc.save(path)
+
+
+class PdfRenderer:
+    """PDF-отчёты reportlab; шрифт, стили абзацев и стиль таблицы строятся один раз."""
+
+    def __init__(self, font_path: Optional[str] = None):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak
+
+        # Регистрируем шрифт с поддержкой кириллицы (один раз на процесс)
+        if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, find_font(font_path)))
+        self._doc_template, self._table, self._paragraph, self._page_break = (
+            SimpleDocTemplate, Table, Paragraph, PageBreak)
+        self.pagesize = letter
+
+        # Настраиваем стиль для русского текста
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle('CustomTitle', parent=styles['Title'],
+                                          fontName=PDF_FONT_NAME, fontSize=16, leading=20)
+        self.normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'],
+                                           fontName=PDF_FONT_NAME, fontSize=12, leading=14)
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), PDF_FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), PDF_FONT_NAME),  # Применяем шрифт ко всей таблице
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ])
+
+    def flowables(self, rows: List[List[str]], subtitle: Optional[str] = None) -> list:
+        elements = [self._paragraph(REPORT_TITLE, self.title_style)]
+        if subtitle:
+            elements.append(self._paragraph(subtitle, self.normal_style))
+        table = self._table([TABLE_HEADER] + rows)
+        table.setStyle(self.table_style)
+        elements.append(table)
+        return elements
+
+    def render(self, path, rows: List[List[str]], subtitle: Optional[str] = None):
+        self._doc_template(path, pagesize=self.pagesize).build(self.flowables(rows, subtitle))
+
+    def render_many(self, path, reports: Sequence[tuple]):
+        """Несколько отчётов (rows, subtitle) в одном PDF, каждый с новой страницы."""
+        elements = []
+        for i, (rows, subtitle) in enumerate(reports):
+            if i:
+                elements.append(self._page_break())
+            elements.extend(self.flowables(rows, subtitle))
+        self._doc_template(path, pagesize=self.pagesize).build(elements)
+
+
+_RENDERERS: Dict[tuple, object] = {}
+
+
+def get_renderer(fmt: str, font_path: Optional[str] = None):
+    """Рендерер формата 'docx' или 'pdf', общий для всех отчётов процесса."""
+    key = (fmt, font_path if fmt == 'pdf' else None)
+    if key not in _RENDERERS:
+        if fmt == 'docx':
+            _RENDERERS[key] = DocxRenderer()
+        elif fmt == 'pdf':
+            _RENDERERS[key] = PdfRenderer(font_path)
+        else:
+            raise ValueError(f"Неизвестный формат отчёта: {fmt}")
+    return _RENDERERS[key]
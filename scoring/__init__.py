@@ -0,0 +1,22 @@
+from .pipeline import (
+    ACID_KEYS, blend_predictions, gost_status, predict_batch, score_diets,
+    ingredients_frame, nutrients_frame, ingredients_table, nutrients_table,
+)
+from .herd import score_herd
+from .uncertainty import estimate_uncertainty, ood_score, get_feature_stats
+
+__all__ = [
+    'ACID_KEYS',
+    'blend_predictions',
+    'gost_status',
+    'predict_batch',
+    'score_diets',
+    'score_herd',
+    'ingredients_frame',
+    'nutrients_frame',
+    'ingredients_table',
+    'nutrients_table',
+    'estimate_uncertainty',
+    'ood_score',
+    'get_feature_stats',
+]
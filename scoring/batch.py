@@ -0,0 +1,324 @@
+"""
+Пакетная оценка PDF-отчётов рационов без GUI (Qt не импортируется).
+
+Файлы разбираются parse_pdf_diet в изолированных процессах (preprocessing.isolation,
+--workers штук) с лимитами времени (--timeout) и памяти (--max-memory) на файл: зависший
+или упавший camelot даёт ошибку этого файла со страницей, а остальные продолжают
+разбираться. Затем все успешно разобранные рационы проходят обе модели одним пакетом. С --shared-models
+процессы пула ещё и оценивают свои порции файлов, подключая модели из общей памяти. Результат —
+16 усреднённых кислот и статус по ГОСТу для каждого файла в CSV, JSON или SQLite
+(схема приложения: рационы и предсказания появятся в истории GUI).
+Статистики входных признаков разобранных рационов (scoring.drift) сливаются в БД:
+в --stats-db или, при выводе в SQLite, в сам файл результата.
+Код возврата 1, если хотя бы один файл не обработан.
+
+Запуск из корня проекта (модели читаются из parameters/):
+    python -m scoring.batch reports/ "archive/**/*.pdf" -o results.csv --workers 4
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from preprocessing.errors import ParsingError
+from preprocessing.isolation import DEFAULT_MEMORY_MB, DEFAULT_TIMEOUT, IsolatedParser, IsolatedPool
+from utils import tracing
+
+from . import drift
+from .pipeline import ACID_KEYS, score_diets
+
+FORMATS = ('csv', 'json', 'sqlite')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Файлов в одной задаче пула при оценке в процессах (--shared-models)
+SCORE_CHUNK_FILES = 32
+
+
+def collect_files(inputs: List[str], recursive: bool = False) -> List[str]:
+    """Файлы, маски (в т.ч. **) и папки -> список путей без повторов в порядке ввода.
+
+    Несуществующие пути остаются в списке, чтобы попасть в отчёт как ошибка.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*.pdf') if recursive else os.path.join(item, '*.pdf')
+            found = sorted(glob.glob(pattern, recursive=recursive))
+            found += sorted(glob.glob(pattern[:-3] + 'PDF', recursive=recursive))
+        elif glob.has_magic(item):
+            found = sorted(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        else:
+            found = [item]
+        paths.extend(os.path.abspath(p) for p in found)
+    return list(dict.fromkeys(paths))
+
+
+def parse_file(path: str, parser: Optional[IsolatedParser] = None):
+    """Разбор одного файла: (path, ing_df, nut_df, error), error — ParsingError или None.
+
+    parser — процесс разбора с лимитами (preprocessing.isolation); без него — в этом процессе.
+    """
+    try:
+        if not os.path.isfile(path):
+            raise ParsingError(f"Файл не найден: {path}", path, stage='open')
+        if parser is None:
+            from preprocessing import parse_pdf_diet
+
+            ing_df, nut_df = parse_pdf_diet(path)
+        else:
+            ing_df, nut_df = parser.parse(path)
+        if nut_df is None or nut_df.empty:
+            raise ParsingError("Не найдена таблица «Сводный анализ»", path, stage='nutrients')
+        return path, ing_df, nut_df, None
+    except ParsingError as e:
+        return path, None, None, e
+    except Exception as e:
+        return path, None, None, ParsingError(f"{type(e).__name__}: {e}", path)
+
+
+def _parse_file_traced(path: str):
+    """parse_file в процессе пула с возвратом его событий трассировки в основной процесс."""
+    return parse_file(path), tracing.drain()
+
+
+def parse_files(paths: List[str], workers: int = 1, isolation: Optional[dict] = None) -> list:
+    """Разбор файлов последовательно или в workers процессах (порядок сохраняется).
+
+    isolation — параметры IsolatedParser (timeout, memory_mb): каждый файл разбирается
+    в изолированном процессе с лимитами; None — в этом процессе или пуле без лимитов.
+    """
+    if isolation is not None:
+        with IsolatedPool(min(workers, len(paths)), **isolation) as pool:
+            return pool.map(paths, parse_file)
+    if workers <= 1 or len(paths) <= 1:
+        return [parse_file(path) for path in paths]
+    if not tracing.enabled():
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            return list(pool.map(parse_file, paths))
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), initializer=tracing.enable,
+                             initargs=(tracing.memory_enabled(),)) as pool:
+        results = []
+        for result, events in pool.map(_parse_file_traced, paths):
+            tracing.merge(events)
+            results.append(result)
+        return results
+
+
+def score_parsed(parsed_files: list, nutrients_model) -> List[dict]:
+    """Записи результата по разобранным файлам (кортежи parse_file); модели вызываются одним пакетом."""
+    records = []
+    parsed = []
+    for path, ing_df, nut_df, error in parsed_files:
+        record = {'file': path, 'status': 'error', 'error': None}
+        records.append(record)
+        if error is None:
+            parsed.append((record, ing_df, nut_df))
+        else:
+            record.update(error=str(error), error_kind=error.kind, error_page=error.page)
+    if not parsed:
+        return records
+    try:
+        results = score_diets([p[1] for p in parsed], [p[2] for p in parsed], nutrients_model)
+    except Exception:
+        # Пакет упал: оцениваем файлы по одному, чтобы ошибка одного не стала ошибкой всех
+        results = []
+        for record, ing_df, nut_df in parsed:
+            try:
+                results.extend(score_diets([ing_df], [nut_df], nutrients_model))
+            except Exception as e:
+                record['error'] = f"{type(e).__name__}: {e}"
+                results.append(None)
+    scored = [(p, result) for p, result in zip(parsed, results) if result is not None]
+    for (record, _, _), result in scored:
+        record.update(result, status='ok')
+    if scored:
+        drift.record([p[1] for p, _ in scored], [p[2] for p, _ in scored])
+    return records
+
+
+_worker_parser: Optional[IsolatedParser] = None
+
+
+def _init_scoring_worker(descriptor: dict, trace: bool, trace_memory: bool, isolation: Optional[dict] = None):
+    """Инициализатор процесса пула: трассировка, модели из общей памяти и свой процесс разбора с лимитами."""
+    global _worker_parser
+    from .model_store import install_worker_models
+
+    if trace:
+        tracing.enable(trace_memory)
+    install_worker_models(descriptor)
+    if isolation is not None:
+        _worker_parser = IsolatedParser(**isolation)
+
+
+def _score_chunk(paths: List[str]):
+    """Задача процесса пула с общими моделями: разбор и оценка порции файлов."""
+    from .model_store import worker_nutrients_model
+
+    records = score_parsed([parse_file(path, _worker_parser) for path in paths], worker_nutrients_model())
+    return records, tracing.drain(), drift.drain()
+
+
+def _score_in_workers(paths: List[str], nutrients_model, workers: int,
+                      isolation: Optional[dict] = None) -> List[dict]:
+    from .model_store import ModelStore
+
+    workers = min(workers, len(paths))
+    # Порции по нескольку файлов: в процессе модели вызываются пакетом, а не на каждый файл
+    size = max(1, min(SCORE_CHUNK_FILES, -(-len(paths) // workers)))
+    chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+    records = []
+    with ModelStore(nutrients_model=nutrients_model) as store, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                                initargs=(store.descriptor, tracing.enabled(), tracing.memory_enabled(),
+                                          isolation)) as pool:
+        for chunk_records, events, stats in pool.map(_score_chunk, chunks):
+            tracing.merge(events)
+            drift.merge(stats)
+            records.extend(chunk_records)
+    return records
+
+
+def score_files(paths: List[str], nutrients_model, workers: int = 1, shared_models: bool = False,
+                isolation: Optional[dict] = None) -> List[dict]:
+    """Записи результата по каждому файлу: status 'ok' с предсказаниями или 'error' с текстом ошибки.
+
+    shared_models — файлы и разбираются, и оцениваются в процессах пула; модели публикуются
+    один раз в общей памяти (scoring.model_store), а не загружаются каждым процессом.
+    isolation — лимиты разбора (см. parse_files); ошибки разбора дают error_kind и error_page.
+    """
+    if shared_models and workers > 1 and len(paths) > 1:
+        return _score_in_workers(paths, nutrients_model, workers, isolation)
+    return score_parsed(parse_files(paths, workers, isolation), nutrients_model)
+
+
+def write_csv(records: List[dict], out):
+    writer = csv.writer(out)
+    writer.writerow(['file', 'status', 'error', 'gost_ok', 'ood_score'] + list(ACID_KEYS)
+                    + [f'{k}_gost' for k in ACID_KEYS] + [f'{k}_uncertainty' for k in ACID_KEYS])
+    for r in records:
+        if r['status'] == 'ok':
+            values = ([f"{r['predictions'][k]:.4f}" for k in ACID_KEYS] + [r['gost'][k] for k in ACID_KEYS]
+                      + [f"{r['uncertainty'][k]:.4f}" for k in ACID_KEYS])
+            writer.writerow([r['file'], r['status'], '', int(r['gost_ok']), f"{r['ood_score']:.4f}"] + values)
+        else:
+            writer.writerow([r['file'], r['status'], r['error'], '', ''] + [''] * (3 * len(ACID_KEYS)))
+
+
+def write_json(records: List[dict], out):
+    keys = ('file', 'status', 'error', 'error_kind', 'error_page', 'gost_ok', 'predictions', 'gost', 'uncertainty',
+            'ood_score')
+    json.dump([{k: r.get(k) for k in keys} for r in records], out, ensure_ascii=False, indent=2)
+    out.write('\n')
+
+
+def write_sqlite(records: List[dict], path: str):
+    """Успешные рационы и их предсказания (с выходами потоков и признаками) в БД приложения."""
+    from database import DatabaseManager
+
+    ok = [r for r in records if r['status'] == 'ok']
+    with DatabaseManager(path) as db, db.transaction():
+        diet_ids = db.add_diets([os.path.basename(r['file']) for r in ok])
+        db.add_predictions(
+            diet_ids, [r['predictions'] for r in ok],
+            ingredient_outputs=[r['ingredient_output'] for r in ok],
+            nutrient_outputs=[r['nutrient_output'] for r in ok],
+            ingredient_features=[r['ingredient_features'] for r in ok],
+            nutrient_features=[r['nutrient_features'] for r in ok],
+            uncertainties=[r['uncertainty'] for r in ok],
+            ood_scores=[r['ood_score'] for r in ok],
+        )
+
+
+def output_format(output: str, fmt: str = 'auto') -> str:
+    if fmt != 'auto':
+        return fmt
+    if output.lower().endswith('.json'):
+        return 'json'
+    if output.lower().endswith(SQLITE_EXTENSIONS):
+        return 'sqlite'
+    return 'csv'
+
+
+def flush_input_stats(path: str) -> int:
+    """Слить накопленные статистики входных признаков (scoring.drift) в БД path."""
+    from database import DatabaseManager
+
+    with DatabaseManager(path) as db:
+        return drift.flush(db)
+
+
+def write_output(records: List[dict], output: str, fmt: str = 'auto'):
+    fmt = output_format(output, fmt)
+    if fmt == 'sqlite':
+        if output == '-':
+            raise ValueError("Для SQLite укажите файл: -o results.db")
+        write_sqlite(records, output)
+        return
+    writer = write_json if fmt == 'json' else write_csv
+    if output == '-':
+        writer(records, sys.stdout)
+    else:
+        with open(output, 'w', encoding='utf-8', newline='') as out:
+            writer(records, out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетная оценка PDF-отчётов рационов (16 кислот и ГОСТ)")
+    ap.add_argument('inputs', nargs='+', help='PDF-файлы, маски (glob) или папки')
+    ap.add_argument('-o', '--output', default='-', help='файл результата (.csv, .json, .db); по умолчанию CSV в stdout')
+    ap.add_argument('--format', default='auto', choices=('auto',) + FORMATS)
+    ap.add_argument('--workers', type=int, default=1, help='процессов для разбора PDF (0 — по числу ядер)')
+    ap.add_argument('--shared-models', action='store_true',
+                    help='оценивать в процессах пула; модели — один раз в общей памяти, а не в каждом процессе')
+    ap.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='секунд на разбор одного PDF (0 — без лимита)')
+    ap.add_argument('--max-memory', type=int, default=DEFAULT_MEMORY_MB,
+                    help='лимит памяти процесса разбора, МБ (0 — без лимита; только Linux/macOS)')
+    ap.add_argument('--no-isolation', action='store_true',
+                    help='разбирать PDF без отдельных процессов и лимитов (как раньше)')
+    ap.add_argument('-r', '--recursive', action='store_true', help='обходить папки рекурсивно')
+    ap.add_argument('--nutrient-model', default='parameters/nutrients-_acids_01617_140.pkl',
+                    help='путь к модели нутриентов')
+    ap.add_argument('--stats-db', help='БД для статистик входных признаков (по умолчанию — вывод SQLite, если он)')
+    ap.add_argument('--trace', metavar='FILE.json', help='записать трассу этапов (Chrome trace) и вывести сводку')
+    ap.add_argument('--trace-memory', action='store_true', help='в трассе — прирост памяти Python по этапам')
+    args = ap.parse_args(argv)
+    if args.trace:
+        tracing.enable(memory=args.trace_memory)
+
+    paths = collect_files(args.inputs, args.recursive)
+    if not paths:
+        print("Не найдено ни одного PDF-файла", file=sys.stderr)
+        return 1
+    from nutrient_model import load_model
+
+    try:
+        nutrients_model = load_model(args.nutrient_model)
+    except Exception as e:
+        print(f"Не удалось загрузить модель нутриентов: {e}", file=sys.stderr)
+        return 1
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    isolation = None if args.no_isolation else {'timeout': args.timeout, 'memory_mb': args.max_memory}
+    records = score_files(paths, nutrients_model, workers, args.shared_models, isolation)
+    write_output(records, args.output, args.format)
+    stats_db = args.stats_db or (args.output if output_format(args.output, args.format) == 'sqlite' else None)
+    if stats_db:
+        flush_input_stats(stats_db)
+
+    failed = [r for r in records if r['status'] != 'ok']
+    for r in failed:
+        print(f"Ошибка: {r['file']}: {r['error']}", file=sys.stderr)
+    out_of_range = sum(1 for r in records if r['status'] == 'ok' and not r['gost_ok'])
+    print(f"Обработано: {len(records) - len(failed)} из {len(records)}, ошибок: {len(failed)}, "
+          f"с отклонениями от ГОСТ: {out_of_range}", file=sys.stderr)
+    if args.trace:
+        tracing.write_report(args.trace)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
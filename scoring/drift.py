@@ -0,0 +1,332 @@
+"""
+Бегущие статистики входных признаков рационов: видно, когда фермы начинают присылать
+рационы, не похожие на обучающие (новые корма в корзине 'None', нутриенты вне диапазонов).
+
+Два потока признаков:
+  * ingredient — % СВ по кодам feed_types ('01'..'45', строки categorize_feeds_bulk),
+    unmapped — 1, если в рационе есть корм, не отнесённый ни к одному коду (его среднее —
+    доля рационов с нераспознанными названиями), unmapped_share — % СВ такого корма;
+  * nutrient — Value_i из «Сводного анализа» (пропуски не считаются).
+
+По каждому признаку за UTC-день хранятся количество, среднее и сумма квадратов отклонений
+(Welford), min/max и число нулей. Пакет рационов сводится к этим величинам векторно,
+а пакеты сливаются формулой Чана — в памяти процесса (record/drain) и в БД
+(DatabaseManager.merge_input_stats), поэтому учёт стоит O(признаков) на рацион,
+не хранит сами рационы и сливается из процессов пула в любом порядке.
+
+Учёт ведётся в точках приёма рационов (scoring.batch, scoring.service, разбор PDF в GUI),
+ручной ввод и «что если» не учитываются. Выключение: MILK_DRIFT=0.
+
+Отчёт из БД:
+    python -m scoring.drift --db database/milk_analysis.db --from 2026-10-01
+    python -m scoring.drift --db results.db --baseline-from 2026-01-01 --from 2026-10-01 --json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+ENV_DRIFT = 'MILK_DRIFT'
+
+STREAMS = ('ingredient', 'nutrient')
+UNMAPPED = 'unmapped'
+UNMAPPED_SHARE = 'unmapped_share'
+UNMAPPED_COLUMN = 'None'  # колонка categorize_feeds_bulk для нераспознанного корма
+
+# Сдвиг среднего относительно базового периода (в его стандартных отклонениях), с которого признак отмечается
+SHIFT_THRESHOLD = 1.0
+
+_pending: Dict[tuple, 'FeatureStats'] = {}
+_pending_lock = threading.Lock()
+_enabled = os.environ.get(ENV_DRIFT, '').strip() != '0'
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+class FeatureStats:
+    """Статистики признаков одного потока за день: векторы по features."""
+
+    __slots__ = ('features', 'n', 'mean', 'm2', 'min', 'max', 'zeros')
+
+    def __init__(self, features: Sequence[str]):
+        d = len(features)
+        self.features = list(features)
+        self.n = np.zeros(d, dtype=np.int64)
+        self.mean = np.zeros(d)
+        self.m2 = np.zeros(d)
+        self.min = np.full(d, np.inf)
+        self.max = np.full(d, -np.inf)
+        self.zeros = np.zeros(d, dtype=np.int64)
+
+    @classmethod
+    def from_matrix(cls, X, features: Sequence[str]) -> 'FeatureStats':
+        """Статистики пакета [n, d]; NaN — признак в рационе отсутствует и не считается."""
+        X = np.asarray(X, dtype=float)
+        stats = cls(features)
+        present = ~np.isnan(X)
+        stats.n = present.sum(axis=0)
+        counted = stats.n > 0
+        total = np.where(present, X, 0.0).sum(axis=0)
+        stats.mean[counted] = total[counted] / stats.n[counted]
+        stats.m2 = np.where(present, (X - stats.mean) ** 2, 0.0).sum(axis=0)
+        stats.min = np.where(present, X, np.inf).min(axis=0)
+        stats.max = np.where(present, X, -np.inf).max(axis=0)
+        stats.zeros = (X == 0).sum(axis=0)
+        return stats
+
+    def merge(self, other: 'FeatureStats'):
+        """Слияние Чана: результат тот же, что у одного прохода Welford по обоим пакетам."""
+        if other.features != self.features:
+            index = {f: i for i, f in enumerate(self.features)}
+            for f in other.features:
+                if f not in index:
+                    index[f] = len(self.features)
+                    self.features.append(f)
+                    self.n = np.append(self.n, 0)
+                    self.mean = np.append(self.mean, 0.0)
+                    self.m2 = np.append(self.m2, 0.0)
+                    self.min = np.append(self.min, np.inf)
+                    self.max = np.append(self.max, -np.inf)
+                    self.zeros = np.append(self.zeros, 0)
+            cols = np.array([index[f] for f in other.features], dtype=int)
+        else:
+            cols = np.arange(len(self.features))
+        n_a, n_b = self.n[cols], other.n
+        n = n_a + n_b
+        safe = np.maximum(n, 1)
+        delta = other.mean - self.mean[cols]
+        self.mean[cols] += delta * n_b / safe
+        self.m2[cols] += other.m2 + delta * delta * n_a * n_b / safe
+        self.n[cols] = n
+        self.min[cols] = np.minimum(self.min[cols], other.min)
+        self.max[cols] = np.maximum(self.max[cols], other.max)
+        self.zeros[cols] += other.zeros
+
+    def rows(self, day: str, stream: str) -> List[tuple]:
+        """Строки для DatabaseManager.merge_input_stats (признаки без наблюдений опускаются)."""
+        return [(day, stream, f, int(n), float(mean), float(m2), float(low), float(high), int(zeros))
+                for f, n, mean, m2, low, high, zeros
+                in zip(self.features, self.n, self.mean, self.m2, self.min, self.max, self.zeros) if n]
+
+
+# -------------------- Признаки потоков --------------------
+def ingredient_matrix(ing_dfs: Sequence) -> tuple:
+    """Строки categorize_feeds_bulk -> ([n, 47], признаки): коды feed_types, unmapped, unmapped_share."""
+    import pandas as pd
+    from preprocessing.filtration import INGREDIENT_FEATURES
+
+    df = pd.concat(ing_dfs, ignore_index=True)
+    labels = [label for _, label in INGREDIENT_FEATURES]
+    values = df.reindex(columns=labels).apply(pd.to_numeric, errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    if UNMAPPED_COLUMN in df.columns:
+        share = pd.to_numeric(df[UNMAPPED_COLUMN], errors='coerce').to_numpy(dtype=float)
+    else:
+        share = np.full(len(df), np.nan)
+    unmapped = (~np.isnan(share)).astype(float)
+    X = np.column_stack([values, unmapped, np.nan_to_num(share)])
+    return X, [code for code, _ in INGREDIENT_FEATURES] + [UNMAPPED, UNMAPPED_SHARE]
+
+
+def nutrient_matrix(nut_dfs: Sequence) -> tuple:
+    """Строки Value_i -> ([n, d], признаки); нечисловые и пустые ячейки — NaN (не считаются)."""
+    import pandas as pd
+
+    df = pd.concat(nut_dfs, ignore_index=True)
+    features = sorted((c for c in df.columns if str(c).startswith('Value_')), key=lambda c: int(c[6:]))
+    values = df[features].apply(
+        lambda col: pd.to_numeric(col.astype(str).str.replace(',', '.'), errors='coerce')
+        if not pd.api.types.is_numeric_dtype(col) else col)
+    return values.to_numpy(dtype=float), features
+
+
+# -------------------- Учёт в процессе --------------------
+def today() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _batch_stats(ing_dfs: Sequence, nut_dfs: Sequence):
+    for stream, frames, build in (('ingredient', ing_dfs, ingredient_matrix), ('nutrient', nut_dfs, nutrient_matrix)):
+        frames = [f for f in frames if f is not None]
+        if frames:
+            X, features = build(frames)
+            yield stream, FeatureStats.from_matrix(X, features)
+
+
+def batch_rows(ing_dfs: Sequence, nut_dfs: Sequence, day: Optional[str] = None) -> List[tuple]:
+    """Статистики пакета рационов сразу строками для БД, минуя накопитель процесса."""
+    day = day or today()
+    return [row for stream, stats in _batch_stats(ing_dfs, nut_dfs) for row in stats.rows(day, stream)]
+
+
+def _accumulate(key: tuple, stats: FeatureStats):
+    with _pending_lock:
+        if key in _pending:
+            _pending[key].merge(stats)
+        else:
+            _pending[key] = stats
+
+
+def record(ing_dfs: Sequence, nut_dfs: Sequence, day: Optional[str] = None):
+    """Учесть пакет принятых рационов в накопителе процесса (ничего не делает при MILK_DRIFT=0)."""
+    if not _enabled:
+        return
+    day = day or today()
+    for stream, stats in _batch_stats(ing_dfs, nut_dfs):
+        _accumulate((day, stream), stats)
+
+
+def drain() -> List[tuple]:
+    """Забрать накопленное строками (day, stream, feature, n, mean, m2, min, max, zeros)."""
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    return [row for (day, stream), stats in sorted(pending.items()) for row in stats.rows(day, stream)]
+
+
+def merge(rows: Sequence[tuple]):
+    """Влить строки drain() другого процесса (процессы пула) в накопитель этого процесса."""
+    grouped: Dict[tuple, list] = {}
+    for row in rows:
+        grouped.setdefault((row[0], row[1]), []).append(row)
+    for key, items in grouped.items():
+        stats = FeatureStats([r[2] for r in items])
+        stats.n = np.array([r[3] for r in items], dtype=np.int64)
+        stats.mean = np.array([r[4] for r in items], dtype=float)
+        stats.m2 = np.array([r[5] for r in items], dtype=float)
+        stats.min = np.array([r[6] for r in items], dtype=float)
+        stats.max = np.array([r[7] for r in items], dtype=float)
+        stats.zeros = np.array([r[8] for r in items], dtype=np.int64)
+        _accumulate(key, stats)
+
+
+def flush(db) -> int:
+    """Записать накопленное в БД (DatabaseManager) и очистить накопитель; число строк."""
+    rows = drain()
+    if rows:
+        try:
+            db.merge_input_stats(rows)
+        except Exception:
+            merge(rows)  # не теряем статистики при временной ошибке записи
+            raise
+    return len(rows)
+
+
+# -------------------- Отчёт --------------------
+def drift_report(current: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None,
+                 feature_stats: Optional[Dict[str, dict]] = None) -> List[dict]:
+    """Строки отчёта по признакам get_input_stats с отметками о возможном дрейфе.
+
+    feature_stats — диапазоны обучающей области (scoring.uncertainty): отмечаются признаки,
+    наблюдавшиеся вне них; baseline — статистики базового периода: отмечается сдвиг
+    среднего больше SHIFT_THRESHOLD его стандартных отклонений.
+    """
+    report = []
+    for stream in sorted(current):
+        ranges = {}
+        if feature_stats and stream in feature_stats:
+            stats = feature_stats[stream]
+            ranges = {f: (low, high) for f, low, high in zip(stats['features'], stats['low'], stats['high'])}
+        base = (baseline or {}).get(stream, {})
+        for feature, s in current[stream].items():
+            row = dict(s, stream=stream, feature=feature, flags=[])
+            low, high = ranges.get(feature, (None, None))
+            if low is not None and not _isnan(low) and s['min'] < low:
+                row['flags'].append('below_train')
+            if high is not None and not _isnan(high) and s['max'] > high:
+                row['flags'].append('above_train')
+            if feature in base:
+                b = base[feature]
+                scale = b['std'] if b['std'] > 0 else max(abs(b['mean']), 1.0) * 1e-3
+                row['shift'] = (s['mean'] - b['mean']) / scale
+                if abs(row['shift']) > SHIFT_THRESHOLD:
+                    row['flags'].append('mean_shift')
+            elif base:
+                row['flags'].append('new_feature')
+            report.append(row)
+    report.sort(key=lambda r: (r['stream'], _feature_order(r['feature'])))
+    return report
+
+
+def _isnan(value) -> bool:
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _feature_order(feature: str):
+    if feature.startswith('Value_'):
+        return 0, int(feature[6:]), feature
+    return (0, int(feature), feature) if feature.isdigit() else (1, 0, feature)
+
+
+def format_report(report: List[dict], flagged_only: bool = False) -> str:
+    from preprocessing.filtration import INGREDIENT_FEATURES
+
+    labels = dict(INGREDIENT_FEATURES)
+    lines = [f"{'поток':<10} {'признак':<28} {'n':>7} {'среднее':>10} {'ст.откл.':>10} {'мин':>10} "
+             f"{'макс':>10} {'нулей':>6} {'сдвиг':>6}  отметки"]
+    for r in report:
+        if flagged_only and not r['flags']:
+            continue
+        name = f"{r['feature']} {labels.get(r['feature'], '')}".strip()[:28]
+        shift = f"{r['shift']:>6.2f}" if 'shift' in r else f"{'':>6}"
+        lines.append(f"{r['stream']:<10} {name:<28} {r['count']:>7} {r['mean']:>10.3f} {r['std']:>10.3f} "
+                     f"{r['min']:>10.3f} {r['max']:>10.3f} {r['zero_rate']:>6.0%} {shift}  {','.join(r['flags'])}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Статистики входных признаков рационов и признаки дрейфа")
+    ap.add_argument('--db', default='database/milk_analysis.db', help='БД приложения или scoring.batch')
+    ap.add_argument('--from', dest='date_from', help='начало периода (YYYY-MM-DD, UTC)')
+    ap.add_argument('--to', dest='date_to', help='конец периода включительно')
+    ap.add_argument('--baseline-from', help='базовый период — с этой даты до дня перед --from')
+    ap.add_argument('--stream', choices=STREAMS)
+    ap.add_argument('--flagged', action='store_true', help='только признаки с отметками')
+    ap.add_argument('--json', action='store_true', help='отчёт в JSON')
+    args = ap.parse_args(argv)
+    if not os.path.isfile(args.db):
+        print(f"Нет БД: {args.db}", file=sys.stderr)
+        return 1
+
+    from database import DatabaseManager
+    from .uncertainty import get_feature_stats
+
+    with DatabaseManager(args.db) as db:
+        current = db.get_input_stats(args.date_from, args.date_to, args.stream)
+        baseline = None
+        if args.baseline_from:
+            if not args.date_from:
+                ap.error("--baseline-from требует --from")
+            previous = date.fromisoformat(args.date_from[:10]) - timedelta(days=1)
+            baseline = db.get_input_stats(args.baseline_from, previous.isoformat(), args.stream)
+    if not current:
+        print("За период нет статистик входных данных", file=sys.stderr)
+        return 1
+    report = drift_report(current, baseline, get_feature_stats())
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print(format_report(report, args.flagged))
+        unmapped = current.get('ingredient', {}).get(UNMAPPED)
+        if unmapped:
+            print(f"Рационов: {unmapped['count']}, с нераспознанными кормами: {unmapped['mean']:.1%}")
+        flagged = sum(1 for r in report if r['flags'])
+        print(f"Признаков с отметками: {flagged} из {len(report)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Сценарии на уровне стада и холдинга: жирнокислотный профиль сборного молока.
+
+На ферме группы (новотельные, раздой, вторая половина лактации, сухостой) получают
+разные рационы, а в танк попадает смесь их молока. Группа — рацион в формате сервиса
+({'ingredients': {...}, 'nutrients': {...}}) с поголовьем head и суточным удоем на
+голову milk_yield (кг); fat (% жира) необязателен. Вклад группы в профиль — её доля
+молочного жира в танке: head · milk_yield · fat, а без fat у всех групп — доля молока.
+
+Все группы считаются одним вызовом моделей (scoring.pipeline.predict_batch); одинаковые
+рационы разных групп и ферм предсказываются один раз. Взвешивание векторное, поэтому
+тысячи групп холдинга считаются за время одного пакетного предсказания.
+
+Запуск из корня проекта:
+    python -m scoring.herd groups.json --by farm
+где groups.json — список групп или {"groups": [...]}; farm и name групп — произвольные метки.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from utils import GOST_IN_RANGE
+from utils.tracing import span, traced
+
+from .pipeline import ACID_KEYS, gost_status, ingredients_table, nutrients_table, predict_batch
+
+
+def group_weights(groups: Sequence[dict]) -> np.ndarray:
+    """Доли групп в сборном молоке (сумма 1): по молочному жиру, если fat указан у всех групп."""
+    try:
+        head = np.array([float(g['head']) for g in groups])
+        milk = np.array([float(g['milk_yield']) for g in groups])
+    except KeyError as e:
+        raise ValueError(f"У группы не указано поле {e.args[0]!r}")
+    except TypeError as e:
+        raise ValueError(f"Поголовье и удой должны быть числами: {e}")
+    with_fat = ['fat' in g for g in groups]
+    if any(with_fat) and not all(with_fat):
+        raise ValueError("Жирность (fat) указана не у всех групп")
+    weights = head * milk
+    if all(with_fat):
+        weights = weights * np.array([float(g['fat']) for g in groups])
+    if not np.isfinite(weights).all() or (weights < 0).any():
+        raise ValueError("Поголовье, удой и жирность должны быть неотрицательными числами")
+    total = weights.sum()
+    if total <= 0:
+        raise ValueError("Нулевой суммарный удой: некому сдавать молоко")
+    return weights / total
+
+
+def _profile(values: np.ndarray, uncertainty: np.ndarray, ood: np.ndarray) -> dict:
+    values = values.tolist()  # округление в статусах ГОСТ быстрее на числах Python, чем на np.float64
+    gost = gost_status(values)
+    return {
+        'predictions': dict(zip(ACID_KEYS, values)),
+        'gost': gost,
+        'gost_ok': all(status == GOST_IN_RANGE for status in gost.values()),
+        'uncertainty': dict(zip(ACID_KEYS, uncertainty.tolist())),
+        'ood_score': float(ood),
+    }
+
+
+@traced('scoring.score_herd')
+def score_herd(groups: Sequence[dict], nutrients_model, by: Optional[str] = None,
+               with_groups: bool = False) -> dict:
+    """Профиль сборного молока по группам стада/холдинга.
+
+    Возвращает predictions/gost/gost_ok/uncertainty/ood_score смеси, число групп, поголовье
+    и суточный надой; by — поле группы (например 'farm'), по которому дополнительно считаются
+    профили каждого танка ('by': {метка: профиль}); with_groups — ещё и профили групп.
+    Неопределённость смеси — взвешенная сумма неопределённостей групп (ошибки групп
+    считаются согласованными, оценка сверху).
+    """
+    if not groups:
+        raise ValueError("Не передано ни одной группы")
+    weights = group_weights(groups)
+    for i, g in enumerate(groups):
+        for field in ('ingredients', 'nutrients'):
+            if not isinstance(g.get(field) or {}, dict):
+                raise ValueError(f"Группа {g.get('name', i)!r}: {field} должно быть объектом {{признак: значение}}")
+    ing_df = ingredients_table([g.get('ingredients') or {} for g in groups])
+    nut_df = nutrients_table([g.get('nutrients') or {} for g in groups])
+
+    # Одинаковые рационы (общий рацион групп, типовой рацион ферм) предсказываются один раз
+    rations = np.hstack([ing_df.to_numpy(), nut_df.to_numpy()])
+    _, first, inverse = np.unique(rations, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if len(first) < len(rations):
+        ing_df, nut_df = ing_df.iloc[first], nut_df.iloc[first]
+    else:
+        inverse = np.arange(len(rations))
+    batch = predict_batch(ing_df, nut_df, nutrients_model)
+    values = batch['blended'][inverse]
+    uncertainty = batch['uncertainty'][inverse]
+    ood = batch['ood_score'][inverse]
+
+    with span('scoring.herd_mix', rows=len(groups)):
+        head = np.array([float(g['head']) for g in groups])
+        milk = head * np.array([float(g['milk_yield']) for g in groups])
+        result = _profile(weights @ values, weights @ uncertainty, weights @ ood)
+        result.update(groups=len(groups), rations=len(first), head=float(head.sum()), milk=float(milk.sum()))
+        if by is not None:
+            positions = {}
+            index = np.array([positions.setdefault(g.get(by), len(positions)) for g in groups])
+            keys = list(positions)
+            mixes = np.zeros((len(keys), values.shape[1]))
+            spreads = np.zeros_like(mixes)
+            oods = np.zeros(len(keys))
+            np.add.at(mixes, index, weights[:, None] * values)
+            np.add.at(spreads, index, weights[:, None] * uncertainty)
+            np.add.at(oods, index, weights * ood)
+            shares = np.bincount(index, weights=weights, minlength=len(keys))
+            heads = np.bincount(index, weights=head, minlength=len(keys))
+            milks = np.bincount(index, weights=milk, minlength=len(keys))
+            sizes = np.bincount(index, minlength=len(keys))
+            result['by'] = {}
+            for i, key in enumerate(keys):
+                # Танк без молока (только сухостой) не имеет профиля
+                profile = _profile(mixes[i] / shares[i], spreads[i] / shares[i], oods[i] / shares[i]) \
+                    if shares[i] > 0 else {}
+                profile.update(groups=int(sizes[i]), head=float(heads[i]), milk=float(milks[i]), share=float(shares[i]))
+                result['by'][key] = profile
+        if with_groups:
+            result['group_results'] = [dict(_profile(values[i], uncertainty[i], ood[i]), weight=float(weights[i]))
+                                       for i in range(len(groups))]
+    return result
+
+
+def load_groups(path: str) -> List[dict]:
+    if path == '-':
+        payload = json.load(sys.stdin)
+    else:
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+    groups = payload['groups'] if isinstance(payload, dict) else payload
+    if not isinstance(groups, list) or not all(isinstance(g, dict) for g in groups):
+        raise ValueError("Ожидается список групп или {\"groups\": [...]}")
+    return groups
+
+
+def format_profile(result: dict) -> str:
+    from utils.constants import FATTY_ACID_NAMES
+
+    rations = f" (рационов: {result['rations']})" if 'rations' in result else ''
+    lines = [f"Групп: {result['groups']}{rations}, поголовье: {result['head']:.0f}, "
+             f"надой: {result['milk']:.0f} кг/сут, ГОСТ: {'в норме' if result['gost_ok'] else 'есть отклонения'}"]
+    for key in ACID_KEYS:
+        lines.append(f"  {FATTY_ACID_NAMES[key]:<24} {result['predictions'][key]:>8.3f} "
+                     f"± {result['uncertainty'][key]:<7.3f} {result['gost'][key]}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Жирнокислотный профиль сборного молока по группам стада")
+    ap.add_argument('groups', help='JSON со списком групп (- — stdin)')
+    ap.add_argument('--by', help='поле группы для профилей по танкам (например farm)')
+    ap.add_argument('--with-groups', action='store_true', help='в JSON — профили каждой группы')
+    ap.add_argument('--json', action='store_true', help='результат в JSON')
+    ap.add_argument('--nutrient-model', default='parameters/nutrients-_acids_01617_140.pkl',
+                    help='путь к модели нутриентов')
+    args = ap.parse_args(argv)
+
+    from nutrient_model import load_model
+
+    try:
+        groups = load_groups(args.groups)
+        nutrients_model = load_model(args.nutrient_model)
+        result = score_herd(groups, nutrients_model, args.by, args.with_groups)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+        return 0
+    print(format_profile(result))
+    for key, profile in result.get('by', {}).items():
+        print(f"\n{args.by}={key}")
+        print(format_profile(profile) if 'predictions' in profile else f"  нет молока (поголовье {profile['head']:.0f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Общее хранилище моделей для процессов пула.
+
+Основной процесс один раз упаковывает 16 бустеров ингредиентного потока
+(ingredient_model.packed) в один блок multiprocessing.shared_memory, а модель
+нутриентов сохраняет несжатым joblib-файлом. Процессы пула получают короткий
+дескриптор (имя блока, смещения и типы массивов, путь к файлу) и подключаются
+без копирования: numpy-массивы ансамбля смотрят прямо в общую память, массивы
+модели нутриентов открываются через read-only mmap (joblib.load(mmap_mode='r')).
+Так память под модели не растёт с числом процессов.
+
+    with ModelStore(nutrient_model_path=path) as store:
+        with ProcessPoolExecutor(4, initializer=install_worker_models,
+                                 initargs=(store.descriptor,)) as pool: ...
+"""
+import os
+import shutil
+import tempfile
+from multiprocessing import shared_memory
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from ingredient_model.model_set import booster_paths as active_booster_paths
+from ingredient_model.packed import PackedEnsemble, pack_boosters
+
+# Выравнивание массивов в блоке (строка кэша)
+_ALIGN = 64
+
+_attached = None  # (SharedMemory, PackedEnsemble, модель нутриентов) подключённые в этом процессе
+
+
+class ModelStore:
+    """Владелец общей памяти: публикует модели в конструкторе, освобождает в close()."""
+
+    def __init__(self, booster_paths: Optional[Iterable[str]] = None,
+                 nutrient_model_path: Optional[str] = None, nutrients_model=None):
+        arrays = pack_boosters(booster_paths or active_booster_paths())
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            offset = -(-offset // _ALIGN) * _ALIGN
+            layout[name] = (offset, array.dtype.str, array.shape)
+            offset += array.nbytes
+        self.nbytes = offset
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            _view(self._shm, layout[name])[...] = array
+        self._tmpdir = None
+        nutrient_path = None
+        if nutrients_model is None and nutrient_model_path is not None:
+            from nutrient_model import load_model
+
+            nutrients_model = load_model(nutrient_model_path)
+        if nutrients_model is not None:
+            import joblib
+
+            # Несжатый файл: при загрузке с mmap_mode массивы не копируются в память процесса
+            self._tmpdir = tempfile.mkdtemp(prefix='milk_models_')
+            nutrient_path = os.path.join(self._tmpdir, 'nutrients.joblib')
+            joblib.dump(nutrients_model, nutrient_path)
+        self.descriptor = {'shm': self._shm.name, 'arrays': layout, 'nutrient_model': nutrient_path}
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _view(shm: shared_memory.SharedMemory, spec) -> np.ndarray:
+    offset, dtype, shape = spec
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape)) if shape else 1
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset) if count else np.zeros(shape, dtype)
+
+
+def attach(descriptor: dict) -> Tuple[shared_memory.SharedMemory, PackedEnsemble, object]:
+    """Подключение к опубликованным моделям: (блок, ансамбль на общей памяти, модель нутриентов или None).
+
+    Блок нужно держать, пока используется ансамбль: его массивы ссылаются на память блока.
+    """
+    try:
+        # Python 3.13+: блоком владеет основной процесс, трекер ресурсов его не трогает
+        shm = shared_memory.SharedMemory(name=descriptor['shm'], track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=descriptor['shm'])
+    arrays = {name: _view(shm, spec) for name, spec in descriptor['arrays'].items()}
+    for array in arrays.values():
+        array.flags.writeable = False
+    nutrients_model = None
+    if descriptor.get('nutrient_model'):
+        import joblib
+
+        nutrients_model = joblib.load(descriptor['nutrient_model'], mmap_mode='r')
+    return shm, PackedEnsemble(arrays), nutrients_model
+
+
+def install_worker_models(descriptor: dict):
+    """Инициализатор процесса пула: подключить модели и сделать ансамбль моделью ингредиентного потока."""
+    global _attached
+    from ingredient_model import set_ingredient_model
+
+    _attached = attach(descriptor)
+    set_ingredient_model(_attached[1])
+
+
+def worker_nutrients_model():
+    """Модель нутриентов, подключённая install_worker_models в этом процессе."""
+    return _attached[2] if _attached is not None else None
@@ -0,0 +1,146 @@
+"""
+Расчёт 16 кислот по рационам без GUI: оба потока моделей, усреднение, неопределённость и нормы ГОСТ.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from ingredient_model import predict_from_features
+from nutrient_model import predict_prepared, prepare_nutrients, MODEL_FEATURES
+from preprocessing import prepare_ingredients
+from preprocessing.filtration import INGREDIENT_FEATURES
+from utils import check_fatty_acid_ranges, GOST_IN_RANGE
+from utils.constants import FATTY_ACIDS
+from utils.tracing import span, traced
+from .uncertainty import estimate_uncertainty, ood_score
+
+ACID_KEYS = tuple(key for key, _ in FATTY_ACIDS)
+
+_INGREDIENT_LABELS = {code: label for code, label in INGREDIENT_FEATURES}
+_INGREDIENT_ORDER = [label for _, label in INGREDIENT_FEATURES]
+# Столбец раскладки categorize_feeds_bulk по коду и по названию
+_INGREDIENT_COLUMNS = {**{label: i for i, (_, label) in enumerate(INGREDIENT_FEATURES)},
+                       **{code: i for i, (code, _) in enumerate(INGREDIENT_FEATURES)}}
+
+
+def _check_ration(ration, what: str):
+    if not isinstance(ration, dict):
+        raise ValueError(f"{what} должны быть объектом {{признак: значение}}, получено {type(ration).__name__}")
+
+
+def ingredients_table(rations: Sequence[Dict[str, float]]) -> pd.DataFrame:
+    """Рационы {код feed_types ('05') или название: % СВ} -> строки в раскладке categorize_feeds_bulk."""
+    rows = []
+    for ration in rations:
+        _check_ration(ration, "Ингредиенты (ingredients)")
+        row = [0.0] * len(INGREDIENT_FEATURES)
+        for key, value in ration.items():
+            column = _INGREDIENT_COLUMNS.get(key)
+            if column is None:
+                unknown = [k for k in ration if k not in _INGREDIENT_COLUMNS]
+                raise ValueError(f"Неизвестные ингредиенты: {', '.join(map(str, unknown))}")
+            row[column] = value
+        rows.append(row)
+    values = np.array(rows, dtype=float).reshape(len(rows), len(INGREDIENT_FEATURES))
+    return pd.DataFrame(values, columns=_INGREDIENT_ORDER)
+
+
+def nutrients_table(rations: Sequence[Dict[str, float]]) -> pd.DataFrame:
+    """Рационы {Value_i: значение} -> строки признаков модели нутриентов (недостающие — 0, лишние отбрасываются)."""
+    for ration in rations:
+        _check_ration(ration, "Нутриенты (nutrients)")
+    values = np.array([[ration.get(f, 0.0) for f in MODEL_FEATURES] for ration in rations], dtype=float)
+    return pd.DataFrame(values.reshape(len(rations), len(MODEL_FEATURES)), columns=list(MODEL_FEATURES))
+
+
+def _align_ingredients(ing_df: pd.DataFrame) -> pd.DataFrame:
+    """Строки categorize_feeds_bulk -> ровно колонки INGREDIENT_FEATURES.
+
+    Нераспознанный корм попадает в колонку 'None', а её нет у модели: без выравнивания
+    один такой отчёт расширяет pd.concat всего пакета и ломает предсказание для всех.
+    """
+    return ing_df.reindex(columns=_INGREDIENT_ORDER, fill_value=0.0)
+
+
+def ingredients_frame(values: Dict[str, float]) -> pd.DataFrame:
+    """{код feed_types ('05') или название: % СВ} -> строка в раскладке categorize_feeds_bulk."""
+    return ingredients_table([values])
+
+
+def nutrients_frame(values: Dict[str, float]) -> pd.DataFrame:
+    """{Value_i: значение} -> строка признаков модели нутриентов (недостающие — 0, лишние отбрасываются)."""
+    return nutrients_table([values])
+
+
+def blend_predictions(pred_ingr, pred_nutr) -> np.ndarray:
+    """Итоговое значение — среднее выходов ингредиентного и нутриентного потоков."""
+    return (np.asarray(pred_ingr, dtype=float) + np.asarray(pred_nutr, dtype=float)) / 2.0
+
+
+def gost_status(values) -> Dict[str, str]:
+    """Статус по ГОСТу для каждой кислоты (значения в порядке ACID_KEYS)."""
+    return dict(zip(ACID_KEYS, check_fatty_acid_ranges(list(values))))
+
+
+@traced('scoring.predict_batch')
+def predict_batch(ing_df: pd.DataFrame, nut_df: pd.DataFrame, nutrients_model) -> Dict[str, np.ndarray]:
+    """Массивы предсказаний для строк рационов: каждая модель вызывается один раз на весь пакет.
+
+    blended/ingredient_output/nutrient_output/uncertainty — [n, 16] в порядке ACID_KEYS,
+    ood_score — [n], ingredient_features/nutrient_features — подготовленные признаки.
+    """
+    # Признаки готовятся один раз: ими пользуются и модели, и оценка неопределённости
+    ingredient_features = prepare_ingredients(ing_df).to_numpy()
+    nutrient_prepared = prepare_nutrients(nut_df)
+    nutrient_features = nutrient_prepared.to_numpy()
+    pred_ingr = np.asarray(predict_from_features(ingredient_features))
+    pred_nutr = np.asarray(predict_prepared(nutrient_prepared, nutrients_model))
+    blended = blend_predictions(pred_ingr, pred_nutr)
+    with span('scoring.uncertainty', rows=len(blended)):
+        ood = ood_score({'ingredient': ingredient_features, 'nutrient': nutrient_features})
+        uncertainty = estimate_uncertainty(pred_ingr, pred_nutr, ood)
+    return {
+        'blended': blended,
+        'ingredient_output': pred_ingr,
+        'nutrient_output': pred_nutr,
+        'uncertainty': uncertainty,
+        'ood_score': ood,
+        'ingredient_features': ingredient_features,
+        'nutrient_features': nutrient_features,
+    }
+
+
+@traced('scoring.score_diets')
+def score_diets(ing_dfs: List[pd.DataFrame], nut_dfs: List[pd.DataFrame], nutrients_model,
+                with_features: bool = True) -> List[dict]:
+    """Предсказания для списка рационов: каждая модель вызывается один раз на весь пакет.
+
+    ing_dfs — строки categorize_feeds_bulk, nut_dfs — строки Value_i (как из parse_pdf_diet).
+    Для каждого рациона возвращается словарь с predictions/gost/uncertainty ({ключ кислоты: ...}),
+    gost_ok, ood_score, выходами обоих потоков и (with_features) подготовленными признаками.
+    """
+    if not ing_dfs:
+        return []
+    batch = predict_batch(pd.concat([_align_ingredients(df) for df in ing_dfs], ignore_index=True),
+                          pd.concat(nut_dfs, ignore_index=True), nutrients_model)
+    blended, pred_ingr, pred_nutr = batch['blended'], batch['ingredient_output'], batch['nutrient_output']
+    uncertainty, ood = batch['uncertainty'], batch['ood_score']
+    ingredient_features, nutrient_features = batch['ingredient_features'], batch['nutrient_features']
+    results = []
+    for i, values in enumerate(blended.tolist()):
+        gost = gost_status(values)
+        result = {
+            'predictions': dict(zip(ACID_KEYS, values)),
+            'gost': gost,
+            'gost_ok': all(status == GOST_IN_RANGE for status in gost.values()),
+            'uncertainty': dict(zip(ACID_KEYS, uncertainty[i].tolist())),
+            'ood_score': float(ood[i]),
+            'ingredient_output': pred_ingr[i],
+            'nutrient_output': pred_nutr[i],
+        }
+        if with_features:
+            result['ingredient_features'] = ingredient_features[i]
+            result['nutrient_features'] = nutrient_features[i]
+        results.append(result)
+    return results
@@ -0,0 +1,434 @@
+"""
+Локальный HTTP-сервис предсказаний (только стандартная библиотека + asyncio).
+
+Обе модели загружаются один раз при старте и прогреваются. Одновременные запросы
+собираются микро-пакетами: первый запрос открывает окно window_ms, всё пришедшее
+за это время (не более max_batch рационов) считается одним вызовом каждой модели
+в отдельном потоке, так что цикл событий продолжает принимать соединения.
+
+Маршруты:
+    GET  /health       — {"status": "ok"}
+    GET  /metrics      — задержки (p50/p95/p99), пропускная способность, размеры пакетов
+    POST /predict      — JSON рациона {"ingredients": {"05": 10.0, ...}, "nutrients": {"Value_3": 1.2, ...}}
+                         или {"rations": [...]} для нескольких рационов
+    POST /predict/pdf  — тело запроса — PDF-отчёт (разбор в изолированных процессах с лимитами
+                         времени и памяти, preprocessing.isolation; ошибка — 422 со страницей)
+    POST /predict/herd — {"groups": [{"ingredients": ..., "nutrients": ..., "head": 120, "milk_yield": 32.5,
+                         "farm": "..."}, ...], "by": "farm"} — профиль сборного молока (scoring.herd)
+
+Статистики входных признаков принятых рационов (scoring.drift) с --stats-db сливаются
+в БД раз в --stats-interval секунд и при остановке.
+
+Запуск из корня проекта:
+    python -m scoring.service --port 8765 --stats-db database/milk_analysis.db
+Нагрузочный тест: python -m benchmarks.service_load --url http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from preprocessing.isolation import DEFAULT_MEMORY_MB, DEFAULT_TIMEOUT, IsolatedPool
+
+from . import drift
+from .herd import score_herd
+from .pipeline import score_diets, ingredients_frame, nutrients_frame
+
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 422: 'Unprocessable Entity',
+           500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Metrics:
+    """Счётчики и скользящее окно задержек (последние window запросов)."""
+
+    def __init__(self, window: int = 10000):
+        self.started = time.monotonic()
+        self.latencies = {}
+        self.requests = {}
+        self.errors = {}
+        self.window = window
+        self.completed = deque(maxlen=window)  # моменты завершения для rps за последнюю минуту
+        self.batches = 0
+        self.batched_rations = 0
+        self.max_batch_seen = 0
+        self.model_seconds = 0.0
+
+    def observe(self, route: str, seconds: float, ok: bool):
+        self.requests[route] = self.requests.get(route, 0) + 1
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        self.latencies.setdefault(route, deque(maxlen=self.window)).append(seconds)
+        self.completed.append(time.monotonic())
+
+    def observe_batch(self, size: int, seconds: float):
+        self.batches += 1
+        self.batched_rations += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.model_seconds += seconds
+
+    @staticmethod
+    def _percentiles(values) -> Dict[str, float]:
+        ordered = sorted(values)
+        if not ordered:
+            return {}
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {'p50_ms': round(pick(0.50) * 1000, 2), 'p95_ms': round(pick(0.95) * 1000, 2),
+                'p99_ms': round(pick(0.99) * 1000, 2), 'max_ms': round(ordered[-1] * 1000, 2)}
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        uptime = now - self.started
+        total = sum(self.requests.values())
+        last_minute = sum(1 for t in self.completed if now - t <= 60)
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'throughput_rps': round(total / uptime, 2) if uptime else 0.0,
+            'recent_rps': round(last_minute / min(60.0, uptime), 2) if uptime else 0.0,
+            'latency': {route: self._percentiles(values) for route, values in self.latencies.items()},
+            'batches': {
+                'count': self.batches,
+                'rations': self.batched_rations,
+                'mean_size': round(self.batched_rations / self.batches, 2) if self.batches else 0.0,
+                'max_size': self.max_batch_seen,
+                'model_ms_per_batch': round(self.model_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            },
+        }
+
+
+class MicroBatcher:
+    """Собирает рационы одновременных запросов в один вызов score_diets."""
+
+    def __init__(self, nutrients_model, metrics: Metrics, window_ms: float = 10.0, max_batch: int = 64):
+        self.nutrients_model = nutrients_model
+        self.metrics = metrics
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Модели вызываются из одного потока: пакеты идут друг за другом, пока копится следующий
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model')
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def score(self, ing_df, nut_df) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((ing_df, nut_df, future))
+        return await future
+
+    def _score(self, items: List[tuple], record: bool = True) -> List[dict]:
+        ing_dfs, nut_dfs = [i[0] for i in items], [i[1] for i in items]
+        results = score_diets(ing_dfs, nut_dfs, self.nutrients_model, with_features=False)
+        if record:
+            drift.record(ing_dfs, nut_dfs)
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._score, items)
+            except Exception:
+                # Пакет упал: повторяем по одному, ошибку получают только запросы, падающие и в одиночку
+                for item in items:
+                    future = item[2]
+                    try:
+                        result = (await loop.run_in_executor(self._executor, self._score, [item]))[0]
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                continue
+            self.metrics.observe_batch(len(items), time.perf_counter() - started)
+            for (_, _, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def _public(result: dict) -> dict:
+    """Поля ответа: 16 кислот, ГОСТ, неопределённость и выходы обоих потоков."""
+    return {
+        'predictions': result['predictions'],
+        'gost': result['gost'],
+        'gost_ok': result['gost_ok'],
+        'uncertainty': result['uncertainty'],
+        'ood_score': result['ood_score'],
+        'ingredient_output': [float(v) for v in result['ingredient_output']],
+        'nutrient_output': [float(v) for v in result['nutrient_output']],
+    }
+
+
+def _parse_pdf_bytes(data: bytes, parser) -> Tuple:
+    """Разбор загруженного PDF процессом parser (через временный файл)."""
+    from .batch import parse_file
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        _, ing_df, nut_df, error = parse_file(path, parser)
+        return ing_df, nut_df, error
+    finally:
+        os.unlink(path)
+
+
+class InferenceService:
+    def __init__(self, nutrients_model, window_ms: float = 10.0, max_batch: int = 64, pdf_workers: int = 2,
+                 stats_db: Optional[str] = None, stats_interval: float = 60.0,
+                 pdf_timeout: float = DEFAULT_TIMEOUT, pdf_memory_mb: int = DEFAULT_MEMORY_MB):
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(nutrients_model, self.metrics, window_ms, max_batch)
+        self.pdf_workers = pdf_workers
+        self.pdf_limits = {'timeout': pdf_timeout, 'memory_mb': pdf_memory_mb}
+        self.stats_db = stats_db
+        self.stats_interval = stats_interval
+        self._pdf_pool: Optional[IsolatedPool] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stats_task: Optional[asyncio.Task] = None
+
+    def warm_up(self):
+        """Загрузка 16 моделей ингредиентного потока и пробный прогон обоих потоков."""
+        self.batcher._score([(ingredients_frame({}), nutrients_frame({}))], record=False)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        self.batcher.start()
+        if self.stats_db:
+            self._stats_task = asyncio.get_running_loop().create_task(self._flush_stats_periodically())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            try:
+                await self._stats_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_stats()
+        if self._pdf_pool is not None:
+            self._pdf_pool.close()
+
+    def flush_stats(self) -> int:
+        """Слить накопленные статистики входных признаков в stats_db."""
+        from database import DatabaseManager
+
+        with DatabaseManager(self.stats_db) as db:
+            return drift.flush(db)
+
+    async def _flush_stats_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            try:
+                await loop.run_in_executor(None, self.flush_stats)
+            except Exception as e:
+                print(f"Не удалось записать статистики входных данных: {e}", file=sys.stderr)
+
+    # -------------------- Маршруты --------------------
+    async def predict_json(self, body: bytes) -> dict:
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError as e:
+            raise HttpError(400, f"Некорректный JSON: {e}")
+        single = not (isinstance(payload, dict) and 'rations' in payload)
+        rations = [payload] if single else payload['rations']
+        if not isinstance(rations, list) or not all(isinstance(r, dict) for r in rations):
+            raise HttpError(400, "Ожидается объект рациона или {\"rations\": [...]}")
+        frames = []
+        for ration in rations:
+            try:
+                frames.append((ingredients_frame(ration.get('ingredients') or {}),
+                               nutrients_frame(ration.get('nutrients') or {})))
+            except (TypeError, ValueError) as e:
+                raise HttpError(422, str(e))
+        results = await asyncio.gather(*(self.batcher.score(ing, nut) for ing, nut in frames))
+        results = [_public(r) for r in results]
+        return results[0] if single else {'results': results}
+
+    async def predict_pdf(self, body: bytes) -> dict:
+        if not body:
+            raise HttpError(400, "Пустое тело запроса: ожидается PDF")
+        if self._pdf_pool is None:
+            self._pdf_pool = IsolatedPool(self.pdf_workers, **self.pdf_limits)
+        ing_df, nut_df, error = await asyncio.wrap_future(self._pdf_pool.submit(body, _parse_pdf_bytes))
+        if error is not None:
+            raise HttpError(422, str(error))
+        return _public(await self.batcher.score(ing_df, nut_df))
+
+    async def predict_herd(self, body: bytes) -> dict:
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError as e:
+            raise HttpError(400, f"Некорректный JSON: {e}")
+        groups = payload.get('groups') if isinstance(payload, dict) else None
+        if not isinstance(groups, list) or not all(isinstance(g, dict) for g in groups):
+            raise HttpError(400, "Ожидается {\"groups\": [...]}")
+        # Группы уже составляют один пакет: считаем в потоке моделей, минуя окно микро-пакетов
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.batcher._executor, score_herd, groups, self.batcher.nutrients_model,
+                payload.get('by'), bool(payload.get('with_groups')))
+        except ValueError as e:
+            raise HttpError(422, str(e))
+
+    async def route(self, method: str, path: str, body: bytes) -> dict:
+        routes = {
+            '/health': ('GET', None),
+            '/metrics': ('GET', None),
+            '/predict': ('POST', self.predict_json),
+            '/predict/pdf': ('POST', self.predict_pdf),
+            '/predict/herd': ('POST', self.predict_herd),
+        }
+        if path not in routes:
+            raise HttpError(404, f"Нет маршрута {path}")
+        allowed, handler = routes[path]
+        if method != allowed:
+            raise HttpError(405, f"Для {path} используйте {allowed}")
+        if path == '/health':
+            return {'status': 'ok'}
+        if path == '/metrics':
+            return self.metrics.snapshot()
+        return await handler(body)
+
+    # -------------------- HTTP/1.1 --------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                started = time.perf_counter()
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                path = target.split('?', 1)[0]
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                status, payload = 200, None
+                try:
+                    if 'chunked' in headers.get('transfer-encoding', '').lower():
+                        keep_alive = False
+                        raise HttpError(411, "Передайте Content-Length вместо chunked")
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HttpError(413, f"Тело запроса больше {MAX_BODY_BYTES} байт")
+                    body = await reader.readexactly(length) if length else b''
+                    payload = await self.route(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if path != '/metrics':
+                    self.metrics.observe(path, time.perf_counter() - started, status < 400)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def serve(service: InferenceService, host: str, port: int):
+    server = await service.start(host, port)
+    print(f"Сервис предсказаний: http://{host}:{port} (POST /predict, /predict/pdf, /predict/herd; GET /metrics)", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Локальный HTTP-сервис предсказаний с микро-пакетами")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--window-ms', type=float, default=10.0, help='окно сбора пакета, мс')
+    ap.add_argument('--max-batch', type=int, default=64, help='максимум рационов в пакете')
+    ap.add_argument('--pdf-workers', type=int, default=2, help='процессов для разбора PDF')
+    ap.add_argument('--pdf-timeout', type=float, default=DEFAULT_TIMEOUT, help='секунд на разбор одного PDF')
+    ap.add_argument('--pdf-memory', type=int, default=DEFAULT_MEMORY_MB, help='лимит памяти процесса разбора, МБ')
+    ap.add_argument('--nutrient-model', default='parameters/nutrients-_acids_01617_140.pkl',
+                    help='путь к модели нутриентов')
+    ap.add_argument('--stats-db', help='БД для статистик входных признаков (scoring.drift)')
+    ap.add_argument('--stats-interval', type=float, default=60.0, help='период записи статистик, с')
+    args = ap.parse_args(argv)
+
+    from nutrient_model import load_model
+
+    service = InferenceService(load_model(args.nutrient_model), args.window_ms, args.max_batch, args.pdf_workers,
+                               args.stats_db, args.stats_interval, args.pdf_timeout, args.pdf_memory)
+    service.warm_up()
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Неопределённость предсказаний, считаемая в том же проходе, что и само предсказание.
+
+Две составляющие:
+  * расхождение потоков — половина разницы выходов ингредиентной и нутриентной
+    моделей по каждой кислоте (итог — их среднее, поэтому это и есть разброс вокруг него);
+  * выход за обучающую область (OOD) — насколько признаки рациона выходят за диапазоны,
+    на которых обучались модели. Диапазоны хранятся рядом с моделями в feature_stats.json
+    активного набора (parameters/ или parameters/models/<версия>/, см. ingredient_model.model_set)
+    по потокам, в порядке признаков модели.
+
+Итог по кислоте: sqrt(расхождение² + (ood · |значение|)²) — при рационе внутри
+обучающей области остаётся только расхождение потоков, вне её неопределённость растёт
+пропорционально значению. Всё считается векторно для пакета рационов.
+
+Статистики строятся командой
+    python -m scoring.uncertainty                       # ингредиентный поток по порогам бустеров
+    python -m scoring.uncertainty --dataset nutrient=train_nutrients.csv
+"""
+import argparse
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+FEATURE_STATS_FILE = 'feature_stats.json'
+FEATURE_STATS_PATH = os.path.join('parameters', FEATURE_STATS_FILE)
+
+# Суммарный относительный выход за диапазоны, при котором ood ≈ 0.63 (1 - 1/e)
+OOD_SCALE = 0.5
+
+_STATS = None
+_STATS_LOCK = threading.Lock()
+
+
+def stats_from_boosters(paths: Iterable[str], include_zero: bool = True) -> dict:
+    """Диапазоны признаков по порогам разбиений моделей xgboost (JSON из save_model).
+
+    Порог разбиения лежит между обучающими значениями, поэтому [мин. порог, макс. порог]
+    заведомо внутри обучающей области. include_zero — отсутствие корма кодируется нулём
+    и в обучении встречается всегда. Признаки без разбиений получают null (не проверяются).
+    """
+    low = high = names = None
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            learner = json.load(f)['learner']
+        if names is None:
+            names = learner['feature_names']
+            low = np.full(len(names), np.inf)
+            high = np.full(len(names), -np.inf)
+        for tree in learner['gradient_booster']['model']['trees']:
+            index = np.asarray(tree['split_indices'], dtype=int)
+            condition = np.asarray(tree['split_conditions'], dtype=float)
+            split = np.asarray(tree['left_children']) != -1  # листья хранят в split_conditions веса
+            np.minimum.at(low, index[split], condition[split])
+            np.maximum.at(high, index[split], condition[split])
+    if names is None:
+        raise ValueError("Не передано ни одной модели")
+    if include_zero:
+        low = np.minimum(low, 0.0)
+    unknown = ~np.isfinite(high)
+    return {
+        'source': 'boosters',
+        'features': list(names),
+        'low': [None if u else float(v) for u, v in zip(unknown, low)],
+        'high': [None if u else float(v) for u, v in zip(unknown, high)],
+    }
+
+
+def stats_from_frame(df, features: Optional[Sequence[str]] = None) -> dict:
+    """Диапазоны признаков по обучающей выборке (DataFrame подготовленных признаков)."""
+    features = list(features or df.columns)
+    values = df[features].to_numpy(dtype=float)
+    return {
+        'source': 'dataset',
+        'rows': int(len(values)),
+        'features': features,
+        'low': np.nanmin(values, axis=0).tolist(),
+        'high': np.nanmax(values, axis=0).tolist(),
+    }
+
+
+def save_feature_stats(streams: Dict[str, dict], path: str = FEATURE_STATS_PATH) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'streams': streams}, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def load_feature_stats(path: str = FEATURE_STATS_PATH) -> Dict[str, dict]:
+    """{поток: {'low': array, 'high': array, ...}}; нет файла — пустой словарь (OOD = 0)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            streams = json.load(f)['streams']
+    except FileNotFoundError:
+        return {}
+    for stats in streams.values():
+        # null (нет данных о диапазоне) -> nan: такой признак не проверяется
+        stats['low'] = np.array([np.nan if v is None else v for v in stats['low']], dtype=float)
+        stats['high'] = np.array([np.nan if v is None else v for v in stats['high']], dtype=float)
+    return streams
+
+
+def feature_stats_path() -> str:
+    """Статистики активного набора моделей (ingredient_model.model_set)."""
+    from ingredient_model.model_set import active_model_dir
+
+    return os.path.join(active_model_dir(), FEATURE_STATS_FILE)
+
+
+def get_feature_stats() -> Dict[str, dict]:
+    """Статистики активного набора моделей; читаются один раз при первом обращении."""
+    global _STATS
+    with _STATS_LOCK:
+        if _STATS is None:
+            _STATS = load_feature_stats(feature_stats_path())
+    return _STATS
+
+
+def range_excess(X, stats: dict) -> np.ndarray:
+    """Сумма относительных выходов признаков за обучающие диапазоны для каждой строки X."""
+    X = np.asarray(X, dtype=float)
+    low, high = stats['low'], stats['high']
+    if X.shape[1] != len(low):
+        raise ValueError(f"Признаков {X.shape[1]}, а в статистиках {len(low)}")
+    width = np.maximum(high - low, np.maximum(np.abs(high), 1.0) * 1e-3)
+    excess = np.maximum(np.maximum(low - X, X - high), 0.0) / width
+    return np.nansum(excess, axis=1)
+
+
+def ood_score(features: Dict[str, object], streams: Optional[Dict[str, dict]] = None) -> np.ndarray:
+    """OOD-оценка рационов в [0, 1): features — {поток: матрица признаков [n, d]}.
+
+    Потоки без статистик пропускаются; выходы разных потоков складываются.
+    """
+    streams = get_feature_stats() if streams is None else streams
+    total = None
+    for stream, X in features.items():
+        if stream not in streams:
+            continue
+        excess = range_excess(X, streams[stream])
+        total = excess if total is None else total + excess
+    if total is None:
+        n = len(next(iter(features.values()))) if features else 0
+        return np.zeros(n)
+    return 1.0 - np.exp(-total / OOD_SCALE)
+
+
+def estimate_uncertainty(pred_ingr, pred_nutr, ood) -> np.ndarray:
+    """Неопределённость [n, 16] по выходам потоков [n, 16] и OOD-оценке [n]."""
+    pred_ingr = np.asarray(pred_ingr, dtype=float)
+    pred_nutr = np.asarray(pred_nutr, dtype=float)
+    disagreement = np.abs(pred_ingr - pred_nutr) / 2.0
+    blended = (pred_ingr + pred_nutr) / 2.0
+    return np.hypot(disagreement, np.asarray(ood, dtype=float)[:, None] * np.abs(blended))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Построение parameters/feature_stats.json для оценки неопределённости")
+    parser.add_argument('--boosters', nargs='*',
+                        help="JSON моделей ингредиентного потока (по умолчанию — активного набора)")
+    parser.add_argument('--dataset', action='append', default=[], metavar='ПОТОК=CSV',
+                        help="обучающая выборка потока (признаки модели по столбцам), можно повторять")
+    parser.add_argument('-o', '--output', help="по умолчанию feature_stats.json активного набора моделей")
+    args = parser.parse_args(argv)
+    if args.boosters is None:
+        from ingredient_model.model_set import booster_paths
+
+        args.boosters = booster_paths()
+    args.output = args.output or feature_stats_path()
+
+    streams = {}
+    if args.boosters:
+        streams['ingredient'] = stats_from_boosters(args.boosters)
+    for item in args.dataset:
+        stream, sep, path = item.partition('=')
+        if not sep:
+            parser.error(f"--dataset ожидает ПОТОК=CSV, получено {item!r}")
+        import pandas as pd
+
+        if stream == 'nutrient':
+            from nutrient_model import prepare_nutrients, MODEL_FEATURES
+
+            streams[stream] = stats_from_frame(prepare_nutrients(pd.read_csv(path)), MODEL_FEATURES)
+        else:
+            streams[stream] = stats_from_frame(pd.read_csv(path))
+    save_feature_stats(streams, args.output)
+    for stream, stats in streams.items():
+        known = sum(v is not None for v in stats['low'])
+        print(f"{stream}: {known} из {len(stats['features'])} признаков с диапазоном ({stats['source']})")
+    print(f"Записано: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
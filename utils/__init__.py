@@ -1,5 +1,5 @@
-from .validation import validate_diet_ratios, check_fatty_acid_ranges
+from .validation import validate_diet_ratios, check_fatty_acid_ranges, GOST_IN_RANGE
 
 __all__ = [
-    'validate_diet_ratios', 'check_fatty_acid_ranges'
+    'validate_diet_ratios', 'check_fatty_acid_ranges', 'GOST_IN_RANGE'
 ]
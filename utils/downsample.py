@@ -0,0 +1,41 @@
+# downsample.py
+"""
+Прореживание временных рядов для графиков: Largest-Triangle-Three-Buckets (LTTB).
+
+LTTB сохраняет форму ряда (пики и провалы): первая и последняя точки остаются,
+остальные делятся на корзины, и из каждой берётся точка, образующая наибольший
+треугольник с выбранной точкой предыдущей корзины и средним следующей.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def lttb(x, y, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Прореживание ряда (x отсортирован по возрастанию) до n_out точек."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # Границы n_out - 2 корзин для внутренних точек [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Средние по корзинам одним проходом (для «следующей» корзины)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Удвоенная площадь треугольника (a, точка корзины, среднее следующей корзины)
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
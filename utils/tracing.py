@@ -0,0 +1,246 @@
+# tracing.py
+"""
+Лёгкая трассировка этапов конвейера: интервалы (span) с wall/CPU-временем, числом
+строк и (по желанию) приростом памяти tracemalloc; экспорт в Chrome trace JSON
+(chrome://tracing, https://ui.perfetto.dev) и сводная таблица по этапам.
+
+По умолчанию выключена: span() возвращает общий пустой объект, а обёртка traced
+проверяет один флаг, поэтому инструментированный код почти ничего не теряет.
+
+Включение:
+    MILK_TRACE=trace.json            — трассировать весь процесс, при выходе записать
+                                       trace.json и вывести сводку в stderr (MILK_TRACE=1 —
+                                       файл milk_trace.json);
+    MILK_TRACE_MEMORY=1              — дополнительно прирост памяти Python по интервалам;
+    python -m scoring.batch ... --trace trace.json (и другие CLI с флагом --trace).
+
+Использование:
+    with span('parser.camelot', path=pdf_path) as sp:
+        tables = ...
+        sp.set(rows=len(tables))
+
+    @traced('nutrient_model.predict')
+    def run_predictions(...): ...
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+ENV_TRACE = 'MILK_TRACE'
+ENV_TRACE_MEMORY = 'MILK_TRACE_MEMORY'
+DEFAULT_TRACE_FILE = 'milk_trace.json'
+
+_enabled = False
+_memory = False
+_events: List[dict] = []
+_lock = threading.Lock()
+
+
+class _NoopSpan:
+    """Интервал при выключенной трассировке: ничего не измеряет и не хранит."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Интервал трассировки; при выходе добавляет событие 'X' (complete event) в буфер."""
+
+    __slots__ = ('name', 'cat', 'args', '_start', '_cpu', '_mem')
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        """Дополнить аргументы интервала (например, rows=len(df) после вычисления)."""
+        self.args.update(args)
+
+    def __enter__(self):
+        if _memory:
+            import tracemalloc
+
+            self._mem = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        else:
+            self._mem = None
+        self._cpu = time.thread_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        args = self.args
+        args['cpu_ms'] = round((time.thread_time() - self._cpu) * 1000, 3)
+        if self._mem is not None:
+            import tracemalloc
+
+            args['mem_delta_kb'] = round((tracemalloc.get_traced_memory()[0] - self._mem) / 1024, 1)
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        event = {
+            'name': self.name, 'cat': self.cat, 'ph': 'X',
+            # Chrome trace ожидает микросекунды
+            'ts': round(self._start * 1e6, 1), 'dur': round((end - self._start) * 1e6, 1),
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args,
+        }
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name: str, **args):
+    """Контекстный менеджер интервала; категория — префикс имени до первой точки."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, name.split('.', 1)[0], args)
+
+
+def traced(name: Optional[str] = None):
+    """Декоратор: вызов функции — интервал с именем name (по умолчанию модуль.функция)."""
+
+    def decorate(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, span_name.split('.', 1)[0], {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def memory_enabled() -> bool:
+    return _memory
+
+
+def enable(memory: bool = False):
+    """Включить трассировку; memory=True запускает tracemalloc (заметно замедляет код)."""
+    global _enabled, _memory
+    if memory:
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _memory = memory
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def drain() -> List[dict]:
+    """Забрать накопленные события (буфер очищается), например, для передачи из процесса пула."""
+    with _lock:
+        events = list(_events)
+        _events.clear()
+    return events
+
+
+def merge(events: List[dict]):
+    """Добавить события, записанные в другом процессе."""
+    with _lock:
+        _events.extend(events)
+
+
+def events() -> List[dict]:
+    with _lock:
+        return list(_events)
+
+
+def summary(trace_events: Optional[List[dict]] = None) -> List[Dict]:
+    """Сводка по этапам: число вызовов, суммарное/среднее/максимальное время, CPU, строки."""
+    stages: Dict[str, dict] = {}
+    for e in events() if trace_events is None else trace_events:
+        s = stages.setdefault(e['name'], {'name': e['name'], 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                          'cpu_ms': 0.0, 'rows': 0, 'mem_delta_kb': 0.0})
+        dur_ms = e['dur'] / 1000
+        s['calls'] += 1
+        s['total_ms'] += dur_ms
+        s['max_ms'] = max(s['max_ms'], dur_ms)
+        s['cpu_ms'] += e['args'].get('cpu_ms', 0.0)
+        s['rows'] += e['args'].get('rows', 0) or 0
+        s['mem_delta_kb'] += e['args'].get('mem_delta_kb', 0.0)
+    result = sorted(stages.values(), key=lambda s: s['total_ms'], reverse=True)
+    for s in result:
+        s['mean_ms'] = s['total_ms'] / s['calls']
+    return result
+
+
+def format_summary(trace_events: Optional[List[dict]] = None) -> str:
+    rows = summary(trace_events)
+    if not rows:
+        return "Трассировка: событий нет"
+    width = max(len('Этап'), *(len(s['name']) for s in rows))
+    lines = [f"{'Этап':<{width}}  {'вызовов':>7}  {'всего, мс':>10}  {'среднее':>9}  {'макс.':>9}  "
+             f"{'CPU, мс':>9}  {'строк':>8}  {'Δпамять, КБ':>11}"]
+    for s in rows:
+        lines.append(f"{s['name']:<{width}}  {s['calls']:>7}  {s['total_ms']:>10.1f}  {s['mean_ms']:>9.2f}  "
+                     f"{s['max_ms']:>9.2f}  {s['cpu_ms']:>9.1f}  {s['rows']:>8}  {s['mem_delta_kb']:>11.1f}")
+    return '\n'.join(lines)
+
+
+def export_chrome_trace(path: str, trace_events: Optional[List[dict]] = None) -> str:
+    """Записать события в формате Chrome trace (JSON object format)."""
+    import json
+
+    trace_events = events() if trace_events is None else trace_events
+    # Метки процессов: основной и процессы пула видны отдельными строками
+    names = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f'pid {pid}'}}
+             for pid in sorted({e['pid'] for e in trace_events})]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': names + trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return path
+
+
+def write_report(path: str, out=None):
+    """Chrome trace в path и сводная таблица в out (по умолчанию stderr)."""
+    export_chrome_trace(path)
+    print(format_summary(), file=out or sys.stderr)
+    print(f"Трасса записана: {path}", file=out or sys.stderr)
+
+
+def _enable_from_env():
+    value = os.environ.get(ENV_TRACE, '').strip()
+    if not value or value == '0':
+        return
+    enable(memory=os.environ.get(ENV_TRACE_MEMORY, '').strip() not in ('', '0'))
+    path = DEFAULT_TRACE_FILE if value == '1' else value
+    owner = os.getpid()
+
+    def export_at_exit():
+        import multiprocessing
+
+        # Процессы пулов наследуют переменную окружения, но трассу пишет только основной
+        if os.getpid() == owner and multiprocessing.parent_process() is None and _events:
+            write_report(path)
+
+    atexit.register(export_at_exit)
+
+
+_enable_from_env()
@@ -2,6 +2,9 @@
 from typing import Dict, Tuple
 from .constants import GOST
 
+# Статус check_fatty_acid_ranges для значения в пределах нормы
+GOST_IN_RANGE = 'В пределах нормы'
+
 
 def validate_diet_ratios(ratios: Dict[str, float]) -> Tuple[bool, str]:
     if any(ratio < 0 for ratio in ratios.values()):
@@ -16,7 +19,7 @@ def check_fatty_acid_ranges(values):
         if values[i] < GOST[i][0]:
             res.append(f'Ниже на {round(GOST[i][0] - values[i], 2)}')
         elif GOST[i][0] <= values[i] <= GOST[i][1]:
-            res.append(f'В пределах нормы')
+            res.append(GOST_IN_RANGE)
         else:
             res.append(f'Выше на {round(values[i] - GOST[i][1], 2)}')
 